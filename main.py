@@ -1 +1,12 @@
-from src.app import MusicForgeApp\n\nif __name__ == "__main__":\n    app = MusicForgeApp()\n    app.run()
+import sys
+
+from src.utils.startup import StartupTimer
+
+if __name__ == "__main__":
+    # --startup-report prints how long each phase took once the window is up
+    timer = StartupTimer() if "--startup-report" in sys.argv else None
+    from src.app import MusicForgeApp
+    if timer is not None:
+        timer.mark("imports")
+    app = MusicForgeApp(timer=timer)
+    app.run()
@@ -1,3 +1,5 @@
+import functools
+import importlib
 import tkinter as tk
 from tkinter import ttk, messagebox
 import ttkbootstrap as tb
@@ -5,26 +7,52 @@ from tkinterdnd2 import TkinterDnD
 from pathlib import Path
 
 from src.ui.sidebar import Sidebar
-from src.ui.queue_view import QueueView
-from src.ui.processor_view import ProcessorView
-from src.ui.settings_view import SettingsView
-from src.ui.player_view import PlayerView
-from src.core.worker import SerialWorker, ParallelWorker
+from src.core.worker import SerialWorker
+from src.core.scheduler import ProcessScheduler
+from src.core.concurrency import AdaptiveConcurrency
 from src.core.processor import AudioProcessor
+from src.core.batch import BatchProcessor
+from src.core.capabilities import CapabilityCache
+from src.core.ingest import IngestPipeline
+from src.core.queue_model import QueueModel
+from src.core.tagging import BulkTagger
+from src.core.telemetry import StageSummary
 from src.core.metadata import MetadataManager
+from src.core.metadata_cache import MetadataCache
+from src.core.probe import Prober
+from src.core.loudness import LoudnessAnalyzer, LoudnessCache
+from src.core.transcode_cache import TranscodeCache
 from src.utils.helpers import (
     enable_windows_dpi_awareness, 
     set_taskbar_appid, 
     get_base_dir,
-    find_ffmpeg
+    get_cache_dir
 )
 
+# Views as (module, class); each module is imported when its view is first shown
+VIEWS = {
+    "queue": ("src.ui.queue_view", "QueueView"),
+    "processor": ("src.ui.processor_view", "ProcessorView"),
+    "player": ("src.ui.player_view", "PlayerView"),
+    "settings": ("src.ui.settings_view", "SettingsView")
+}
+# Built before the window is first shown
+FIRST_VIEW = "queue"
+
 class MusicForgeApp:
-    def __init__(self):
+    """The main window and the services shared by its views.
+
+    Services that pull in numpy, Pillow or pygame (cover art, waveforms,
+    playback) are created on first use, so none of them delay the window.
+    ``timer``, a StartupTimer, is told when each phase of startup is done.
+    """
+    def __init__(self, timer=None):
+        self.timer = timer
         enable_windows_dpi_awareness()
         
         self.root = TkinterDnD.Tk()
         self.style = tb.Style(theme="darkly")
+        self._mark("tk root")
         
         self.root.title("Music Forge — Pro Audio Suite")
         self.root.geometry("1200x800")
@@ -33,20 +61,84 @@ class MusicForgeApp:
         set_taskbar_appid("iD01tProductions.MusicForge.v1.2")
         
         # State
-        self.file_queue = []
+        self.file_queue = QueueModel()
         self.current_view = None
         
         # Workers
         self.ui_worker = SerialWorker(error_callback=self._on_worker_error)
         self.ui_worker.start()
-        self.process_worker = ParallelWorker()
+        self.process_scheduler = ProcessScheduler()
+        # Settings > Max Parallel Workers is the cap; adaptive mode may run fewer
+        self.concurrency = AdaptiveConcurrency(self.process_scheduler, cap=self.process_scheduler.max_workers)
         
         # Core components
-        self.processor = AudioProcessor()
-        self.metadata = MetadataManager()
+        self.processor = AudioProcessor(capabilities=self._open_cache(CapabilityCache, "ffmpeg.json"))
+        self.metadata = MetadataManager(cache=self._open_cache(MetadataCache, "metadata.db"))
+        self.loudness = LoudnessAnalyzer(
+            self.processor, cache=self._open_cache(LoudnessCache, "loudness.db"), digests=self.metadata.cache
+        )
+        self.transcode_cache = self._open_cache(functools.partial(TranscodeCache, digests=self.metadata.cache), "transcodes")
+        self.batch = BatchProcessor(
+            self.processor, self.process_scheduler, loudness=self.loudness, transcode_cache=self.transcode_cache,
+            prober=Prober(cache=self.metadata.cache), metadata=self.metadata
+        )
+        self.ingest = IngestPipeline(self.metadata)
+        self.tagger = BulkTagger()
+        # Subscribed to telemetry from Settings; nothing is measured until then
+        self.stage_summary = StageSummary()
+        self._mark("services")
         
         self._build_layout()
-        self._check_ffmpeg()
+        self._mark("first view")
+        # Checked off the Tk thread; the window does not wait for a process spawn
+        self.ui_worker.submit(self._check_ffmpeg)
+        if timer is not None:
+            self.root.bind("<Map>", self._on_first_map, add="+")
+
+    def _mark(self, phase):
+        if self.timer is not None:
+            self.timer.mark(phase)
+
+    def _on_first_map(self, event):
+        if event.widget is not self.root or self.timer is None:
+            return
+        self.root.update_idletasks()
+        self._mark("window shown")
+        from src.utils.startup import format_report
+        print(format_report(self.timer))
+        self.timer = None
+
+    @functools.cached_property
+    def cover_art(self):
+        from src.core.cover_art import CoverArtService
+        return self._open_cache(functools.partial(CoverArtService, metadata=self.metadata), "covers")
+
+    @functools.cached_property
+    def waveforms(self):
+        from src.core.spectrogram import SpectrogramStore
+        from src.core.waveform import WaveformStore
+        return self._open_cache(
+            functools.partial(
+                WaveformStore, digests=self.metadata.cache, spectrograms=self._open_cache(SpectrogramStore, "spectrograms")
+            ),
+            "waveforms"
+        )
+
+    @functools.cached_property
+    def playback(self):
+        # Outlives the Player view, so playback continues on other views
+        from src.core.playback import PlaybackEngine, QueueAdvancer
+        engine = PlaybackEngine()
+        # Engine events arrive on the audio thread; the queue may only be read on the Tk thread
+        self._queue_advancer = QueueAdvancer(engine, self.file_queue, lambda func, *args: self.root.after(0, func, *args))
+        return engine
+
+    def _open_cache(self, cache_cls, filename):
+        try:
+            return cache_cls(get_cache_dir() / filename)
+        except Exception:
+            # A read-only or corrupt cache must not prevent the app from starting
+            return None
 
     def _build_layout(self):
         # Main container
@@ -61,87 +153,77 @@ class MusicForgeApp:
         self.content_area = ttk.Frame(self.main_container, padding=20)
         self.content_area.pack(side="right", fill="both", expand=True)
         
-        # Initialize views (placeholders for now)
-        self.views = {
-            "queue": self._build_queue_view,
-            "processor": self._build_processor_view,
-            "player": self._build_player_view,
-            "settings": self._build_settings_view
-        }
+        # Views are built on first selection and kept for the rest of the session
+        self.views = VIEWS
+        self._built_views = {}
+        self.sidebar.select(FIRST_VIEW)
 
     def _on_view_change(self, view_id):
-        # Clear content area
-        for widget in self.content_area.winfo_children():
-            widget.destroy()
-            
-        # Build new view
-        if view_id in self.views:
-            self.views[view_id]()
-
-    def _build_queue_view(self):
-        view = QueueView(self.content_area, self)
-        view.pack(fill="both", expand=True)
-        
-    def _build_processor_view(self):
-        view = ProcessorView(self.content_area, self)
-        view.pack(fill="both", expand=True)
-
-    def _build_player_view(self):
-        view = PlayerView(self.content_area, self)
-        view.pack(fill="both", expand=True)
-
-    def _build_settings_view(self):
-        view = SettingsView(self.content_area, self)
+        if view_id not in self.views:
+            return
+        if self.current_view is not None:
+            self.current_view.pack_forget()
+            self.current_view.hide()
+        view = self._built_views.get(view_id)
+        if view is None:
+            module, name = self.views[view_id]
+            view_cls = getattr(importlib.import_module(module), name)
+            view = self._built_views[view_id] = view_cls(self.content_area, self)
         view.pack(fill="both", expand=True)
+        view.show()
+        self.current_view = view
 
     def _check_ffmpeg(self):
-        ffmpeg_path = find_ffmpeg()
-        if not ffmpeg_path or ffmpeg_path == "ffmpeg":
-            # Check if it's actually in path
-            try:
-                import subprocess
-                subprocess.run(["ffmpeg", "-version"], capture_output=True)
-            except Exception:
-                messagebox.showwarning("FFmpeg Not Found", "FFmpeg is required for processing. Please install it or place it in the app directory.")
+        """Warn when FFmpeg cannot be run; called on the UI worker thread.
+
+        Also loads what FFmpeg supports, usually from the cache, so that
+        starting a batch does not wait for it.
+        """
+        if not self.processor.capabilities().runnable:
+            self.root.after(0, lambda: messagebox.showwarning(
+                "FFmpeg Not Found", "FFmpeg is required for processing. Please install it or place it in the app directory."
+            ))
 
     def _on_worker_error(self, error):
         self.root.after(0, lambda: messagebox.showerror("Worker Error", str(error)))
 
     def start_batch_processing(self, options):
-        """Start the parallel batch processing."""
-        output_dir = Path(options["output_dir"])
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        for file_item in self.file_queue:
-            input_path = Path(file_item["path"])
-            output_path = output_dir / f"{input_path.stem}.{options['format']}"
-            
-            # Create a task for each file
-            self.process_worker.submit(
-                self._process_single_file,
-                input_path,
-                output_path,
-                options,
-                file_item["tags"]
-            )
+        """Start the parallel batch processing without blocking the Tk thread."""
+        self.batch.submit(self.file_queue, options, on_result=self._on_file_processed, on_preflight=self._on_preflight)
+
+    def _on_preflight(self, report):
+        """Report the files the probe stage found unreadable."""
+        for path, error in report["unreadable"]:
+            print(f"Unreadable: {Path(path).name}: {error}")
             
-    def _process_single_file(self, input_path, output_path, options, tags):
-        """Worker task for a single file."""
-        # Merge tags into options
-        task_options = options.copy()
-        task_options["tags"] = tags
-        
-        result = self.processor.process(input_path, output_path, task_options)
-        
-        if result.returncode == 0:
-            print(f"Processed: {input_path.name} -> {output_path.name}")
+    def _on_file_processed(self, job):
+        """Report the outcome of a single file."""
+        input_name = Path(job["input"]).name
+        if job["status"] == "ok":
+            print(f"Processed: {input_name} -> {Path(job['output']).name}")
         else:
-            print(f"Error processing {input_path.name}: {result.stderr}")
+            print(f"Error processing {input_name}: {job['error']}")
 
     def run(self):
         self.root.mainloop()
         self.ui_worker.stop()
-        self.process_worker.shutdown(wait=False)
+        self.concurrency.stop()
+        # Kills any FFmpeg processes still running
+        self.process_scheduler.shutdown(wait=False)
+        self.ingest.shutdown()
+        self.tagger.shutdown()
+        # Lazily created services only need closing if they were ever used
+        if "playback" in self.__dict__:
+            self._queue_advancer.close()
+            self.playback.close()
+        if self.__dict__.get("cover_art"):
+            self.cover_art.shutdown()
+        if self.metadata.cache:
+            self.metadata.cache.close()
+        if self.loudness.cache:
+            self.loudness.cache.close()
+        if self.transcode_cache:
+            self.transcode_cache.close()
 
 if __name__ == "__main__":
     app = MusicForgeApp()
@@ -0,0 +1,350 @@
+"""
+Benchmarks of the processing and ingestion hot paths.
+
+    python -m src.bench --output results.json
+    python -m src.bench --baseline results.json --threshold 0.15
+
+Test audio is generated with FFmpeg's lavfi sources (sine tones and
+seeded noise, so every run gets the same files) in several lengths,
+formats and tag densities, and kept in ``--corpus`` between runs. The
+suites measure end-to-end batch throughput at several worker counts,
+tag reads per second, queue insert and refresh cost at 10k and 100k
+entries, the imports done before the window is shown, and peak memory.
+Results are written as JSON; with ``--baseline`` every metric is
+compared against an earlier run and the exit code is 1 when one got
+worse by more than ``--threshold``. Suites that need FFmpeg are
+skipped, and say so, when it cannot be run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.core.batch import BatchProcessor
+from src.core.metadata import TAG_KEYS, MetadataManager
+from src.core.processor import AudioProcessor
+from src.core.queue_model import QueueItem, QueueModel
+from src.core.queue_projection import QueueProjection
+from src.core.scheduler import ProcessScheduler
+from src.utils.helpers import get_cache_dir
+from src.utils.startup import IMPORT_BUDGET, import_times
+
+try:
+    import resource
+except ImportError:
+    # Windows: peak memory is not reported
+    resource = None
+
+EXIT_OK = 0
+EXIT_REGRESSED = 1
+EXIT_USAGE = 2
+
+RESULTS_VERSION = 1
+
+# Generated files: (name, lavfi source, seconds, format, tag density)
+CORPUS = (
+    ("tone-short", "sine=frequency=440", 15, "mp3", "none"),
+    ("tone-medium", "sine=frequency=220", 90, "flac", "basic"),
+    ("noise-medium", "anoisesrc=color=pink:seed=1", 90, "mp3", "full"),
+    ("noise-long", "anoisesrc=color=brown:seed=2", 300, "flac", "full"),
+    ("tone-m4a", "sine=frequency=880", 60, "m4a", "basic"),
+    ("noise-ogg", "anoisesrc=color=white:seed=3:amplitude=0.3", 60, "ogg", "basic"),
+    ("tone-wav", "sine=frequency=330", 30, "wav", "none")
+)
+# Copies of each file, so a batch has enough jobs to keep every worker busy
+CORPUS_COPIES = 4
+
+TAG_DENSITIES = {
+    "none": {},
+    "basic": {"title": "Benchmark", "artist": "Music Forge", "album": "Corpus", "date": "2024", "track": "1"},
+    "full": {
+        "title": "Benchmark", "artist": "Music Forge", "album": "Corpus", "date": "2024", "track": "1",
+        "genre": "Test", "composer": "Generator", "album_artist": "Music Forge", "comment": "x" * 2000,
+        "lyrics": "la " * 1000
+    }
+}
+
+# Options of the batch suite: a plain transcode with the usual filters
+BATCH_OPTIONS = {
+    "format": "mp3",
+    "quality": "high",
+    "sample_rate": 44100,
+    "channels": 2,
+    "normalize": True,
+    "loudnorm_two_pass": False,
+    "fade_in": 1.0,
+    "fade_out": 1.0,
+    "embed_art": False
+}
+
+def metric(value, unit, better):
+    """One measurement; ``better`` is "higher" or "lower"."""
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+def peak_rss():
+    """Peak resident memory of this process and of its finished children, in MiB."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+def generate_corpus(root, ffmpeg_bin, copies=CORPUS_COPIES):
+    """Create the corpus files missing from root; returns their paths."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, source, seconds, fmt, density in CORPUS:
+        path = root / f"{name}.{fmt}"
+        if not path.exists():
+            cmd = [ffmpeg_bin, "-v", "error", "-y", "-f", "lavfi", "-i", f"{source}:duration={seconds}:sample_rate=44100",
+                   "-ac", "2"]
+            for key, value in TAG_DENSITIES[density].items():
+                cmd += ["-metadata", f"{key}={value}"]
+            fd, tmp = tempfile.mkstemp(prefix=".mf-", suffix=path.suffix, dir=root)
+            os.close(fd)
+            try:
+                subprocess.run(cmd + [tmp], check=True, capture_output=True)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        paths.append(path)
+        for i in range(1, copies):
+            copy = root / f"{name}-{i}.{fmt}"
+            if not copy.exists():
+                shutil.copyfile(path, copy)
+            paths.append(copy)
+    return paths
+
+def bench_batch(paths, workers, output_root):
+    """End-to-end batch throughput at each worker count."""
+    processor = AudioProcessor()
+    metadata = MetadataManager()
+    items = [QueueItem(str(path), duration=metadata.read_info(str(path))["stream"].get("length")) for path in paths]
+    audio_seconds = sum(item.duration or 0.0 for item in items)
+    results = {}
+    for count in workers:
+        output_dir = Path(output_root) / f"workers-{count}"
+        scheduler = ProcessScheduler(max_workers=count)
+        batch = BatchProcessor(processor, scheduler)
+        start = time.perf_counter()
+        try:
+            futures = batch.submit(items, dict(BATCH_OPTIONS, output_dir=str(output_dir)))
+            jobs = [future.result() for future in futures]
+        finally:
+            scheduler.shutdown(wait=True)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for job in jobs if job["status"] != "ok")
+        prefix = f"batch.workers_{count}"
+        results[f"{prefix}.files_per_s"] = metric(len(jobs) / elapsed, "files/s", "higher")
+        results[f"{prefix}.realtime_factor"] = metric(audio_seconds / elapsed, "x", "higher")
+        results[f"{prefix}.failed"] = metric(failed, "files", "lower")
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+def bench_tags(paths, rounds=5):
+    """Uncached tag, stream info and cover hash reads per second."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            MetadataManager.parse(str(path))
+    elapsed = time.perf_counter() - start
+    return {"tags.read_per_s": metric(rounds * len(paths) / elapsed, "files/s", "higher")}
+
+def synthetic_items(count, seed=0):
+    """Queue items spread over albums the way a real library is."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        album = i // 12
+        tags = {key: "" for key in TAG_KEYS}
+        tags.update(
+            title=f"Track {rng.randrange(10 ** 6)}", artist=f"Artist {album % 500}", album=f"Album {album}",
+            year=str(1960 + album % 60), genre=("Rock", "Jazz", "Classical", "Electronic")[album % 4],
+            tracknumber=str(i % 12 + 1)
+        )
+        path = f"/library/Artist {album % 500}/Album {album}/{i % 12 + 1:02d} Track {i}.flac"
+        items.append(QueueItem(path, tags, size=rng.randrange(2, 60) * 1024 ** 2, duration=rng.uniform(60, 600)))
+    return items
+
+def bench_queue(size, batch=250, window=50):
+    """Insert and refresh costs of a queue as the Queue view drives it."""
+    items = synthetic_items(size)
+    model = QueueModel()
+    projection = QueueProjection(model)
+    projection.set_sort("artist")
+    prefix = f"queue.{size // 1000}k"
+    results = {}
+
+    def render(top=0):
+        # What a redraw reads: the visible rows only
+        for row in range(top, min(top + window, len(projection))):
+            projection.row_values(projection.index_at(row))
+
+    # Rows arrive in ingestion batches; each one is synced and redrawn
+    start = time.perf_counter()
+    for i in range(0, size, batch):
+        model.extend(items[i:i + batch])
+        projection.sync()
+        render()
+    results[f"{prefix}.insert_s"] = metric(time.perf_counter() - start, "s", "lower")
+
+    start = time.perf_counter()
+    projection.invalidate()
+    render()
+    results[f"{prefix}.refresh_ms"] = metric((time.perf_counter() - start) * 1000, "ms", "lower")
+
+    start = time.perf_counter()
+    projection.set_sort("title")
+    render(size // 2)
+    results[f"{prefix}.sort_ms"] = metric((time.perf_counter() - start) * 1000, "ms", "lower")
+
+    start = time.perf_counter()
+    projection.set_filter("album 4")
+    while not projection.step(budget=1.0):
+        pass
+    render()
+    results[f"{prefix}.filter_ms"] = metric((time.perf_counter() - start) * 1000, "ms", "lower")
+
+    start = time.perf_counter()
+    model.remove([item.path for item in items[::10]])
+    projection.invalidate()
+    render()
+    results[f"{prefix}.remove_refresh_ms"] = metric((time.perf_counter() - start) * 1000, "ms", "lower")
+    return results
+
+def bench_startup(rounds=3):
+    """Imports done before the window is shown (the app and its first view), best of rounds."""
+    total = min(import_times()["total"] for _ in range(rounds))
+    return {
+        "startup.import_ms": metric(total * 1000, "ms", "lower"),
+        "startup.budget_used": metric(total / IMPORT_BUDGET, "x", "lower")
+    }
+
+def compare(results, baseline, threshold):
+    """Metrics that got worse than the baseline by more than threshold, as (name, old, new, change)."""
+    regressions = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        if not old or old.get("better") != current["better"]:
+            continue
+        if not old["value"]:
+            # From zero (failed files, say) any change is unbounded
+            if current["value"] == old["value"]:
+                continue
+            change = float("inf") if current["value"] > 0 else float("-inf")
+        else:
+            change = (current["value"] - old["value"]) / abs(old["value"])
+        worse = -change if current["better"] == "higher" else change
+        if worse > threshold:
+            regressions.append((name, old["value"], current["value"], round(change, 4)))
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.bench", description="Benchmark Music Forge's hot paths.")
+    parser.add_argument("--output", help="write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change that counts as a regression (default: 0.10)")
+    parser.add_argument("--corpus", help="directory of the generated audio (default: in the cache directory)")
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts of the batch suite")
+    parser.add_argument("--queue-sizes", default="10000,100000", help="comma-separated queue sizes")
+    parser.add_argument("--suites", default="batch,tags,queue,startup", help="comma-separated suites to run")
+    return parser
+
+def run(args):
+    try:
+        suites = set(args.suites.split(","))
+        queue_sizes = [int(size) for size in args.queue_sizes.split(",") if size]
+        cpus = os.cpu_count() or 1
+        workers = [int(count) for count in args.workers.split(",")] if args.workers else sorted({1, 2, 4, cpus})
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if min(workers, default=1) < 1 or args.threshold < 0:
+        print("error: worker counts and the threshold must be positive", file=sys.stderr)
+        return EXIT_USAGE
+
+    capabilities = AudioProcessor().capabilities()
+    results, skipped = {}, {}
+    if suites & {"batch", "tags"}:
+        if not capabilities.runnable:
+            for suite in suites & {"batch", "tags"}:
+                skipped[suite] = "FFmpeg cannot be run"
+            paths = []
+        else:
+            corpus = Path(args.corpus) if args.corpus else get_cache_dir() / "bench-corpus"
+            print(f"Generating corpus in {corpus}...", file=sys.stderr)
+            paths = generate_corpus(corpus, AudioProcessor().ffmpeg_bin)
+        if paths and "tags" in suites:
+            print("Tags...", file=sys.stderr)
+            results.update(bench_tags(paths))
+        if paths and "batch" in suites:
+            print(f"Batch at {workers} workers...", file=sys.stderr)
+            with tempfile.TemporaryDirectory(prefix="mf-bench-") as output_root:
+                results.update(bench_batch(paths, workers, output_root))
+    if "queue" in suites:
+        for size in queue_sizes:
+            print(f"Queue of {size}...", file=sys.stderr)
+            results.update(bench_queue(size))
+
+    if "startup" in suites:
+        print("Startup imports...", file=sys.stderr)
+        results.update(bench_startup())
+
+    own, children = peak_rss()
+    if own is not None:
+        results["memory.peak_rss_mb"] = metric(own, "MiB", "lower")
+        results["memory.peak_child_rss_mb"] = metric(children, "MiB", "lower")
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": cpus,
+            "ffmpeg": capabilities.version
+        },
+        "skipped": skipped,
+        "results": results
+    }
+    exit_code = EXIT_OK
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = [
+            {"metric": name, "baseline": old, "current": new, "change": change} for name, old, new, change in regressions
+        ]
+        for name, old, new, change in regressions:
+            print(f"regression: {name}: {old} -> {new} ({change:+.1%})", file=sys.stderr)
+        exit_code = EXIT_REGRESSED if regressions else EXIT_OK
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return exit_code
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Headless batch entry point for Music Forge.
+
+Runs the core engine without Tk, ttkbootstrap or pygame:
+
+    python -m src.cli "~/Music/**/*.flac" -o options.json -j 8 --output-dir out
+
+The options file is a JSON object with the same keys as the dict built by
+the Processor view. The run summary is written as JSON to stdout (or to
+``--summary``). Exit codes: 0 all files succeeded, 1 one or more files
+failed, 2 invalid arguments or no input files.
+"""
+
+import argparse
+import collections
+import glob
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from src.core.batch import BatchProcessor
+from src.core.capabilities import CapabilityCache
+from src.core.concurrency import AdaptiveConcurrency
+from src.core.loudness import LoudnessAnalyzer, LoudnessCache
+from src.core.metadata import MetadataManager
+from src.core.probe import Prober
+from src.core.metadata_cache import MetadataCache
+from src.core.processor import AudioProcessor
+from src.core.progress import format_progress
+from src.core.queue_model import QueueItem, QueueModel
+from src.core.scheduler import ProcessScheduler
+from src.core.telemetry import JsonlSink, PrometheusSink, StageSummary, telemetry
+from src.core.transcode_cache import TranscodeCache
+from src.utils.helpers import get_cache_dir
+from src.utils.scanner import scan_audio_files
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+# Mirrors the defaults of ProcessorView
+DEFAULT_OPTIONS = {
+    "format": "mp3",
+    "quality": "high",
+    "sample_rate": 44100,
+    "channels": 2,
+    "normalize": False,
+    "loudnorm_two_pass": True,
+    "trim_silence": False,
+    "noise_reduction": False,
+    "fade_in": 0.0,
+    "fade_out": 0.0,
+    "pitch": 1.0,
+    "speed": 1.0,
+    "embed_art": True,
+    "art_max_size": 1000,
+    "art_max_kb": 300,
+    "output_dir": os.path.expanduser("~/Music/MusicForge_Output")
+}
+
+SUPPORTED_FORMATS = ("mp3", "wav", "flac", "ogg", "m4a")
+
+def collect_inputs(patterns):
+    """Expand files, directories and glob patterns into a deduplicated list of audio paths."""
+    found = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            p = Path(match)
+            if p.is_dir():
+                for batch in scan_audio_files(p):
+                    found.extend(Path(c) for c in batch)
+            elif p.is_file():
+                found.append(p)
+
+    seen = set()
+    paths = []
+    for p in found:
+        key = str(p.resolve())
+        if key not in seen:
+            seen.add(key)
+            paths.append(key)
+    return paths
+
+def load_options(options_file=None, output_dir=None):
+    """Merge an options file over the defaults and validate the result."""
+    options = dict(DEFAULT_OPTIONS)
+    if options_file:
+        with open(options_file, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        if not isinstance(loaded, dict):
+            raise ValueError("options file must contain a JSON object")
+        options.update(loaded)
+    if output_dir:
+        options["output_dir"] = output_dir
+
+    if options["format"] not in SUPPORTED_FORMATS:
+        raise ValueError(f"unsupported format: {options['format']}")
+    targets = options.get("targets")
+    if targets:
+        if not isinstance(targets, list) or not all(isinstance(t, dict) and "format" in t for t in targets):
+            raise ValueError('targets must be a list of objects with a "format"')
+        formats = [t["format"] for t in targets]
+        for fmt in formats:
+            if fmt not in SUPPORTED_FORMATS:
+                raise ValueError(f"unsupported format: {fmt}")
+        if len(set(formats)) != len(formats):
+            # Outputs are named after the format, so two would collide
+            raise ValueError("each format may appear only once in targets")
+    for key in ("art_max_size", "art_max_kb"):
+        value = options.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{key} must be a positive number or null")
+    options["output_dir"] = os.path.expanduser(str(options["output_dir"]))
+    return options
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Batch-convert audio files with Music Forge, without the GUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="Input files, folders or glob patterns")
+    parser.add_argument("-o", "--options", help="JSON options file (same keys as the Processor view)")
+    parser.add_argument("--output-dir", help="Override the output directory from the options file")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of parallel workers (default: CPU count)")
+    parser.add_argument("--adaptive", action="store_true", help="Lower concurrency below --workers while the system is overloaded")
+    parser.add_argument("--timeout", type=float, default=None, help="Kill any single encode that runs longer than this many seconds")
+    parser.add_argument("--summary", help="Write the JSON summary to this file instead of stdout")
+    parser.add_argument("--no-tags", action="store_true", help="Do not copy source tags to the outputs")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the persistent metadata, loudness and transcode caches")
+    parser.add_argument("--cache-size", type=float, default=20.0, help="Size limit of the transcode cache in GB (default: 20)")
+    parser.add_argument("--telemetry", help="Append per-stage timings and worker pool gauges to this JSONL file")
+    parser.add_argument("--metrics", help="Keep a Prometheus textfile of the stage totals at this path")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print per-file progress to stderr")
+    return parser
+
+def run(args):
+    try:
+        options = load_options(args.options, args.output_dir)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        print("error: no input files found", file=sys.stderr)
+        return EXIT_USAGE
+    if args.workers is not None and args.workers < 1:
+        print("error: --workers must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    # Options this FFmpeg cannot honour fail here, before any file is read
+    processor = AudioProcessor(capabilities=None if args.no_cache else CapabilityCache(get_cache_dir() / "ffmpeg.json"))
+    problems = processor.check_options(options)
+    if problems:
+        for problem in problems:
+            print(f"error: {problem}", file=sys.stderr)
+        return EXIT_USAGE
+
+    # Telemetry stays off, and costs nothing, unless a sink is asked for
+    sinks = []
+    try:
+        if args.telemetry:
+            sinks.append(JsonlSink(args.telemetry))
+        if args.metrics:
+            sinks.append(PrometheusSink(args.metrics))
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    stages = StageSummary() if sinks else None
+    for sink in sinks + ([stages] if stages else []):
+        telemetry.subscribe(sink)
+
+    cache = None if args.no_cache else MetadataCache(get_cache_dir() / "metadata.db")
+    metadata = MetadataManager(cache=cache)
+    items = QueueModel()
+    for p in paths:
+        info = metadata.read_info(p)
+        items.append(QueueItem(p, None if args.no_tags else info["tags"], duration=info["stream"].get("length")))
+
+    # On a terminal a live status line is redrawn below the per-file lines
+    live = not args.quiet and sys.stderr.isatty()
+    clear_line = "\r\x1b[K" if live else ""
+
+    def on_result(job):
+        if not args.quiet:
+            outputs = ", ".join(output["output"] for output in job["outputs"])
+            print(f"{clear_line}[{job['status']}] {job['input']} -> {outputs}", file=sys.stderr)
+
+    preflight = {"probed": 0, "unreadable": []}
+
+    def on_preflight(report):
+        preflight.update(report)
+        if not args.quiet:
+            for path, error in report["unreadable"]:
+                print(f"{clear_line}[unreadable] {path}: {error}", file=sys.stderr)
+
+    def on_progress(progress):
+        sys.stderr.write(f"{clear_line}{format_progress(progress.summary())}")
+        sys.stderr.flush()
+
+    loudness_cache = None if args.no_cache else LoudnessCache(get_cache_dir() / "loudness.db")
+    loudness = LoudnessAnalyzer(processor, cache=loudness_cache, digests=cache)
+    scheduler = ProcessScheduler(max_workers=args.workers)
+    concurrency = AdaptiveConcurrency(scheduler, cap=scheduler.max_workers, adaptive=args.adaptive)
+    transcode_cache = None if args.no_cache else TranscodeCache(
+        get_cache_dir() / "transcodes", max_bytes=int(args.cache_size * 1024 ** 3), digests=cache
+    )
+    prober = Prober(cache=cache)
+    batch = BatchProcessor(
+        processor, scheduler, loudness=loudness, timeout=args.timeout, transcode_cache=transcode_cache, prober=prober,
+        metadata=metadata
+    )
+    start = time.perf_counter()
+    try:
+        futures = batch.submit(
+            items, options, on_result=on_result, on_progress=on_progress if live else None, on_preflight=on_preflight
+        )
+        jobs = [f.result() for f in futures]
+        if live:
+            sys.stderr.write("\n")
+    finally:
+        concurrency.stop()
+        scheduler.shutdown(wait=True)
+        if cache:
+            cache.close()
+        if loudness_cache:
+            loudness_cache.close()
+        if transcode_cache:
+            transcode_cache.close()
+        for sink in sinks + ([stages] if stages else []):
+            telemetry.unsubscribe(sink)
+        for sink in sinks:
+            sink.close()
+
+    failed = sum(1 for job in jobs if job["status"] != "ok")
+    summary = {
+        "total": len(jobs),
+        "succeeded": len(jobs) - failed,
+        "failed": failed,
+        "unreadable": len(preflight["unreadable"]),
+        "paths": dict(collections.Counter(job["path"] for job in jobs if job["path"])),
+        "workers": concurrency.cap,
+        "throughput": batch.progress.summary(),
+        "elapsed": round(time.perf_counter() - start, 3),
+        "options": options,
+        "metadata_cache": cache.stats() if cache else None,
+        "loudness_cache": loudness_cache.stats() if loudness_cache else None,
+        "transcode_cache": transcode_cache.stats() if transcode_cache else None,
+        "artwork": batch.artwork.stats() if batch.artwork else None,
+        "stages": stages.snapshot()["stages"] if stages else None,
+        "files": jobs
+    }
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    return EXIT_FAILED if failed else EXIT_OK
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
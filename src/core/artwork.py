@@ -0,0 +1,127 @@
+import concurrent.futures
+import io
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+# Output formats whose container FFmpeg can attach a cover picture to
+ART_FORMATS = {"mp3", "flac", "m4a"}
+
+# JPEG qualities tried, best first, when art must fit a byte budget
+JPEG_QUALITIES = (90, 85, 75, 65, 55)
+# Each further attempt shrinks the picture by this much
+SHRINK_STEP = 0.75
+
+def image_extension(data):
+    """File extension of PNG or JPEG bytes, or None for other image types."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if data[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    return None
+
+def prepare_art(data, max_size=None, max_bytes=None):
+    """Fit cover art within a pixel edge and a byte budget; returns (bytes, extension).
+
+    PNG and JPEG art already within both limits is returned unchanged.
+    Anything else is re-encoded as JPEG, scaled down to ``max_size`` on
+    its longest edge and then stepped down in quality, and if need be in
+    size, until it fits ``max_bytes``. Raises OSError for undecodable data.
+    """
+    ext = image_extension(data)
+    image = Image.open(io.BytesIO(data))
+    fits_size = not max_size or max(image.size) <= max_size
+    if ext and fits_size and (not max_bytes or len(data) <= max_bytes):
+        return data, ext
+    if max_size:
+        image.draft("RGB", (max_size, max_size))
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    while True:
+        for quality in JPEG_QUALITIES:
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=quality, optimize=True)
+            if not max_bytes or out.tell() <= max_bytes:
+                return out.getvalue(), ".jpg"
+        if min(image.size) <= 64:
+            # Give up on the budget rather than ship an unrecognizable picture
+            return out.getvalue(), ".jpg"
+        image = image.resize(
+            (max(1, int(image.width * SHRINK_STEP)), max(1, int(image.height * SHRINK_STEP))),
+            Image.Resampling.LANCZOS
+        )
+
+class PreparedArt:
+    """A cover picture ready to be attached to outputs."""
+    __slots__ = ("path", "art_hash", "original")
+
+    def __init__(self, path, art_hash, original):
+        self.path = path
+        self.art_hash = art_hash
+        # True when the bytes are the source's own, so a copied file already carries them
+        self.original = original
+
+class ArtworkPreparer:
+    """Prepares the cover art of one batch, once per distinct picture.
+
+    Files are matched to their picture through the cover hash that the
+    MetadataManager records, so the audio is only read for the first file
+    of each picture (usually the first track of an album); every other
+    file sharing it gets the same prepared image. Images are written to a
+    temporary directory that ``cleanup`` removes.
+    """
+    def __init__(self, metadata, max_size=None, max_bytes=None):
+        self.metadata = metadata
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.directory = Path(tempfile.mkdtemp(prefix="mf-art-"))
+        self.extracted = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, path_str):
+        """Return the PreparedArt of a file, or None if it has no usable art."""
+        art_hash = self.metadata.read_info(str(path_str)).get("cover_hash")
+        if art_hash is None:
+            return None
+        with self._lock:
+            future = self._prepared.get(art_hash)
+            owner = future is None
+            if owner:
+                future = self._prepared[art_hash] = concurrent.futures.Future()
+        if not owner:
+            return future.result()
+        try:
+            art = self._prepare(str(path_str), art_hash)
+        except Exception:
+            # Undecodable art is left out rather than failing the file
+            art = None
+        future.set_result(art)
+        return art
+
+    def _prepare(self, path_str, art_hash):
+        data = self.metadata.get_cover_art(path_str)
+        if not data:
+            return None
+        prepared, ext = prepare_art(data, self.max_size, self.max_bytes)
+        path = self.directory / f"{art_hash}{ext}"
+        path.write_bytes(prepared)
+        with self._lock:
+            self.extracted += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(prepared)
+        return PreparedArt(path, art_hash, prepared is data)
+
+    def stats(self):
+        """Return the number of distinct pictures prepared and their size before and after."""
+        with self._lock:
+            return {"images": self.extracted, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,495 @@
+import asyncio
+import concurrent.futures
+import subprocess
+import time
+from pathlib import Path
+
+from src.core.artwork import ArtworkPreparer
+from src.core.metadata import MetadataManager
+from src.core.probe import ProbeError
+from src.core.progress import BatchProgress
+from src.core.telemetry import telemetry
+from src.core.transcode_cache import OutputManifest, link_or_copy
+
+def _chain(source, target):
+    """Mirror a scheduler future into the future handed to the caller, both ways for cancellation."""
+    def copy(done):
+        if done.cancelled():
+            target.cancel()
+            return
+        try:
+            if done.exception() is not None:
+                target.set_exception(done.exception())
+            else:
+                target.set_result(done.result())
+        except concurrent.futures.InvalidStateError:
+            # The caller cancelled it first
+            pass
+
+    source.add_done_callback(copy)
+    target.add_done_callback(lambda done: done.cancelled() and source.cancel())
+
+# Ways an output can be produced, most expensive first
+PATHS = ("encode", "remux", "retag", "cached")
+
+# A retagged copy is edited in place, so it must not share the input's inode
+RETAG_METHODS = ("reflink", "copy")
+
+class _BatchRun:
+    """State shared by the jobs of one submit() call."""
+    __slots__ = ("options", "on_result", "on_progress", "progress", "manifest", "artwork", "remaining",
+                 "last_progress", "manifest_saved")
+
+    def __init__(self, options, on_result, on_progress, progress, manifest, count, artwork=None):
+        self.options = options
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.progress = progress
+        self.manifest = manifest
+        self.artwork = artwork
+        self.remaining = count
+        self.last_progress = 0.0
+        self.manifest_saved = time.monotonic()
+
+class BatchProcessor:
+    """Runs queued files through an AudioProcessor on a ProcessScheduler.
+
+    Every file is one coroutine on the scheduler's event loop, so a batch of
+    any size costs no threads. With a Prober, every file is first probed in
+    parallel: unreadable files fail before any encode starts, and the
+    probed durations drive the fade-out and the job order, longest first,
+    so no long file is left to run alone at the end of the batch. With
+    loudness normalization in two-pass mode and a LoudnessAnalyzer given,
+    every measurement pass is submitted before the first encode, so the
+    analyses run in parallel ahead of the encodes that wait on them.
+    ``timeout`` (seconds) kills encodes that hang.
+
+    Progress of the most recent batch is tracked in ``self.progress`` (a
+    BatchProgress) from FFmpeg's -progress stream; only the last
+    STDERR_TAIL lines of each encode's stderr are kept for error reports.
+
+    With a TranscodeCache, outputs that are already up to date according to
+    the output directory's manifest are left alone, and cached encodes are
+    linked or copied into place; only the remaining files are encoded.
+
+    With several output targets (``options["targets"]``), each file is
+    still one FFmpeg run: the input is decoded and filtered once and split
+    into one encoder per target that is not already up to date.
+
+    Targets that need no re-encode (no active filter, and the probed
+    codec, sample rate and channels already match) skip the encoder: a
+    file already in the target container is copied and retagged, any
+    other is remuxed with ``-c:a copy``. Each job reports the path taken,
+    one of PATHS.
+
+    With ``options["embed_art"]`` and a MetadataManager given, each
+    distinct cover picture of the batch is extracted once, fitted to
+    ``options["art_max_size"]`` pixels and ``options["art_max_kb"]``
+    kilobytes, and attached to every output of the files sharing it. The
+    preparer of the most recent batch is kept in ``self.artwork``.
+    """
+    STDERR_TAIL = 40
+    PROGRESS_INTERVAL = 0.25
+    MANIFEST_INTERVAL = 5.0
+
+    def __init__(self, processor, scheduler, loudness=None, timeout=None, transcode_cache=None, prober=None, metadata=None):
+        self.processor = processor
+        self.scheduler = scheduler
+        self.loudness = loudness
+        self.timeout = timeout
+        self.transcode_cache = transcode_cache
+        self.prober = prober
+        self.metadata = metadata
+        self.progress = None
+        self.artwork = None
+
+    @staticmethod
+    def output_path_for(input_path, options):
+        """Return the output path for an input file under the given options."""
+        output_dir = Path(options["output_dir"])
+        return output_dir / f"{Path(input_path).stem}.{options['format']}"
+
+    @staticmethod
+    def targets(options):
+        """Per-target options: one per entry of ``options["targets"]``, else just options.
+
+        Each target is a dict with "format" and optionally "quality" (the
+        batch quality by default); a format listed twice is encoded once.
+        """
+        targets = options.get("targets")
+        if not targets:
+            return [options]
+        base = {key: value for key, value in options.items() if key != "targets"}
+        result, seen = [], set()
+        for target in targets:
+            if target["format"] in seen:
+                continue
+            seen.add(target["format"])
+            result.append(dict(base, format=target["format"], quality=target.get("quality", base.get("quality"))))
+        return result
+
+    def submit(self, file_items, options, on_result=None, on_progress=None, on_preflight=None):
+        """Submit every queue item to the scheduler and return one future per item.
+
+        ``on_progress(batch_progress)`` is called from the scheduler thread,
+        at most every PROGRESS_INTERVAL seconds and after each file.
+        ``on_preflight(report)`` is called from the scheduler thread once
+        the probe stage is over, before the first encode, with
+        {"probed", "unreadable": [(path, error)]}.
+
+        Raises ValueError, before anything is queued, when FFmpeg cannot
+        honour the options (see AudioProcessor.check_options).
+        """
+        problems = self.processor.check_options(options)
+        if problems:
+            raise ValueError("; ".join(problems))
+        output_dir = Path(options["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        file_items = list(file_items)
+        self.progress = BatchProgress(
+            (str(file_item.path), self._output_duration(file_item.duration, options))
+            for file_item in file_items
+        )
+        manifest = OutputManifest(output_dir) if self.transcode_cache else None
+        artwork = None
+        if options.get("embed_art") and self.metadata:
+            max_kb = options.get("art_max_kb")
+            artwork = ArtworkPreparer(self.metadata, options.get("art_max_size"), int(max_kb * 1024) if max_kb else None)
+        self.artwork = artwork
+        run = _BatchRun(options, on_result, on_progress, self.progress, manifest, len(file_items), artwork)
+
+        futures = [concurrent.futures.Future() for _ in file_items]
+        self.scheduler.submit(self._run_batch, run, file_items, futures, on_preflight)
+        return futures
+
+    @staticmethod
+    def _output_duration(duration, options):
+        # Speed changes (atempo, asetrate+atempo) scale the output timeline
+        speed = options.get("speed", 1.0) or 1.0
+        return duration / speed if duration else None
+
+    async def _probe(self, input_path):
+        """Return (probe, error); error is set only for unreadable files."""
+        if telemetry.enabled:
+            # Each probe runs as its own task, so the binding ends with it
+            telemetry.bind(str(input_path))
+        try:
+            return await self.prober.probe_async(input_path, self.scheduler), None
+        except ProbeError as e:
+            return None, str(e)
+        except OSError:
+            # ffprobe missing: the files are not known to be bad
+            return None, None
+
+    async def _run_batch(self, run, file_items, futures, on_preflight):
+        """Probe every file, then submit the jobs longest first."""
+        options = run.options
+        measurements, jobs = [], []
+        measured = telemetry.enabled
+        if measured:
+            for file_item in file_items:
+                telemetry.open_job(str(Path(file_item.path)))
+        try:
+            if self.prober:
+                probes = await asyncio.gather(*(self._probe(file_item.path) for file_item in file_items))
+            else:
+                probes = [(None, None)] * len(file_items)
+
+            runnable, unreadable = [], []
+            for file_item, (probe, error), future in zip(file_items, probes, futures):
+                input_path = Path(file_item.path)
+                if error is not None:
+                    unreadable.append((input_path, error, future))
+                    continue
+                duration = probe["duration"] if probe and probe["duration"] else file_item.duration
+                if probe and probe["duration"]:
+                    run.progress.set_duration(str(input_path), self._output_duration(duration, options))
+                runnable.append((duration or 0.0, file_item, probe, future))
+            if on_preflight:
+                on_preflight({
+                    "probed": len(file_items) if self.prober else 0,
+                    "unreadable": [(str(input_path), error) for input_path, error, _ in unreadable]
+                })
+            for input_path, error, future in unreadable:
+                job = self._failed_job(input_path, options, f"unreadable: {error}")
+                await self._finish(run, job)
+                try:
+                    future.set_result(job)
+                except concurrent.futures.InvalidStateError:
+                    pass
+
+            runnable.sort(key=lambda entry: entry[0], reverse=True)
+            two_pass = self.loudness is not None and options.get("normalize") and options.get("loudnorm_two_pass", True)
+            measurements = [
+                self.scheduler.submit(self._measure, Path(file_item.path), options, -duration) if two_pass else None
+                for duration, file_item, _, _ in runnable
+            ]
+
+            for (duration, file_item, probe, future), measurement in zip(runnable, measurements):
+                input_path = Path(file_item.path)
+                job = self.scheduler.submit(
+                    self._process_single_file,
+                    run,
+                    input_path,
+                    file_item.tags,
+                    measurement,
+                    probe,
+                    -duration
+                )
+                _chain(job, future)
+                jobs.append(job)
+            await asyncio.gather(*(asyncio.wrap_future(job) for job in jobs), return_exceptions=True)
+        finally:
+            for job in measurements + jobs:
+                if job is not None:
+                    job.cancel()
+            for future in futures:
+                future.cancel()
+            if run.artwork:
+                run.artwork.cleanup()
+            if measured:
+                # Jobs cancelled before they finished
+                for file_item in file_items:
+                    telemetry.close_job(str(Path(file_item.path)), status="cancelled", path=None)
+
+    async def _measure(self, input_path, options, priority):
+        if telemetry.enabled:
+            telemetry.bind(str(input_path))
+        return await self.loudness.measure_async(input_path, options, self.scheduler, priority)
+
+    def cancel(self):
+        """Cancel all queued and running jobs, killing their FFmpeg processes."""
+        self.scheduler.cancel_all()
+
+    def _report(self, run, force=False):
+        now = time.monotonic()
+        if run.on_progress and run.progress is self.progress and (force or now - run.last_progress >= self.PROGRESS_INTERVAL):
+            run.last_progress = now
+            run.on_progress(run.progress)
+
+    def _cache_key(self, input_path, options):
+        return self.transcode_cache.key_for(input_path, options, self.processor.ffmpeg_version())
+
+    def _outputs(self, input_path, options):
+        """(output path, target options) of every target of a file."""
+        return [(self.output_path_for(input_path, target), target) for target in self.targets(options)]
+
+    @staticmethod
+    def _cache_summary(states):
+        # "unchanged" only if every output was, "hit" if nothing had to be encoded
+        if None in states:
+            return None
+        if all(state == "unchanged" for state in states):
+            return "unchanged"
+        return "miss" if "miss" in states else "hit"
+
+    def _failed_job(self, input_path, options, error):
+        outputs = self._outputs(input_path, options)
+        return {
+            "input": str(input_path),
+            "output": str(outputs[0][0]),
+            "outputs": [
+                {"output": str(path), "format": target["format"], "cache": None, "path": None}
+                for path, target in outputs
+            ],
+            "status": "failed",
+            "returncode": -1,
+            "error": error,
+            "loudnorm": None,
+            "cache": None,
+            "path": None,
+            "probe": None,
+            "art": None,
+            "elapsed": 0.0
+        }
+
+    async def _process_single_file(self, run, input_path, tags, measurement=None, probe=None, priority=0):
+        """Scheduler task for a single file and all of its output targets."""
+        if telemetry.enabled:
+            # Threads started with asyncio.to_thread inherit the binding
+            telemetry.bind(str(input_path))
+        # Merge tags into options
+        task_options = run.options.copy()
+        task_options["tags"] = tags
+        if probe and probe["duration"]:
+            task_options["duration"] = probe["duration"]
+        outputs = self._outputs(input_path, task_options)
+
+        cache_keys = [None] * len(outputs)
+        if self.transcode_cache:
+            try:
+                cache_keys = await asyncio.to_thread(
+                    lambda: [self._cache_key(input_path, target) for _, target in outputs]
+                )
+            except OSError:
+                # Unreadable input; the encode below reports the error
+                pass
+            except Exception:
+                # The digest cache failed; encode without the transcode cache
+                cache_keys = [None] * len(outputs)
+
+        states = [None] * len(outputs)
+        paths = [None] * len(outputs)
+        codes, errors, elapsed = {}, [], 0.0
+        art = None
+        start = time.perf_counter()
+        try:
+            for i, ((output_path, _), cache_key) in enumerate(zip(outputs, cache_keys)):
+                if cache_key and run.manifest.is_current(output_path, cache_key):
+                    states[i] = "unchanged"
+                elif cache_key:
+                    cached = await asyncio.to_thread(self.transcode_cache.lookup, cache_key)
+                    if cached is not None:
+                        await asyncio.to_thread(link_or_copy, cached, output_path)
+                        states[i] = "hit"
+                if states[i]:
+                    paths[i], codes[i] = "cached", 0
+            pending = [i for i, state in enumerate(states) if state is None]
+            if pending and run.artwork:
+                # Shared by every file with the same picture, prepared by the first
+                art = await asyncio.to_thread(run.artwork.prepare, str(input_path))
+            encode = []
+            for i in pending:
+                mode = self._fast_path(input_path, outputs[i][1], probe, art)
+                if mode is None:
+                    encode.append(i)
+                    continue
+                codes[i], error, took, paths[i] = await self._copy(run, input_path, outputs[i], mode, priority, art)
+                elapsed += took
+                if error:
+                    errors.append(error)
+            if encode:
+                # The targets still missing share one decode and filter pass
+                returncode, error, took = await self._encode(
+                    run, input_path, [outputs[i] for i in encode], task_options, measurement, priority, art
+                )
+                elapsed += took
+                if error:
+                    errors.append(error)
+                for i in encode:
+                    codes[i], paths[i] = returncode, "encode"
+            elif measurement is not None:
+                measurement.cancel()
+            for i in pending:
+                if cache_keys[i]:
+                    states[i] = "miss"
+                    # Stream copies are as cheap as a cache hit, so only encodes are stored
+                    if paths[i] == "encode" and codes[i] == 0:
+                        await asyncio.to_thread(self.transcode_cache.store, cache_keys[i], outputs[i][0])
+            returncode = next((code for code in codes.values() if code), 0)
+        except OSError as e:
+            # FFmpeg missing or not executable, or the output could not be written
+            returncode, errors = -1, [str(e)]
+        except Exception as e:
+            # Anything else fails this file only; it is still reported and counted
+            returncode, errors = -1, [f"{type(e).__name__}: {e}"]
+        if not elapsed:
+            elapsed = time.perf_counter() - start
+
+        for i, ((output_path, _), cache_key) in enumerate(zip(outputs, cache_keys)):
+            if cache_key and codes.get(i) == 0:
+                run.manifest.record(output_path, cache_key, input_path)
+        cache_state = self._cache_summary(states) if self.transcode_cache else None
+        encoded = "encode" in paths
+        job = {
+            "input": str(input_path),
+            "output": str(outputs[0][0]),
+            "outputs": [
+                {"output": str(path), "format": target["format"], "cache": state, "path": taken}
+                for (path, target), state, taken in zip(outputs, states, paths)
+            ],
+            "status": "ok" if returncode == 0 else "failed",
+            "returncode": returncode,
+            "error": "\n".join(errors),
+            "loudnorm": ("two_pass" if task_options.get("loudness") else "single_pass") if run.options.get("normalize") and encoded else None,
+            "cache": cache_state,
+            "path": next((path for path in PATHS if path in paths), None),
+            "probe": probe,
+            "art": art.art_hash if art else None,
+            "elapsed": round(elapsed, 3)
+        }
+        await self._finish(run, job)
+        return job
+
+    def _fast_path(self, input_path, target, probe, art=None):
+        """How a target can skip the encoder: "retag", "remux", or None to encode."""
+        if not self.processor.can_stream_copy(target, probe):
+            return None
+        if Path(input_path).suffix.lower() != f".{target['format']}":
+            return "remux"
+        # Same container: copying the file and rewriting its tags is enough,
+        # unless its picture has to be swapped for a resized one
+        return "retag" if art is None or art.original else "remux"
+
+    async def _copy(self, run, input_path, output, mode, priority=0, art=None):
+        """Produce one output without encoding; returns (returncode, error, elapsed, path taken)."""
+        output_path, target = output
+        start = time.perf_counter()
+        if mode == "retag":
+            # Never hardlinked: the tags are rewritten in place
+            await asyncio.to_thread(link_or_copy, input_path, output_path, RETAG_METHODS)
+            tags = {key: value for key, value in (target.get("tags") or {}).items() if value}
+            if not tags or await asyncio.to_thread(MetadataManager.write_tags, str(output_path), tags):
+                return 0, "", time.perf_counter() - start, "retag"
+            # The tag writer cannot handle this file; let FFmpeg rewrite it
+        # An old output may be a hardlink into the cache: replace it, never write through it
+        output_path.unlink(missing_ok=True)
+        try:
+            result = await self.processor.remux_async(
+                input_path, output_path, target, self.scheduler, timeout=self.timeout,
+                tail=self.STDERR_TAIL, priority=priority, art=art.path if art else None
+            )
+        except subprocess.TimeoutExpired as e:
+            return -1, f"timed out after {e.timeout}s", e.timeout, "remux"
+        return result.returncode, result.stderr if result.returncode else "", time.perf_counter() - start, "remux"
+
+    async def _finish(self, run, job):
+        run.progress.finish_job(job["input"], job["status"] == "ok")
+        telemetry.close_job(job["input"], status=job["status"], path=job["path"])
+        self._report(run, force=True)
+        await self._job_done(run)
+        if run.on_result:
+            run.on_result(job)
+
+    async def _encode(self, run, input_path, outputs, task_options, measurement, priority=0, art=None):
+        """Encode one file to the given (path, target) outputs; returns (returncode, error, elapsed)."""
+        if measurement is not None:
+            # None (unmeasurable input) falls back to single-pass loudnorm
+            task_options["loudness"] = await asyncio.wrap_future(measurement)
+        if self.transcode_cache:
+            # An old output may be a hardlink into the cache: replace it, never write through it
+            for output_path, _ in outputs:
+                output_path.unlink(missing_ok=True)
+        if len(outputs) == 1:
+            output_file, target = outputs[0]
+            options = dict(task_options, format=target["format"], quality=target.get("quality"))
+        else:
+            output_file, options = outputs, task_options
+        key = str(input_path)
+
+        def on_progress(snapshot):
+            run.progress.update_job(key, snapshot)
+            self._report(run)
+
+        try:
+            result = await self.processor.process_async(
+                input_path, output_file, options, self.scheduler, timeout=self.timeout,
+                on_progress=on_progress, tail=self.STDERR_TAIL, priority=priority, art=art.path if art else None
+            )
+        except subprocess.TimeoutExpired as e:
+            return -1, f"timed out after {e.timeout}s", e.timeout
+        return result.returncode, result.stderr if result.returncode else "", result.elapsed
+
+    async def _job_done(self, run):
+        run.remaining -= 1
+        if run.manifest is None:
+            return
+        now = time.monotonic()
+        if not run.remaining or now - run.manifest_saved >= self.MANIFEST_INTERVAL:
+            run.manifest_saved = now
+            try:
+                await asyncio.to_thread(run.manifest.save)
+            except OSError:
+                # The manifest only speeds up re-runs
+                pass
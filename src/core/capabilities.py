@@ -0,0 +1,143 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+# Encoders of each output format, best first
+FORMAT_ENCODERS = {
+    "mp3": ("libmp3lame", "libshine"),
+    "wav": ("pcm_s16le",),
+    "flac": ("flac",),
+    "ogg": ("libvorbis", "vorbis"),
+    "m4a": ("libfdk_aac", "aac", "aac_at")
+}
+
+# Encoders FFmpeg only runs with -strict experimental
+EXPERIMENTAL_ENCODERS = {"vorbis"}
+
+_ENCODER_LINE = re.compile(r"^\s*A[F.][S.][X.][B.][D.]\s+([^=\s]\S*)\s")
+_FILTER_LINE = re.compile(r"^\s*[T.][S.][C.]?\s+(\S+)\s+\S*->\S*\s")
+
+def parse_encoders(text):
+    """Names of the audio encoders in ``ffmpeg -encoders`` output."""
+    return {match.group(1) for match in map(_ENCODER_LINE.match, text.splitlines()) if match}
+
+def parse_filters(text):
+    """Names of the filters in ``ffmpeg -filters`` output."""
+    return {match.group(1) for match in map(_FILTER_LINE.match, text.splitlines()) if match}
+
+class FFmpegCapabilities:
+    """What an FFmpeg binary can do: its version line, audio encoders and filters.
+
+    ``runnable`` is False when the binary could not be started at all.
+    A binary that runs but lists no encoders (a wrapper script, say) is
+    treated as able to do anything, so checks only reject what is known
+    to be missing.
+    """
+    def __init__(self, version="", encoders=(), filters=(), runnable=True):
+        self.version = version
+        self.encoders = set(encoders)
+        self.filters = set(filters)
+        self.runnable = runnable
+
+    @property
+    def known(self):
+        return bool(self.encoders)
+
+    def has_filter(self, name):
+        return not self.filters or name in self.filters
+
+    def encoder_for(self, fmt):
+        """The best available encoder of an output format, or None if there is none or it is unknown."""
+        if not self.known:
+            # Leave the choice to FFmpeg
+            return None
+        return next((name for name in FORMAT_ENCODERS.get(fmt, ()) if name in self.encoders), None)
+
+    def to_dict(self):
+        return {"version": self.version, "encoders": sorted(self.encoders), "filters": sorted(self.filters)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["version"], data["encoders"], data["filters"])
+
+def probe_capabilities(ffmpeg_bin):
+    """Run FFmpeg's -version, -encoders and -filters; never raises."""
+    outputs = []
+    for flag in ("-version", "-encoders", "-filters"):
+        try:
+            result = subprocess.run(
+                [ffmpeg_bin, "-hide_banner", flag], capture_output=True, text=True, errors="replace",
+                stdin=subprocess.DEVNULL, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return FFmpegCapabilities(runnable=False)
+        outputs.append(result.stdout if result.returncode == 0 else "")
+    version = outputs[0].splitlines()[0].strip() if outputs[0].strip() else ""
+    return FFmpegCapabilities(version, parse_encoders(outputs[1]), parse_filters(outputs[2]))
+
+class CapabilityCache:
+    """Capabilities of FFmpeg binaries, persisted in a JSON file.
+
+    Entries are keyed by the binary's resolved path and checked against
+    its size and modification time, so FFmpeg is only asked again after
+    it was upgraded or replaced.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("binaries", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    @staticmethod
+    def _identity(ffmpeg_bin):
+        """(resolved path, size, mtime_ns) of a binary, or None if it is not a file."""
+        path = ffmpeg_bin if os.path.isfile(ffmpeg_bin) else shutil.which(ffmpeg_bin)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.realpath(path), st.st_size, st.st_mtime_ns
+
+    def get(self, ffmpeg_bin):
+        """Return the capabilities of a binary, probing it only when it changed."""
+        identity = self._identity(ffmpeg_bin)
+        if identity is None:
+            return FFmpegCapabilities(runnable=False)
+        path, size, mtime = identity
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry and entry.get("size") == size and entry.get("mtime_ns") == mtime:
+            try:
+                return FFmpegCapabilities.from_dict(entry)
+            except (KeyError, TypeError):
+                pass
+        capabilities = probe_capabilities(path)
+        if capabilities.runnable:
+            with self._lock:
+                self.entries[path] = dict(capabilities.to_dict(), size=size, mtime_ns=mtime)
+            self._save()
+        return capabilities
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps({"version": 1, "binaries": self.entries}, indent=1, sort_keys=True)
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            # Only costs a probe on the next start
+            if os.path.exists(tmp):
+                os.unlink(tmp)
@@ -0,0 +1,82 @@
+import threading
+
+from src.utils.sysload import SystemLoad
+
+class AdaptiveConcurrency:
+    """Adjusts a ProcessScheduler's limit to the live system load.
+
+    ``cap`` is the hard ceiling (the Settings value). In adaptive mode the
+    limit steps down by one while the CPUs are saturated, free memory is
+    short or the disks are the bottleneck (high I/O wait), and steps back
+    up towards the cap while the machine has headroom. Outside adaptive
+    mode the limit is simply the cap.
+    """
+    HIGH_LOAD = 1.0
+    LOW_LOAD = 0.75
+    MIN_FREE_MEMORY = 0.10
+    HIGH_IOWAIT = 0.20
+
+    def __init__(self, scheduler, cap, adaptive=False, interval=2.0, sampler=None):
+        self.scheduler = scheduler
+        self.cap = max(1, cap)
+        self.interval = interval
+        self.sampler = sampler or SystemLoad()
+        self.last_sample = None
+        self._adaptive = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.configure(cap, adaptive)
+
+    @property
+    def adaptive(self):
+        return self._adaptive
+
+    def configure(self, cap, adaptive):
+        """Apply a new cap and mode; safe to call from any thread."""
+        self.cap = max(1, cap)
+        self._adaptive = adaptive
+        if adaptive:
+            self.scheduler.set_max_workers(min(self.scheduler.max_workers, self.cap))
+            self._start()
+        else:
+            self.stop()
+            self.scheduler.set_max_workers(self.cap)
+
+    def next_limit(self, current, sample):
+        """The limit to use after current, given a SystemLoad sample."""
+        load, free_memory, iowait = sample["load"], sample["free_memory"], sample["iowait"]
+        if load is None and free_memory is None and iowait is None:
+            # Nothing to go on: trust the cap
+            return self.cap
+        overloaded = (
+            (load is not None and load > self.HIGH_LOAD)
+            or (free_memory is not None and free_memory < self.MIN_FREE_MEMORY)
+            or (iowait is not None and iowait > self.HIGH_IOWAIT)
+        )
+        if overloaded:
+            return max(1, min(current, self.cap) - 1)
+        if (load is None or load < self.LOW_LOAD) and (iowait is None or iowait < self.HIGH_IOWAIT / 2):
+            return min(self.cap, current + 1)
+        return min(current, self.cap)
+
+    def tick(self):
+        self.last_sample = self.sampler.sample()
+        limit = self.next_limit(self.scheduler.max_workers, self.last_sample)
+        if limit != self.scheduler.max_workers:
+            self.scheduler.set_max_workers(limit)
+
+    def _start(self):
+        if self._thread and self._thread.is_alive() and not self._stop_event.is_set():
+            return
+        # A fresh event per thread, so a restart never revives a stopping one
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="AdaptiveConcurrency", daemon=True)
+        self._thread.start()
+
+    def _run(self, stop_event):
+        while not stop_event.wait(self.interval):
+            self.tick()
+
+    def stop(self):
+        """Stop adapting; the current limit stays in place."""
+        self._stop_event.set()
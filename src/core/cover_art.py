@@ -0,0 +1,166 @@
+import concurrent.futures
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from src.utils.helpers import evict_lru
+
+# Edge of the thumbnails kept on disk; displays ask for this size or smaller
+THUMB_SIZE = 256
+THUMB_QUALITY = 85
+
+def make_thumbnail(data, size=THUMB_SIZE):
+    """Decode image bytes into an RGB image no larger than size x size."""
+    image = Image.open(io.BytesIO(data))
+    # JPEGs are decoded at a reduced scale straight away
+    image.draft("RGB", (size, size))
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+class CoverArtService:
+    """Cover art of queued files, as small ready-to-display images.
+
+    Images are stored once per distinct picture, keyed by the hash of the
+    embedded bytes that the MetadataManager already records per file, so
+    an album's tracks share one thumbnail and a file whose hash is known
+    is never parsed again. Thumbnails live on disk, bounded by size, and
+    the most recently used ones are held decoded in memory.
+    ``request`` does the work on a small thread pool so the UI thread only
+    ever receives finished images.
+    """
+    def __init__(self, root, metadata, max_bytes=512 * 1024 ** 2, max_images=512, max_workers=2):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.metadata = metadata
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._pending = {}
+        self._unreadable = set()
+        self._saved = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cover-art")
+
+    def thumb_path(self, art_hash):
+        return self.root / art_hash[:2] / f"{art_hash}.jpg"
+
+    def art_hash(self, path_str):
+        """Hash of a file's embedded picture, or None if it has none."""
+        return self.metadata.read_info(str(path_str)).get("cover_hash")
+
+    def thumbnail(self, path_str, size=THUMB_SIZE):
+        """Return a file's cover as an image at most size pixels wide and high, or None."""
+        art_hash = self.art_hash(path_str)
+        if art_hash is None:
+            return None
+        key = (art_hash, size)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            if art_hash in self._unreadable:
+                return None
+            self.misses += 1
+        image = self._load(art_hash)
+        if image is None:
+            image = self._extract(str(path_str), art_hash)
+        if image is None:
+            return None
+        if size < THUMB_SIZE:
+            image = image.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return image
+
+    def request(self, path_str, size=THUMB_SIZE):
+        """Return a Future of ``thumbnail(path_str, size)``.
+
+        Requests for a picture already being loaded share its Future.
+        """
+        path_str = str(path_str)
+        with self._lock:
+            future = self._pending.get((path_str, size))
+            if future is None:
+                future = self._executor.submit(self.thumbnail, path_str, size)
+                self._pending[(path_str, size)] = future
+                future.add_done_callback(lambda f, key=(path_str, size): self._done(key))
+        return future
+
+    def _done(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _load(self, art_hash):
+        path = self.thumb_path(art_hash)
+        try:
+            with Image.open(path) as image:
+                image.load()
+            os.utime(path)
+            return image
+        except (OSError, ValueError):
+            return None
+
+    def _extract(self, path_str, art_hash):
+        # The only place the audio file itself is read, once per distinct picture
+        data = self.metadata.get_cover_art(path_str)
+        if data and hashlib.sha1(data).hexdigest() != art_hash:
+            # Changed since it was parsed; store it under its real hash
+            art_hash = hashlib.sha1(data).hexdigest()
+        try:
+            image = make_thumbnail(data) if data else None
+        except (OSError, ValueError, Image.DecompressionBombError):
+            image = None
+        if image is None:
+            with self._lock:
+                self._unreadable.add(art_hash)
+            return None
+        self._store(art_hash, image)
+        return image
+
+    def _store(self, art_hash, image):
+        path = self.thumb_path(art_hash)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", suffix=".jpg", dir=path.parent)
+        os.close(fd)
+        try:
+            image.save(tmp, "JPEG", quality=THUMB_QUALITY)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return
+        with self._lock:
+            self._saved += 1
+            evict = self._saved % 256 == 0
+        if evict:
+            evict_lru(self.root.glob("*/*.jpg"), self.max_bytes)
+
+    def stats(self):
+        """Return memory hit/miss counters and the number of images held."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._images)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
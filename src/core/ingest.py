@@ -0,0 +1,165 @@
+import concurrent.futures
+import os
+import threading
+import time
+from pathlib import PurePath
+
+from src.core.metadata import MetadataManager
+from src.core.metadata_cache import MetadataCache
+from src.core.queue_model import QueueItem
+
+def _parse_chunk(paths):
+    """Process-pool task: parse a chunk of files."""
+    return [(path_str, MetadataManager.parse(path_str)) for path_str in paths]
+
+class IngestJob:
+    """Handle for a running ingestion: progress counters and cancellation."""
+    def __init__(self):
+        self.added = 0
+        self.skipped = 0
+        self.finished = threading.Event()
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+class IngestPipeline:
+    """Turns incoming paths into QueueItems, parsing tags on a process pool.
+
+    Cache hits are resolved on the coordinator thread for the cost of a
+    stat(); misses are parsed across cores in chunks. Items are delivered to
+    ``on_batch`` in batches as soon as they are ready, from a background
+    thread, so callers must marshal them to their own thread.
+    """
+    def __init__(self, metadata, max_workers=None, batch_size=250, chunk_size=32, flush_interval=0.1):
+        self.metadata = metadata
+        self.max_workers = max_workers or max(2, os.cpu_count() or 2)
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def start(self, paths, on_batch, on_done=None, skip=None):
+        """Start ingesting paths in the background and return an IngestJob.
+
+        ``paths`` may be any iterable of paths or of lists of paths (such as
+        the batches yielded by the directory scanner); it is consumed lazily.
+        Paths contained in ``skip`` (any container, such as the QueueModel)
+        are ignored.
+        """
+        job = IngestJob()
+        thread = threading.Thread(target=self._run, args=(job, paths, on_batch, on_done, skip), daemon=True)
+        thread.start()
+        return job
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @staticmethod
+    def _iter_paths(paths):
+        for entry in paths:
+            if isinstance(entry, (str, PurePath)):
+                yield str(entry)
+            else:
+                for path in entry:
+                    yield str(path)
+
+    def _run(self, job, paths, on_batch, on_done, skip):
+        cache = self.metadata.cache
+        seen = set()
+        keys = {}
+        ready = []
+        misses = []
+        futures = set()
+        last_flush = time.monotonic()
+
+        def emit(force=False):
+            nonlocal ready, last_flush
+            if ready and (force or len(ready) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval):
+                batch, ready = ready, []
+                job.added += len(batch)
+                last_flush = time.monotonic()
+                on_batch(batch)
+
+        def collect(parsed):
+            if cache:
+                cache.put_many([(path_str, keys[path_str], info) for path_str, info in parsed])
+            for path_str, info in parsed:
+                ready.append(QueueItem(path_str, info["tags"], keys.pop(path_str)[0], info["stream"].get("length")))
+
+        def submit_misses():
+            nonlocal misses
+            futures.add(self._get_executor().submit(_parse_chunk, misses))
+            misses = []
+
+        def drain(block):
+            nonlocal futures
+            if not futures:
+                return
+            done, futures = concurrent.futures.wait(
+                futures, timeout=None if block else 0,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if not future.cancelled():
+                    collect(future.result())
+
+        try:
+            for path_str in self._iter_paths(paths):
+                if job.cancelled:
+                    break
+                if path_str in seen or (skip is not None and path_str in skip):
+                    continue
+                seen.add(path_str)
+
+                key = MetadataCache.stat_key(path_str)
+                if key is None:
+                    job.skipped += 1
+                    continue
+                info = cache.get(path_str, key) if cache else None
+                if info is not None:
+                    ready.append(QueueItem(path_str, info["tags"], key[0], info["stream"].get("length")))
+                else:
+                    keys[path_str] = key
+                    misses.append(path_str)
+                    if len(misses) >= self.chunk_size:
+                        submit_misses()
+
+                # Keep a bounded number of chunks in flight
+                drain(block=len(futures) >= self.max_workers * 2)
+                emit()
+
+            if misses and not job.cancelled:
+                if futures or self._executor:
+                    submit_misses()
+                else:
+                    # Too few files to be worth spinning up the pool
+                    collect(_parse_chunk(misses))
+            while futures and not job.cancelled:
+                drain(block=True)
+                emit()
+        finally:
+            for future in futures:
+                future.cancel()
+            if not job.cancelled:
+                emit(force=True)
+            job.finished.set()
+            if on_done:
+                on_done(job)
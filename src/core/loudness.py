@@ -0,0 +1,152 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from src.utils.helpers import file_digest
+
+class LoudnessCache:
+    """Persistent SQLite cache of loudnorm measurements keyed by (content digest, analysis chain)."""
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path, max_entries=100000):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    def _init_schema(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS measurements")
+            self._conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS measurements ("
+            " digest TEXT NOT NULL,"
+            " chain TEXT NOT NULL,"
+            " measured TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (digest, chain))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS measurements_last_used ON measurements(last_used)")
+
+    def get(self, digest, chain):
+        """Return the cached measurements, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT measured FROM measurements WHERE digest=? AND chain=?", (digest, chain)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Lookups are rare next to an ffmpeg run, so recency is updated inline
+            self._conn.execute(
+                "UPDATE measurements SET last_used=? WHERE digest=? AND chain=?", (time.time(), digest, chain)
+            )
+        return json.loads(row[0])
+
+    def put(self, digest, chain, measured):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE measurements SET measured=?, last_used=? WHERE digest=? AND chain=?",
+                (json.dumps(measured), time.time(), digest, chain)
+            )
+            if cur.rowcount == 0:
+                self._conn.execute(
+                    "INSERT INTO measurements VALUES (?, ?, ?, ?)",
+                    (digest, chain, json.dumps(measured), time.time())
+                )
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Drop the least recently used entries down to 90% of the cap
+        excess = self._count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM measurements WHERE rowid IN (SELECT rowid FROM measurements ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": self._count
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class LoudnessAnalyzer:
+    """First pass of two-pass loudness normalization, with cached results.
+
+    Measurements are keyed by the content digest of the input and by the
+    filter chain in front of loudnorm, so exporting the same files again to
+    another format or bitrate skips the analysis entirely. ``digests`` is an
+    optional MetadataCache used to avoid re-hashing unchanged files.
+    """
+    def __init__(self, processor, cache=None, digests=None):
+        self.processor = processor
+        self.cache = cache
+        self.digests = digests
+
+    def _digest(self, path_str):
+        if self.digests:
+            return self.digests.digest(path_str)
+        return file_digest(path_str)
+
+    def _lookup(self, path_str, chain):
+        """Return (digest, cached measurements); digest is None without a cache."""
+        if not self.cache:
+            return None, None
+        digest = self._digest(path_str)
+        return digest, self.cache.get(digest, chain)
+
+    def measure(self, input_path, options):
+        """Return loudnorm measurements for a file, or None if it cannot be measured."""
+        path_str = str(input_path)
+        chain = self.processor.loudness_analysis_chain(options)
+        try:
+            digest, measured = self._lookup(path_str, chain)
+            if measured is None:
+                measured = self.processor.measure_loudness(path_str, options)
+                if measured is not None and digest is not None:
+                    self.cache.put(digest, chain, measured)
+        except OSError:
+            # Unreadable input, or FFmpeg missing or not executable
+            return None
+        return measured
+
+    async def measure_async(self, input_path, options, scheduler, priority=0):
+        """measure, with the FFmpeg pass run through a ProcessScheduler.
+
+        Hashing and cache access run on a helper thread so they never
+        block the scheduler's event loop.
+        """
+        path_str = str(input_path)
+        chain = self.processor.loudness_analysis_chain(options)
+        try:
+            digest, measured = await asyncio.to_thread(self._lookup, path_str, chain)
+            if measured is None:
+                measured = await self.processor.measure_loudness_async(path_str, options, scheduler, priority)
+                if measured is not None and digest is not None:
+                    await asyncio.to_thread(self.cache.put, digest, chain, measured)
+        except OSError:
+            return None
+        return measured
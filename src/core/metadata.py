@@ -1,65 +1,112 @@
-from pathlib import Path
-from mutagen import File
-from mutagen.easyid3 import EasyID3
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, APIC
+import hashlib
+
+from src.core.tagging import EASY_KEYS, tag_format, write_tags
+from src.core.telemetry import instrumented
+
+TAG_KEYS = ("title", "artist", "album", "year", "genre", "tracknumber")
 
 class MetadataManager:
     """Handles reading and writing audio metadata."""
+    def __init__(self, cache=None):
+        self.cache = cache
     
-    @staticmethod
-    def read_tags(path_str):
+    def read_tags(self, path_str):
         """Read tags from an audio file."""
-        p = Path(path_str)
-        tags = {
-            "title": "", 
-            "artist": "", 
-            "album": "", 
-            "year": "", 
-            "genre": "", 
-            "tracknumber": ""
-        }
+        return self.read_info(path_str)["tags"]
+
+    def read_info(self, path_str):
+        """Read tags, stream info and cover hash, using the cache when the file is unchanged."""
+        if self.cache is None:
+            return self.parse(path_str)
+        key = self.cache.stat_key(path_str)
+        info = self.cache.get(path_str, key)
+        if info is None:
+            info = self.parse(path_str)
+            self.cache.put(path_str, key, info)
+        return info
+
+    @staticmethod
+    @instrumented("read_tags")
+    def parse(path_str):
+        """Parse tags, stream info and a cover art hash from an audio file."""
+        tags = {key: "" for key in TAG_KEYS}
+        stream = {}
+        cover_hash = None
+        # mutagen is imported on first use, keeping it off the startup path
+        from mutagen import File
         try:
             audio = File(path_str, easy=True)
-            if audio:
+            # A file with no text tags is falsy but still has stream info and art
+            if audio is not None:
                 for key in tags.keys():
-                    if key in audio:
-                        tags[key] = audio[key][0]
+                    # Easy ID3 and MP4 tags call the year "date"
+                    for name in (key, EASY_KEYS.get(key)):
+                        if name and name in audio:
+                            tags[key] = audio[name][0]
+                            break
+                stream = MetadataManager._stream_info(audio.info)
+                # Vorbis/FLAC objects expose pictures directly; other
+                # containers need the non-easy interface.
+                if hasattr(audio, 'pictures'):
+                    art = audio.pictures[0].data if audio.pictures else None
+                else:
+                    art = MetadataManager.get_cover_art(path_str)
+                if art:
+                    cover_hash = hashlib.sha1(art).hexdigest()
         except Exception:
             pass
-        return tags
+        return {"tags": tags, "stream": stream, "cover_hash": cover_hash}
+
+    @staticmethod
+    def _stream_info(info):
+        stream = {}
+        for key in ("length", "bitrate", "sample_rate", "channels", "bits_per_sample"):
+            value = getattr(info, key, None)
+            if value is not None:
+                stream[key] = value
+        return stream
 
     @staticmethod
     def get_cover_art(path_str):
         """Extract cover art from an audio file."""
+        from mutagen import File
         try:
             audio = File(path_str)
             if audio and 'APIC:' in audio:
                 return audio['APIC:'].data
             elif audio and hasattr(audio, 'pictures') and audio.pictures:
                 return audio.pictures[0].data
+            elif audio and audio.tags is not None:
+                # Described ID3 pictures (preferring the front cover) and MP4 covers
+                if hasattr(audio.tags, 'getall'):
+                    frames = audio.tags.getall('APIC')
+                    if frames:
+                        return next((f for f in frames if f.type == 3), frames[0]).data
+                elif 'covr' in audio.tags and audio.tags['covr']:
+                    return bytes(audio.tags['covr'][0])
         except Exception:
             pass
         return None
 
     @staticmethod
+    @instrumented("write_tags")
     def write_tags(path_str, tags):
         """Write tags to an audio file."""
+        if tag_format(path_str):
+            try:
+                write_tags(path_str, tags)
+                return True
+            except Exception:
+                return False
+        # Containers without a dedicated writer (such as WAV)
+        from mutagen import File
         try:
-            audio = EasyID3(path_str)
-            for key, value in tags.items():
-                if key in EasyID3.valid_keys:
+            audio = File(path_str, easy=True)
+            if audio:
+                for key, value in tags.items():
                     audio[key] = value
-            audio.save()
-            return True
+                audio.save()
+                return True
         except Exception:
-            try:
-                audio = File(path_str, easy=True)
-                if audio:
-                    for key, value in tags.items():
-                        audio[key] = value
-                    audio.save()
-                    return True
-            except Exception:
-                pass
+            pass
         return False
@@ -0,0 +1,209 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.utils.helpers import file_digest
+
+class MetadataCache:
+    """Persistent SQLite cache of parsed metadata keyed by (path, size, mtime_ns).
+
+    Content digests and ffprobe results of files are memoized under the same
+    key, so content-keyed caches only hash a file again after it changed and
+    a batch only probes new or edited files.
+    """
+    SCHEMA_VERSION = 1
+    TOUCH_FLUSH_SIZE = 1000
+
+    def __init__(self, db_path, max_entries=250000):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = []
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _init_schema(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS entries")
+            self._conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " info TEXT NOT NULL,"
+            " cover_hash TEXT,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " digest TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " probe TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def stat_key(path_str):
+        """Return the (size, mtime_ns) validity key of a file, or None if it is missing."""
+        try:
+            st = os.stat(path_str)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path_str, key=None):
+        """Return the cached info dict if the file is unchanged, else None."""
+        key = key or self.stat_key(path_str)
+        with self._lock:
+            row = None
+            if key is not None:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, info FROM entries WHERE path=?", (path_str,)
+                ).fetchone()
+            if row is None or (row[0], row[1]) != key:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Recency updates are batched so a hit stays a single indexed read
+            self._touched.append(path_str)
+            if len(self._touched) >= self.TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+        return json.loads(row[2])
+
+    def put(self, path_str, key, info):
+        """Store the info dict of a file under its (size, mtime_ns) key."""
+        self.put_many([(path_str, key, info)])
+
+    def put_many(self, entries):
+        """Store several (path, key, info) entries in one transaction."""
+        now = time.time()
+        rows = [
+            (path_str, key[0], key[1], json.dumps(info), info.get("cover_hash"), now)
+            for path_str, key, info in entries if key is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    cur = self._conn.execute("UPDATE entries SET size=?, mtime_ns=?, info=?, cover_hash=?, last_used=? WHERE path=?", row[1:] + row[:1])
+                    if cur.rowcount == 0:
+                        self._conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)", row)
+                        self._count += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if self._count > self.max_entries:
+                self._evict()
+
+    def digest(self, path_str, key=None):
+        """Return the content digest of a file, hashing it only if it changed."""
+        key = key or self.stat_key(path_str)
+        if key is None:
+            raise FileNotFoundError(path_str)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, digest FROM digests WHERE path=?", (path_str,)
+            ).fetchone()
+        if row is not None and (row[0], row[1]) == key:
+            return row[2]
+        # Hash outside the lock; concurrent callers may hash the same file twice
+        digest = file_digest(path_str)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)", (path_str, key[0], key[1], digest))
+        return digest
+
+    def get_probe(self, path_str, key=None):
+        """Return the stored ffprobe result of a file if it is unchanged, else None."""
+        key = key or self.stat_key(path_str)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, probe FROM probes WHERE path=?", (path_str,)
+            ).fetchone()
+        if row is None or (row[0], row[1]) != key:
+            return None
+        return json.loads(row[2])
+
+    def put_probe(self, path_str, key, probe):
+        """Store the ffprobe result of a file under its (size, mtime_ns) key."""
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)", (path_str, key[0], key[1], json.dumps(probe)))
+
+    def invalidate(self, path_str):
+        """Drop the entry for a path."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM entries WHERE path=?", (path_str,))
+            self._count -= cur.rowcount
+            self._conn.execute("DELETE FROM digests WHERE path=?", (path_str,))
+            self._conn.execute("DELETE FROM probes WHERE path=?", (path_str,))
+
+    def _evict(self):
+        # Drop the least recently used entries down to 90% of the cap
+        excess = self._count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM entries WHERE path IN (SELECT path FROM entries ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._conn.execute("DELETE FROM digests WHERE path NOT IN (SELECT path FROM entries)")
+        self._conn.execute("DELETE FROM probes WHERE path NOT IN (SELECT path FROM entries)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        now = time.time()
+        self._conn.execute("BEGIN")
+        self._conn.executemany("UPDATE entries SET last_used=? WHERE path=?", [(now, p) for p in self._touched])
+        self._conn.execute("COMMIT")
+        self._touched.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": self._count
+            }
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM digests")
+            self._conn.execute("DELETE FROM probes")
+            self._touched.clear()
+            self._count = 0
+            self.hits = self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.close()
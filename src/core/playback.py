@@ -0,0 +1,418 @@
+import subprocess
+import threading
+
+import numpy as np
+
+from src.core.waveform import _wav_layout
+from src.utils.helpers import find_ffmpeg
+
+# Format handed to the sound card: 16-bit stereo at the decode rate
+OUTPUT_RATE = 44100
+CHANNELS = 2
+FRAME_BYTES = 2 * CHANNELS
+# Frames per device callback, ~12 ms, which bounds start and seek latency
+CHUNK_FRAMES = 512
+# Decoded audio held ahead of the device for each open track
+BUFFER_FRAMES = 2 * OUTPUT_RATE
+# Frames read from the decoder at a time, so the first ones reach the buffer quickly
+READ_FRAMES = 1024
+# "position" events are sent every this many frames played (50 ms)
+POSITION_FRAMES = OUTPUT_RATE // 20
+
+class RingBuffer:
+    """Fixed-size FIFO of PCM frames between a decoder thread and the audio callback.
+
+    The writer waits while the buffer is full; the reader never waits, so
+    the audio callback takes whatever is buffered and plays silence for
+    the rest.
+    """
+    def __init__(self, frames=BUFFER_FRAMES, channels=CHANNELS):
+        self._data = np.zeros((frames, channels), dtype=np.int16)
+        # Running totals; their difference is the fill level
+        self._written = 0
+        self._read = 0
+        self.finished = False
+        self.closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def __len__(self):
+        with self._cond:
+            return self._written - self._read
+
+    def write(self, frames):
+        """Append frames, waiting for room; returns False once the buffer is closed."""
+        pos = 0
+        while pos < len(frames):
+            with self._cond:
+                while not self.closed and self._written - self._read == self.capacity:
+                    self._cond.wait()
+                if self.closed:
+                    return False
+                count = min(self.capacity - (self._written - self._read), len(frames) - pos)
+                start = self._written % self.capacity
+                first = min(count, self.capacity - start)
+                self._data[start:start + first] = frames[pos:pos + first]
+                self._data[:count - first] = frames[pos + first:pos + count]
+                self._written += count
+            pos += count
+        return True
+
+    def read_into(self, out):
+        """Move up to len(out) frames into out; returns how many there were."""
+        with self._cond:
+            count = min(self._written - self._read, len(out))
+            start = self._read % self.capacity
+            first = min(count, self.capacity - start)
+            out[:first] = self._data[start:start + first]
+            out[first:count] = self._data[:count - first]
+            self._read += count
+            self._cond.notify_all()
+        return count
+
+    def finish(self):
+        """Mark the end of the stream; the reader drains what is left."""
+        with self._cond:
+            self.finished = True
+
+    @property
+    def exhausted(self):
+        with self._cond:
+            return self.finished and self._written == self._read
+
+    def close(self):
+        """Drop the stream, releasing a writer waiting for room."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+class TrackStream:
+    """One track being decoded into a RingBuffer on a background thread.
+
+    PCM WAV files at the output rate are read straight from a memory map;
+    anything else is decoded by FFmpeg to 16-bit stereo. Decoding starts
+    at ``start`` frames, exactly: FFmpeg's input seek trims the decoded
+    audio to the requested timestamp, which is given to the microsecond.
+    """
+    def __init__(self, path, start=0, ffmpeg_bin=None):
+        self.path = str(path)
+        self.start = start
+        # Frames of the track handed to the device so far, counted from its beginning
+        self.position = start
+        self.error = None
+        self.ring = RingBuffer()
+        self._ffmpeg_bin = ffmpeg_bin
+        self._proc = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="playback-decoder")
+
+    def begin(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop decoding; safe to call from the audio callback."""
+        self.ring.close()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def _run(self):
+        try:
+            layout = _wav_layout(self.path)
+            if layout is not None and layout[5] == OUTPUT_RATE and layout[2] <= CHANNELS:
+                self._read_wav(layout)
+            else:
+                self._decode()
+        except (OSError, ValueError) as e:
+            if not self.ring.closed:
+                self.error = str(e)
+        finally:
+            self.ring.finish()
+
+    def _read_wav(self, layout):
+        offset, frames, channels, dtype, scale, _ = layout
+        if self.start >= frames:
+            return
+        data = np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+        for start in range(self.start, frames, READ_FRAMES):
+            chunk = data[start:start + READ_FRAMES]
+            if chunk.dtype != np.int16:
+                chunk = np.clip(chunk * (scale * 32768), -32768, 32767).astype(np.int16)
+            if channels == 1:
+                chunk = np.repeat(chunk, CHANNELS, axis=1)
+            if not self.ring.write(chunk):
+                return
+
+    def _decode(self):
+        cmd = [self._ffmpeg_bin or find_ffmpeg(), "-v", "error"]
+        if self.start:
+            cmd += ["-ss", f"{self.start / OUTPUT_RATE:.6f}"]
+        cmd += [
+            "-i", self.path, "-vn", "-ac", str(CHANNELS), "-ar", str(OUTPUT_RATE), "-f", "s16le", "pipe:1"
+        ]
+        self._proc = proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if self.ring.closed:
+            # Stopped while FFmpeg was starting
+            proc.kill()
+        # stderr is drained on the side so a chatty FFmpeg cannot fill its pipe
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+        drain.start()
+        pending = b""
+        try:
+            while True:
+                # read1 returns as soon as FFmpeg has written anything
+                data = proc.stdout.read1(READ_FRAMES * FRAME_BYTES)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) - len(data) % FRAME_BYTES
+                pending = data[usable:]
+                frames = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, CHANNELS)
+                if not self.ring.write(frames):
+                    break
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+            drain.join()
+        if proc.returncode != 0 and not self.ring.closed:
+            lines = (errors[0] if errors else b"").decode("utf-8", "replace").strip().splitlines()
+            raise OSError(lines[-1] if lines else f"ffmpeg exited with {proc.returncode}")
+
+class AudioOutput:
+    """The default sound card, pulling audio from a render callback.
+
+    Uses SDL's callback API through pygame, so the device asks for each
+    chunk when it needs it rather than being fed by a timer.
+    """
+    def __init__(self, render, frequency=OUTPUT_RATE, chunk=CHUNK_FRAMES):
+        # Imported here so the engine can be used without pygame
+        from pygame._sdl2 import audio as sdl_audio, sdl2
+        sdl2.init_subsystem(sdl2.INIT_AUDIO)
+        names = sdl_audio.get_audio_device_names(False)
+        if not names:
+            raise OSError("no audio output device")
+        self.device = sdl_audio.AudioDevice(
+            devicename=names[0], iscapture=False, frequency=frequency, audioformat=sdl_audio.AUDIO_S16,
+            numchannels=CHANNELS, chunksize=chunk, allowed_changes=0,
+            callback=lambda device, out: render(out)
+        )
+
+    def start(self):
+        self.device.pause(0)
+
+    def close(self):
+        self.device.pause(1)
+        self.device.close()
+
+class PlaybackEngine:
+    """Streams tracks to the sound card with gapless transitions.
+
+    Each track is decoded ahead into its own RingBuffer, and the device
+    callback copies from it, so playback never waits on the decoder. The
+    track given to ``queue_next`` is decoded while the current one plays;
+    when the current one runs out, the callback carries on from the next
+    within the same chunk, without a gap.
+
+    Listeners are called with ``(event, data)``: "position" with the
+    seconds played every 50 ms and right after a seek, "track_changed"
+    with the path of a track that just started, "ended" when the last
+    track finishes and "error" with a message when a track cannot be
+    decoded. Events are sent from the audio thread and listeners must
+    return quickly.
+    """
+    def __init__(self, ffmpeg_bin=None, output=AudioOutput):
+        self.ffmpeg_bin = ffmpeg_bin
+        self._output_cls = output
+        self.output = None
+        self._current = None
+        self._next = None
+        self._paused = True
+        self._since_position = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, events):
+        for event, data in events:
+            for callback in list(self._listeners):
+                callback(event, data)
+
+    @property
+    def path(self):
+        """Path of the current track, or None."""
+        current = self._current
+        return current.path if current else None
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def position(self):
+        current = self._current
+        return current.position / OUTPUT_RATE if current else 0.0
+
+    def _open(self, path, start=0):
+        return TrackStream(path, start, self.ffmpeg_bin).begin()
+
+    def play(self, path, start=0.0):
+        """Play a track from start seconds, replacing the current one.
+
+        Raises OSError when there is no audio device.
+        """
+        if self.output is None and self._output_cls is not None:
+            self.output = self._output_cls(self.render)
+            self.output.start()
+        start = round(start * OUTPUT_RATE)
+        with self._lock:
+            preloaded = self._next
+            if preloaded is not None and preloaded.path == str(path) and not start:
+                # Skipping to the next track uses what is already decoded
+                stream, self._next = preloaded, None
+            else:
+                stream = self._open(path, start)
+            old, self._current = self._current, stream
+            self._paused = False
+            self._since_position = 0
+        if old is not None:
+            old.stop()
+        self._notify([("track_changed", stream.path), ("position", stream.position / OUTPUT_RATE)])
+
+    def seek(self, seconds):
+        """Move the current track to seconds, to the frame."""
+        with self._lock:
+            current = self._current
+            if current is None:
+                return
+            stream = self._open(current.path, max(0, round(seconds * OUTPUT_RATE)))
+            self._current = stream
+            self._since_position = 0
+        current.stop()
+        self._notify([("position", stream.position / OUTPUT_RATE)])
+
+    def queue_next(self, path):
+        """Start decoding the track that follows the current one, or clear it with None."""
+        with self._lock:
+            old = self._next
+            if old is not None and path is not None and old.path == str(path):
+                return
+            self._next = self._open(path) if path is not None else None
+        if old is not None:
+            old.stop()
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        if self._current is not None:
+            self._paused = False
+
+    def stop(self):
+        with self._lock:
+            streams = [self._current, self._next]
+            self._current = self._next = None
+            self._paused = True
+        for stream in streams:
+            if stream is not None:
+                stream.stop()
+
+    def close(self):
+        self.stop()
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+    def read(self, frames):
+        """Return the next frames to play as an int16 (frames, channels) array."""
+        block = np.zeros((frames, CHANNELS), dtype=np.int16)
+        events = []
+        with self._lock:
+            filled = 0
+            while not self._paused and self._current is not None and filled < frames:
+                stream = self._current
+                count = stream.ring.read_into(block[filled:])
+                filled += count
+                stream.position += count
+                self._since_position += count
+                if filled < frames:
+                    if not stream.ring.exhausted:
+                        # Decoder behind; the rest of the chunk stays silent
+                        break
+                    events += self._advance(stream)
+            if self._since_position >= POSITION_FRAMES and self._current is not None:
+                self._since_position %= POSITION_FRAMES
+                events.append(("position", self._current.position / OUTPUT_RATE))
+        if events:
+            self._notify(events)
+        return block
+
+    def _advance(self, finished):
+        """Switch from a finished track to the preloaded one; called with the lock held."""
+        events = [("error", f"{finished.path}: {finished.error}")] if finished.error else []
+        finished.stop()
+        self._current, self._next = self._next, None
+        if self._current is None:
+            self._paused = True
+            events.append(("ended", finished.path))
+        else:
+            events.append(("track_changed", self._current.path))
+        return events
+
+    def render(self, out):
+        """Device callback: fill a buffer of 16-bit stereo bytes."""
+        out[:] = self.read(len(out) // FRAME_BYTES).tobytes()
+
+class QueueAdvancer:
+    """Keeps the engine's next track the entry after the playing one in a QueueModel.
+
+    Lives as long as the engine, so playback carries on through the queue
+    whichever view is shown. Engine events arrive on the audio thread,
+    which must not block or touch the queue, so each preload is handed
+    to ``call_soon(func, *args)``: it must return at once and run func
+    later on the thread that owns the queue. Queue changes re-check the
+    preloaded track, so tracks added after the last one, or a reordered
+    queue, are followed too.
+    """
+    def __init__(self, engine, queue_model, call_soon):
+        self.engine = engine
+        self.queue_model = queue_model
+        self.call_soon = call_soon
+        engine.subscribe(self._on_playback_event)
+        queue_model.subscribe(self._on_queue_change)
+
+    def close(self):
+        self.engine.unsubscribe(self._on_playback_event)
+        self.queue_model.unsubscribe(self._on_queue_change)
+
+    def following(self, path):
+        """Path of the queue entry after path, or None."""
+        queue_model = self.queue_model
+        if path is None or path not in queue_model:
+            return None
+        pos = queue_model.index_of(path) + 1
+        return queue_model.path(pos) if pos < len(queue_model) else None
+
+    def preload(self, path):
+        """Have the engine decode the track after path, if path is still playing."""
+        if path is not None and self.engine.path == path:
+            self.engine.queue_next(self.following(path))
+
+    def _on_playback_event(self, event, data):
+        if event == "track_changed":
+            self.call_soon(self.preload, data)
+
+    def _on_queue_change(self, event, items):
+        # Called on the queue's own thread
+        self.preload(self.engine.path)
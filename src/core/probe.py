@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+from src.utils.helpers import find_ffprobe
+
+# Stream and container fields read by the pre-flight probe
+PROBE_ENTRIES = (
+    "format=duration,bit_rate"
+    ":stream=codec_name,sample_rate,channels,bits_per_raw_sample,bits_per_sample,duration,bit_rate"
+)
+
+class ProbeError(Exception):
+    """ffprobe could read no audio stream from a file."""
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_probe_output(stdout):
+    """Turn ffprobe's JSON report into {"duration", "codec", "sample_rate", "channels", "bit_depth", "bit_rate"}.
+
+    Raises ProbeError when the report has no audio stream. Values ffprobe
+    does not know are None; lossy codecs have no bit depth.
+    """
+    try:
+        report = json.loads(stdout or "{}")
+    except ValueError:
+        raise ProbeError("unparseable ffprobe output")
+    streams = report.get("streams") or []
+    if not streams:
+        raise ProbeError("no audio stream")
+    stream = streams[0]
+    container = report.get("format") or {}
+    # The container values cover files whose stream header has none
+    duration = _number(container.get("duration")) or _number(stream.get("duration"))
+    bit_rate = _number(stream.get("bit_rate"), int) or _number(container.get("bit_rate"), int)
+    bit_depth = _number(stream.get("bits_per_raw_sample"), int) or _number(stream.get("bits_per_sample"), int)
+    return {
+        "duration": duration if duration and duration > 0 else None,
+        "codec": stream.get("codec_name"),
+        "sample_rate": _number(stream.get("sample_rate"), int),
+        "channels": _number(stream.get("channels"), int),
+        "bit_depth": bit_depth or None,
+        "bit_rate": bit_rate or None
+    }
+
+class Prober:
+    """Pre-flight inspection of inputs with ffprobe.
+
+    Results are memoized in an optional MetadataCache under the file's
+    (size, mtime_ns), so re-running a batch only probes new or edited
+    files. Failures are not cached.
+    """
+    WEIGHT = 0.25
+
+    def __init__(self, ffprobe_bin=None, cache=None):
+        self.ffprobe_bin = ffprobe_bin or find_ffprobe()
+        self.cache = cache
+
+    def command(self, input_file):
+        return [
+            self.ffprobe_bin, "-v", "error", "-select_streams", "a:0",
+            "-show_entries", PROBE_ENTRIES, "-of", "json", str(input_file)
+        ]
+
+    async def probe_async(self, input_path, scheduler):
+        """Probe a file through a ProcessScheduler.
+
+        Raises ProbeError for unreadable files and OSError when ffprobe
+        itself cannot run.
+        """
+        path_str = str(input_path)
+        key = None
+        if self.cache:
+            key = await asyncio.to_thread(self.cache.stat_key, path_str)
+            if key is None:
+                raise ProbeError("file not found")
+            cached = await asyncio.to_thread(self.cache.get_probe, path_str, key)
+            if cached is not None:
+                return cached
+        # ffprobe only reads headers, so it takes a fraction of an encode's slot
+        result = await scheduler.run(self.command(path_str), weight=self.WEIGHT, stage="probe")
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            raise ProbeError(lines[-1] if lines else f"ffprobe exited with {result.returncode}")
+        info = parse_probe_output(result.stdout)
+        if key is not None:
+            await asyncio.to_thread(self.cache.put_probe, path_str, key, info)
+        return info
@@ -1,30 +1,157 @@
+import json
+import math
+import re
 import subprocess
 from pathlib import Path
+from src.core.artwork import ART_FORMATS
+from src.core.capabilities import EXPERIMENTAL_ENCODERS, FORMAT_ENCODERS, probe_capabilities
+from src.core.progress import ProgressParser
+from src.core.telemetry import run_process, telemetry
 from src.utils.helpers import find_ffmpeg
 
+# EBU R128 target used by the loudness normalization
+LOUDNORM_TARGET = "I=-14:TP=-1.5:LRA=11"
+
+# Keys of the loudnorm print_format=json report that feed the second pass
+LOUDNORM_MEASURED = {
+    "input_i": "measured_I",
+    "input_tp": "measured_TP",
+    "input_lra": "measured_LRA",
+    "input_thresh": "measured_thresh",
+    "target_offset": "offset"
+}
+
+# Extra scheduler slots taken by filters that cost much more CPU than the
+# decode/encode itself (FFT denoising; loudnorm's 192 kHz resampling)
+FILTER_WEIGHTS = {
+    "afftdn": 1.0,
+    "loudnorm": 0.5
+}
+
+# Extra scheduler slots per additional encoder of a multi-output command;
+# the decode and filter chain are shared
+EXTRA_OUTPUT_WEIGHT = 0.25
+
+# Codec of each output format's encoder preset, as ffprobe names it
+FORMAT_CODECS = {
+    "mp3": "mp3",
+    "wav": "pcm_s16le",
+    "flac": "flac",
+    "ogg": "vorbis",
+    "m4a": "aac"
+}
+
+# Nominal bit rates (kbit/s) of the lossy presets; the Vorbis ones are
+# the usual averages of its -q:a levels
+PRESET_BITRATES = {
+    "mp3": {"low": 128, "medium": 192, "high": 320, "lossless": 320},
+    "ogg": {"low": 112, "medium": 192, "high": 320, "lossless": 500},
+    "m4a": {"low": 128, "medium": 192, "high": 256, "lossless": 320}
+}
+
+# Scheduler weight of a stream copy, which is disk-bound
+REMUX_WEIGHT = 0.25
+
+# Stream of the cover picture, given to FFmpeg as the second input
+ART_MAP = "1:v"
+
+# What each filter is used for, in messages about a missing one
+FILTER_USES = {
+    "afftdn": "noise reduction",
+    "loudnorm": "normalization",
+    "silenceremove": "silence trimming",
+    "asetrate": "pitch",
+    "atempo": "speed and pitch",
+    "afade": "fades",
+    "aresample": "multiple formats",
+    "asplit": "multiple formats"
+}
+
+def parse_loudnorm_stats(stderr):
+    """Extract the first-pass measurements from loudnorm's JSON report.
+
+    Returns None when the report is missing or not finite (e.g. digital
+    silence), in which case the file cannot be normalized linearly.
+    """
+    match = None
+    for match in re.finditer(r"\{[^{}]*\"input_i\"[^{}]*\}", stderr):
+        pass
+    if match is None:
+        return None
+    try:
+        report = json.loads(match.group(0))
+        measured = {key: float(report[key]) for key in LOUDNORM_MEASURED}
+    except (ValueError, KeyError):
+        return None
+    if not all(math.isfinite(value) for value in measured.values()):
+        return None
+    return measured
+
 class AudioProcessor:
-    """Handles audio processing using FFmpeg."""
-    def __init__(self):
+    """Handles audio processing using FFmpeg.
+
+    What the FFmpeg binary supports is read once per process, and from
+    ``capabilities`` (a CapabilityCache) when given, so it is only asked
+    again after the binary changed. Each format is encoded with the best
+    encoder the binary has, and ``check_options`` rejects options it
+    cannot honour before any file is read.
+    """
+    def __init__(self, capabilities=None):
         self.ffmpeg_bin = find_ffmpeg()
+        self.capability_cache = capabilities
+        self._capabilities = None
 
-    def build_command(self, input_file, output_file, options):
-        """Build the FFmpeg command based on provided options."""
-        fmt = options.get("format", "mp3")
-        qual = options.get("quality", "high")
+    def capabilities(self):
+        """FFmpegCapabilities of the binary, read once it could be run.
+
+        While FFmpeg cannot be run it is looked for again on every call,
+        so installing it takes effect without a restart.
+        """
+        if self._capabilities is None or not self._capabilities.runnable:
+            if self._capabilities is not None:
+                self.ffmpeg_bin = find_ffmpeg()
+            if self.capability_cache is not None:
+                self._capabilities = self.capability_cache.get(self.ffmpeg_bin)
+            else:
+                self._capabilities = probe_capabilities(self.ffmpeg_bin)
+        return self._capabilities
+
+    def ffmpeg_version(self):
+        """First line of ``ffmpeg -version`` (empty if FFmpeg cannot run)."""
+        return self.capabilities().version
+
+    def check_options(self, options):
+        """Reasons the options cannot be processed by this FFmpeg, as messages; empty if none.
+
+        Covers FFmpeg not running at all, a target format without any
+        encoder (see FORMAT_ENCODERS) and filters the options need that
+        the binary lacks.
+        """
+        capabilities = self.capabilities()
+        if not capabilities.runnable:
+            return [f"FFmpeg cannot be run ({self.ffmpeg_bin})"]
+        problems = []
+        targets = options.get("targets") or [options]
+        for fmt in dict.fromkeys(target.get("format", options.get("format", "mp3")) for target in targets):
+            if capabilities.known and capabilities.encoder_for(fmt) is None:
+                encoders = " or ".join(FORMAT_ENCODERS.get(fmt, ())) or "an encoder"
+                problems.append(f"FFmpeg cannot encode {fmt}: it has no {encoders} encoder")
+        names = [spec.split("=", 1)[0] for spec in self._filter_chain(options)]
+        if len(targets) > 1:
+            names += ["aresample", "asplit"]
+        for name in dict.fromkeys(names):
+            if not capabilities.has_filter(name):
+                problems.append(f"FFmpeg lacks the {name} filter needed for {FILTER_USES.get(name, name)}")
+        return problems
+
+    def _pre_loudnorm_filters(self, options):
+        """Filters applied before loudness normalization, in order."""
         sr = options.get("sample_rate", 44100)
-        ch = options.get("channels", 2)
-        
-        # Advanced filters
-        fade_in = options.get("fade_in", 0)
-        fade_out = options.get("fade_out", 0)
         pitch = options.get("pitch", 1.0)
         speed = options.get("speed", 1.0)
         noise_reduction = options.get("noise_reduction", False)
-        normalize = options.get("normalize", False)
         trim_silence = options.get("trim_silence", False)
-        
-        cmd = [self.ffmpeg_bin, "-y", "-i", str(input_file), "-ac", str(ch), "-ar", str(sr)]
-        
+
         afilters = []
         
         # Speed and Pitch
@@ -48,48 +175,258 @@ class AudioProcessor:
 
         if trim_silence:
             afilters.append("silenceremove=start_periods=1:start_threshold=-45dB:start_silence=0.4")
+        return afilters
+
+    def loudness_analysis_chain(self, options):
+        """Filter chain of the loudness measurement pass.
+
+        Measurements depend only on the input and on this chain, not on the
+        output format or bitrate, so it doubles as their cache key.
+        """
+        return ",".join(self._pre_loudnorm_filters(options) + [f"loudnorm={LOUDNORM_TARGET}:print_format=json"])
+
+    @staticmethod
+    def command_weight(cmd):
+        """Scheduler weight of an FFmpeg command: 1 plus the cost of its heavy filters and extra encoders."""
+        weight = 1.0
+        for flag, value in zip(cmd, cmd[1:]):
+            if flag in ("-af", "-filter_complex"):
+                for spec in value.split(","):
+                    # Drop the pad labels of a filter_complex graph
+                    name = re.sub(r"^(\[[^\]]*\])+", "", spec).split("=", 1)[0]
+                    weight += FILTER_WEIGHTS.get(name, 0.0)
+        # The cover picture is copied, not encoded
+        outputs = sum(1 for flag, value in zip(cmd, cmd[1:]) if flag == "-map" and value != ART_MAP)
+        return weight + EXTRA_OUTPUT_WEIGHT * max(0, outputs - 1)
+
+    def loudness_command(self, input_file, options):
+        """Build the FFmpeg command of the loudnorm measurement pass."""
+        return [
+            self.ffmpeg_bin, "-hide_banner", "-nostats", "-i", str(input_file),
+            "-vn", "-sn", "-dn", "-af", self.loudness_analysis_chain(options), "-f", "null", "-"
+        ]
+
+    def measure_loudness(self, input_file, options):
+        """Run the loudnorm measurement pass; returns the measured values or None."""
+        result = subprocess.run(self.loudness_command(input_file, options), capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        return parse_loudnorm_stats(result.stderr)
+
+    async def measure_loudness_async(self, input_file, options, scheduler, priority=0):
+        """measure_loudness, run through a ProcessScheduler."""
+        cmd = self.loudness_command(input_file, options)
+        result = await scheduler.run(cmd, weight=self.command_weight(cmd), priority=priority, stage="loudness")
+        if result.returncode != 0:
+            return None
+        return parse_loudnorm_stats(result.stderr)
+
+    def _filter_chain(self, options):
+        """Every audio filter of an encode, in order."""
+        fade_in = options.get("fade_in", 0)
+        fade_out = options.get("fade_out", 0)
+        
+        afilters = self._pre_loudnorm_filters(options)
             
-        if normalize:
-            afilters.append("loudnorm=I=-14:TP=-1.5:LRA=11")
+        if options.get("normalize", False):
+            measured = options.get("loudness")
+            if measured:
+                params = "".join(f":{LOUDNORM_MEASURED[key]}={value:.2f}" for key, value in measured.items())
+                afilters.append(f"loudnorm={LOUDNORM_TARGET}{params}:linear=true")
+            else:
+                afilters.append(f"loudnorm={LOUDNORM_TARGET}")
             
         if fade_in > 0:
             afilters.append(f"afade=t=in:st=0:d={fade_in}")
             
-        if fade_out > 0:
-            # Fade out needs duration which we might not have easily without ffprobe
-            # For now, we'll assume the user knows the length or we'll skip it 
-            # unless we get the duration.
-            pass
+        duration = options.get("duration")
+        if fade_out > 0 and duration:
+            # The fade starts relative to the output timeline, after speed changes
+            end = duration / (options.get("speed", 1.0) or 1.0)
+            afilters.append(f"afade=t=out:st={max(0.0, end - fade_out):.3f}:d={fade_out}")
+        return afilters
 
-        if afilters:
-            cmd.extend(["-af", ",".join(afilters)])
-            
-        # Metadata
-        tags = options.get("tags", {})
-        for key, value in tags.items():
-            if value:
-                cmd.extend(["-metadata", f"{key}={value}"])
-                
-        # Format presets
+    @staticmethod
+    def encoder_args(fmt, qual, encoder=None):
+        """Encoder arguments of an output format and quality preset.
+
+        ``encoder`` picks the encoder of a lossy format; by default FFmpeg
+        chooses, except for M4A, which uses the native AAC encoder.
+        """
         if fmt == "mp3":
             qmap = {"low":["-b:a","128k"],"medium":["-b:a","192k"],"high":["-b:a","320k"],"lossless":["-b:a","320k"]}
-            cmd.extend(qmap.get(qual, ["-b:a", "192k"]))
+            args = qmap.get(qual, ["-b:a", "192k"])
         elif fmt == "wav":
-            cmd.extend(["-acodec", "pcm_s16le"])
+            return ["-acodec", "pcm_s16le"]
         elif fmt == "flac":
-            cmd.extend(["-acodec", "flac", "-compression_level", "5"])
+            return ["-acodec", "flac", "-compression_level", "5"]
         elif fmt == "ogg":
             qmap = {"low":["-q:a","3"],"medium":["-q:a","6"],"high":["-q:a","9"],"lossless":["-q:a","10"]}
-            cmd.extend(qmap.get(qual, ["-q:a", "6"]))
+            args = qmap.get(qual, ["-q:a", "6"])
         elif fmt == "m4a":
-            qmap = {"low":["-c:a","aac","-b:a","128k"],"medium":["-c:a","aac","-b:a","192k"],"high":["-c:a","aac","-b:a","256k"],"lossless":["-c:a","aac","-b:a","320k"]}
-            cmd.extend(qmap.get(qual, ["-c:a", "aac", "-b:a", "192k"]))
+            qmap = {"low":["-b:a","128k"],"medium":["-b:a","192k"],"high":["-b:a","256k"],"lossless":["-b:a","320k"]}
+            args = qmap.get(qual, ["-b:a", "192k"])
+            encoder = encoder or "aac"
+        else:
+            return []
+        if encoder is None:
+            return args
+        strict = ["-strict", "experimental"] if encoder in EXPERIMENTAL_ENCODERS else []
+        return ["-c:a", encoder] + strict + args
+
+    def _encoder_args(self, fmt, qual):
+        return self.encoder_args(fmt, qual, self.capabilities().encoder_for(fmt))
+
+    @staticmethod
+    def art_args(fmt, art):
+        """Output arguments attaching the cover picture input, for containers that hold one."""
+        if art is None or fmt not in ART_FORMATS:
+            return []
+        return [
+            "-map", ART_MAP, "-c:v", "copy", "-disposition:v:0", "attached_pic",
+            "-metadata:s:v", "title=Album cover", "-metadata:s:v", "comment=Cover (front)"
+        ]
+
+    @staticmethod
+    def _art_input(art, formats):
+        # Only read the picture when some output can hold it
+        if art is None or not ART_FORMATS.intersection(formats):
+            return []
+        return ["-i", str(art)]
+
+    def build_command(self, input_file, output_file, options, art=None):
+        """Build the FFmpeg command based on provided options.
+
+        With ``options["loudness"]`` set to first-pass measurements, loudness
+        normalization runs as the linear second pass instead of single-pass.
+        Fade-out needs ``options["duration"]``, the input's duration in
+        seconds; without it the fade-out is skipped.
+
+        ``output_file`` may also be a list of (path, target) pairs, each
+        target a dict with "format" and "quality": the input is then decoded
+        and filtered once, and the result split with asplit into one
+        encoder per target.
+
+        ``art`` is the path of a prepared cover picture, attached to every
+        output whose container can hold one (see ART_FORMATS); the
+        input's own pictures are then left out.
+        """
+        fmt = options.get("format", "mp3")
+        qual = options.get("quality", "high")
+        sr = options.get("sample_rate", 44100)
+        ch = options.get("channels", 2)
+        
+        # Machine-readable progress on stdout instead of the stats line on stderr
+        cmd = [self.ffmpeg_bin, "-y", "-nostats", "-progress", "pipe:1", "-i", str(input_file)]
+        if isinstance(output_file, (list, tuple)):
+            formats = [target.get("format", fmt) for _, target in output_file]
+        else:
+            formats = [fmt]
+        art_input = self._art_input(art, formats)
+        cmd.extend(art_input)
+        afilters = self._filter_chain(options)
             
+        # Metadata
+        metadata = []
+        tags = options.get("tags", {})
+        for key, value in tags.items():
+            if value:
+                metadata.extend(["-metadata", f"{key}={value}"])
+
+        if isinstance(output_file, (list, tuple)):
+            labels = [f"[out{i}]" for i in range(len(output_file))]
+            # Resample once ahead of the split instead of once per encoder
+            graph = ",".join(afilters + [f"aresample={sr}", f"asplit={len(output_file)}"])
+            cmd.extend(["-filter_complex", f"[0:a]{graph}{''.join(labels)}"])
+            for label, (path, target), target_fmt in zip(labels, output_file, formats):
+                cmd.extend(["-map", label, "-ac", str(ch), "-ar", str(sr)])
+                cmd.extend(metadata)
+                cmd.extend(self._encoder_args(target_fmt, target.get("quality", qual)))
+                if art_input:
+                    cmd.extend(self.art_args(target_fmt, art))
+                cmd.append(str(path))
+            return cmd
+
+        if art_input:
+            cmd.extend(["-map", "0:a"] + self.art_args(fmt, art))
+        cmd.extend(["-ac", str(ch), "-ar", str(sr)])
+        if afilters:
+            cmd.extend(["-af", ",".join(afilters)])
+        cmd.extend(metadata)
+        # Format presets
+        cmd.extend(self._encoder_args(fmt, qual))
+        cmd.append(str(output_file))
+        return cmd
+
+    def can_stream_copy(self, options, probe):
+        """True if the input's audio stream can go into the output unchanged.
+
+        That is the case when no filter is active and the probed codec,
+        sample rate and channel count already match the target. A lossy
+        stream is only copied if the preset would not make it smaller:
+        re-encoding it at the same or a higher rate only loses quality.
+        """
+        if not probe or self._filter_chain(options):
+            return False
+        fmt = options.get("format", "mp3")
+        if probe["codec"] != FORMAT_CODECS.get(fmt):
+            return False
+        if probe["sample_rate"] != options.get("sample_rate", 44100) or probe["channels"] != options.get("channels", 2):
+            return False
+        preset = PRESET_BITRATES.get(fmt, {}).get(options.get("quality", "high"))
+        if preset is None:
+            return True
+        bit_rate = probe.get("bit_rate")
+        # Leave headroom for VBR files averaging slightly above the preset
+        return bit_rate is not None and bit_rate <= preset * 1000 * 1.05
+
+    def remux_command(self, input_file, output_file, options, art=None):
+        """Build the FFmpeg command that copies the audio stream into a new file with new tags and art."""
+        fmt = options.get("format", "mp3")
+        cmd = [self.ffmpeg_bin, "-y", "-nostats", "-progress", "pipe:1", "-i", str(input_file)]
+        art_input = self._art_input(art, [fmt])
+        cmd.extend(art_input)
+        if art_input:
+            cmd.extend(["-map", "0:a"] + self.art_args(fmt, art))
+        cmd.extend(["-c:a", "copy"])
+        tags = options.get("tags") or {}
+        for key, value in tags.items():
+            if value:
+                cmd.extend(["-metadata", f"{key}={value}"])
         cmd.append(str(output_file))
         return cmd
 
+    async def remux_async(self, input_file, output_file, options, scheduler, timeout=None, tail=None, priority=0, art=None):
+        """Run remux_command through a ProcessScheduler."""
+        cmd = self.remux_command(input_file, output_file, options, art)
+        return await scheduler.run(cmd, timeout=timeout, weight=REMUX_WEIGHT, tail=tail, priority=priority, stage="remux")
+
     def process(self, input_file, output_file, options):
         """Execute the FFmpeg command."""
         cmd = self.build_command(input_file, output_file, options)
+        if telemetry.enabled:
+            return run_process(cmd, "encode")
         result = subprocess.run(cmd, capture_output=True, text=True)
         return result
+
+    async def process_async(self, input_file, output_file, options, scheduler, timeout=None, on_progress=None, tail=None, priority=0, art=None):
+        """Execute the FFmpeg command through a ProcessScheduler.
+
+        ``output_file`` may be a list of (path, target) pairs and ``art``
+        a cover picture, as for build_command.
+
+        ``on_progress`` receives a ProgressParser snapshot (out_time in
+        seconds, speed, total_size) each time FFmpeg reports progress.
+        """
+        cmd = self.build_command(input_file, output_file, options, art)
+        parser = ProgressParser()
+
+        def on_stdout(line):
+            snapshot = parser.feed(line)
+            if snapshot:
+                on_progress(snapshot)
+
+        return await scheduler.run(
+            cmd, timeout=timeout, on_stdout=on_stdout if on_progress else None, weight=self.command_weight(cmd), tail=tail, priority=priority,
+            stage="encode"
+        )
@@ -0,0 +1,168 @@
+import threading
+import time
+
+def _number(value, cast=float):
+    # FFmpeg reports "N/A" until a value is known
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+class ProgressParser:
+    """Incremental parser for FFmpeg's ``-progress`` key=value stream.
+
+    ``feed`` returns a snapshot dict each time FFmpeg closes a block with a
+    ``progress=continue|end`` line, and None otherwise.
+    """
+    def __init__(self):
+        self._fields = {}
+
+    def feed(self, line):
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._fields[key] = value
+            return None
+        fields, self._fields = self._fields, {}
+        # out_time_ms is also in microseconds (a long-standing FFmpeg quirk)
+        out_time_us = _number(fields.get("out_time_us", fields.get("out_time_ms")), int)
+        speed = fields.get("speed", "").rstrip("x").strip()
+        return {
+            "out_time": out_time_us / 1e6 if out_time_us is not None and out_time_us >= 0 else None,
+            "speed": _number(speed),
+            "total_size": _number(fields.get("total_size"), int),
+            "end": value == "end"
+        }
+
+class JobProgress:
+    """Live state of one file in a batch."""
+    __slots__ = ("path", "duration", "status", "out_time", "speed", "total_size", "version")
+
+    def __init__(self, path, duration):
+        self.path = path
+        self.duration = duration
+        self.status = "queued"
+        self.out_time = 0.0
+        self.speed = None
+        self.total_size = 0
+        self.version = 0
+
+    @property
+    def percent(self):
+        if self.status == "ok":
+            return 100.0
+        if not self.duration:
+            return None
+        return min(100.0, 100.0 * self.out_time / self.duration)
+
+class BatchProgress:
+    """Per-file and aggregate progress of a batch, safe to read from any thread.
+
+    Durations are the expected output durations in seconds (None when
+    unknown). Every change bumps ``version`` and stamps the job with it, so
+    a view can cheaply fetch only the jobs that changed since its last look.
+    """
+    def __init__(self, durations):
+        self.jobs = {path: JobProgress(path, duration) for path, duration in durations}
+        self.started = time.monotonic()
+        self.finished = None
+        self.version = 0
+        self._remaining = len(self.jobs)
+        self._lock = threading.Lock()
+
+    def _touch(self, job):
+        self.version += 1
+        job.version = self.version
+
+    def set_duration(self, path, duration):
+        """Replace a job's expected duration, e.g. once it has been probed."""
+        with self._lock:
+            job = self.jobs[path]
+            job.duration = duration
+            self._touch(job)
+
+    def update_job(self, path, snapshot):
+        """Apply a ProgressParser snapshot; the first one marks the job running."""
+        with self._lock:
+            job = self.jobs[path]
+            job.status = "running"
+            if snapshot["out_time"] is not None:
+                job.out_time = snapshot["out_time"]
+            if snapshot["total_size"] is not None:
+                job.total_size = snapshot["total_size"]
+            job.speed = snapshot["speed"]
+            self._touch(job)
+
+    def finish_job(self, path, ok):
+        with self._lock:
+            job = self.jobs[path]
+            job.status = "ok" if ok else "failed"
+            if ok and job.duration:
+                job.out_time = job.duration
+            self._touch(job)
+            self._remaining -= 1
+            if not self._remaining:
+                self.finished = time.monotonic()
+
+    def changed_since(self, version):
+        """Return (current version, [(path, status, percent)]) for jobs changed after version."""
+        with self._lock:
+            changed = [(job.path, job.status, job.percent) for job in self.jobs.values() if job.version > version]
+            return self.version, changed
+
+    def summary(self):
+        """Aggregate counters, percent, realtime factor, output MB/s and ETA (seconds)."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+            elapsed = (self.finished or time.monotonic()) - self.started
+            known = [job.duration for job in jobs if job.duration]
+            # Unknown durations count as the average of the known ones
+            fallback = sum(known) / len(known) if known else 0.0
+            total_media = sum(job.duration or fallback for job in jobs)
+            done_media = sum(
+                (job.duration or fallback) if job.status in ("ok", "failed") else job.out_time
+                for job in jobs
+            )
+            written = sum(job.total_size for job in jobs)
+            counts = {status: 0 for status in ("queued", "running", "ok", "failed")}
+            for job in jobs:
+                counts[job.status] += 1
+
+        realtime = done_media / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.finished:
+            eta = 0.0
+        elif realtime > 0 and total_media:
+            eta = max(0.0, total_media - done_media) / realtime
+        return {
+            "total": len(jobs),
+            "queued": counts["queued"],
+            "running": counts["running"],
+            "succeeded": counts["ok"],
+            "failed": counts["failed"],
+            "percent": round(100.0 * done_media / total_media, 1) if total_media else None,
+            "realtime_factor": round(realtime, 2),
+            "mb_per_s": round(written / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0,
+            "elapsed": round(elapsed, 1),
+            "eta": round(eta, 1) if eta is not None else None
+        }
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def format_progress(summary):
+    """One-line status for a BatchProgress summary."""
+    done = summary["succeeded"] + summary["failed"]
+    percent = f"{summary['percent']:.0f}%" if summary["percent"] is not None else "?%"
+    text = (
+        f"{done}/{summary['total']} files · {percent} · {summary['realtime_factor']:.1f}× realtime"
+        f" · {summary['mb_per_s']:.1f} MB/s · ETA {format_eta(summary['eta'])}"
+    )
+    if summary["failed"]:
+        text += f" · {summary['failed']} failed"
+    return text
@@ -0,0 +1,331 @@
+import os
+from array import array
+
+from src.core.metadata import TAG_KEYS
+
+# Tags shared by many entries are dictionary-encoded; titles are not
+CODED_TAGS = tuple(key for key in TAG_KEYS if key != "title")
+
+class QueueItem:
+    """A queued file, as handed to and returned by the QueueModel."""
+    __slots__ = ("path", "size", "duration", "tags")
+
+    def __init__(self, path, tags=None, size=None, duration=None):
+        self.path = path
+        self.size = size
+        self.duration = duration
+        self.tags = tags if tags is not None else {key: "" for key in TAG_KEYS}
+
+    def __repr__(self):
+        return f"QueueItem({self.path!r})"
+
+class _Dictionary:
+    """Maps repeated string values to 4-byte codes."""
+    __slots__ = ("codes", "values", "lookup")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.values = [""]
+        self.lookup = {"": 0}
+
+    def append(self, value):
+        self.codes.append(self.code(value))
+
+    def __getitem__(self, pos):
+        return self.values[self.codes[pos]]
+
+    def code(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _DirIndex:
+    """Name -> queue position index for the entries of one directory.
+
+    Names map to a local slot number (a cached small int for any directory
+    under 257 entries) and positions live in an array, so the index holds
+    no per-entry int objects.
+    """
+    __slots__ = ("slots", "positions")
+
+    def __init__(self):
+        self.slots = {}
+        self.positions = array("q")
+
+    def get(self, name):
+        slot = self.slots.get(name)
+        return self.positions[slot] if slot is not None else None
+
+    def add(self, name, pos):
+        self.slots[name] = len(self.positions)
+        self.positions.append(pos)
+
+    def set(self, name, pos):
+        self.positions[self.slots[name]] = pos
+
+    def pop(self, name):
+        slot = self.slots.pop(name, None)
+        return self.positions[slot] if slot is not None else None
+
+class QueueModel:
+    """Ordered, deduplicated queue stored column by column.
+
+    There is no per-entry object or dict: each field lives in its own list
+    or ``array``. Directories and the artist, album, year, genre and track
+    number tags are dictionary-encoded as 4-byte codes, so an album's
+    folder and tag strings are stored once, and file names and titles are
+    kept as UTF-8 bytes. A per-directory name -> position index makes
+    membership tests, lookups and removals O(1). Removed slots are left as
+    holes and compacted lazily on the next positional access.
+
+    Listeners are called with ``(event, items)`` after every change, where
+    event is one of "added", "removed", "moved", "updated" or "reset".
+    """
+    def __init__(self):
+        self._listeners = []
+        self._reset()
+
+    def _reset(self):
+        self._dirs = _Dictionary()
+        self._names = []
+        self._sizes = array("q")
+        self._durations = array("d")
+        self._titles = []
+        self._tags = {key: _Dictionary() for key in CODED_TAGS}
+        self._index = {}
+        self._count = 0
+        self._holes = 0
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event, items):
+        for callback in list(self._listeners):
+            callback(event, items)
+
+    @staticmethod
+    def _split(path):
+        directory, name = os.path.split(path)
+        return directory, os.fsencode(name)
+
+    def _lookup(self, path):
+        directory, name = self._split(path)
+        names = self._index.get(directory)
+        return names.get(name) if names else None
+
+    # --- Sequence access -------------------------------------------------
+
+    def __len__(self):
+        return self._count - self._holes
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, path):
+        return self._lookup(path) is not None
+
+    def __iter__(self):
+        if self._holes:
+            self._compact()
+        return (self._item(pos) for pos in range(self._count))
+
+    def __getitem__(self, pos):
+        if self._holes:
+            self._compact()
+        if isinstance(pos, slice):
+            return [self._item(i) for i in range(*pos.indices(self._count))]
+        if pos < 0:
+            pos += self._count
+        if not 0 <= pos < self._count:
+            raise IndexError("queue index out of range")
+        return self._item(pos)
+
+    def _item(self, pos):
+        return QueueItem(self.path(pos), {key: self.tag(key, pos) for key in TAG_KEYS}, self.size(pos), self.duration(pos))
+
+    # Per-entry and per-column access for views that touch every entry.
+    # Positions are only stable until the next removal.
+
+    def path(self, pos):
+        if self._holes:
+            self._compact()
+        return os.path.join(self._dirs[pos], os.fsdecode(self._names[pos]))
+
+    def name(self, pos):
+        if self._holes:
+            self._compact()
+        return os.fsdecode(self._names[pos])
+
+    def size(self, pos):
+        if self._holes:
+            self._compact()
+        size = self._sizes[pos]
+        return size if size >= 0 else None
+
+    def duration(self, pos):
+        """Duration in seconds, or None when it is unknown."""
+        if self._holes:
+            self._compact()
+        duration = self._durations[pos]
+        return duration if duration >= 0 else None
+
+    def tag(self, key, pos):
+        if self._holes:
+            self._compact()
+        if key == "title":
+            return self._titles[pos].decode("utf-8", "surrogatepass")
+        return self._tags[key][pos]
+
+    def column(self, key):
+        """Values of a column ("name", "size" or a tag key) in queue order."""
+        if self._holes:
+            self._compact()
+        if key == "name":
+            return [os.fsdecode(name) for name in self._names]
+        if key == "size":
+            return self._sizes
+        if key == "title":
+            return [title.decode("utf-8", "surrogatepass") for title in self._titles]
+        tags = self._tags[key]
+        values = tags.values
+        return [values[code] for code in tags.codes]
+
+    def encoded_column(self, key):
+        """(codes, values) of a dictionary-encoded tag column, so per-value work is done once."""
+        if self._holes:
+            self._compact()
+        return self._tags[key].codes, self._tags[key].values
+
+    def get(self, path):
+        if self._holes:
+            self._compact()
+        pos = self._lookup(path)
+        return self._item(pos) if pos is not None else None
+
+    def index_of(self, path):
+        if self._holes:
+            self._compact()
+        pos = self._lookup(path)
+        if pos is None:
+            raise ValueError(f"{path!r} is not queued")
+        return pos
+
+    # --- Mutation --------------------------------------------------------
+
+    def append(self, item):
+        return self.extend([item])
+
+    def extend(self, items):
+        """Append items whose path is not queued yet. Returns the added items."""
+        if self._holes:
+            self._compact()
+        added = []
+        for item in items:
+            directory, name = self._split(item.path)
+            names = self._index.get(directory)
+            if names is None:
+                names = self._index[directory] = _DirIndex()
+            elif name in names.slots:
+                continue
+            names.add(name, self._count)
+            self._dirs.append(directory)
+            self._names.append(name)
+            self._sizes.append(item.size if item.size is not None else -1)
+            self._durations.append(item.duration if item.duration is not None else -1.0)
+            tags = item.tags
+            self._titles.append(str(tags.get("title") or "").encode("utf-8", "surrogatepass"))
+            for key, column in self._tags.items():
+                column.append(str(tags.get(key) or ""))
+            self._count += 1
+            added.append(item)
+        if added:
+            self._notify("added", added)
+        return added
+
+    def remove(self, paths):
+        """Remove the items with the given paths. Returns the removed items."""
+        if self._holes:
+            self._compact()
+        positions = []
+        for path in paths:
+            directory, name = self._split(path)
+            names = self._index.get(directory)
+            pos = names.pop(name) if names else None
+            if pos is None:
+                continue
+            if not names.slots:
+                del self._index[directory]
+            positions.append(pos)
+        # Read the items before punching holes, which would trigger compaction
+        removed = [self._item(pos) for pos in positions]
+        for pos in positions:
+            self._names[pos] = None
+        self._holes += len(positions)
+        if removed:
+            self._notify("removed", removed)
+        return removed
+
+    def update_tags(self, updates):
+        """Apply (path, tags) updates to queued entries; tags may be partial.
+
+        Returns the updated items. Paths that are not queued are ignored.
+        """
+        if self._holes:
+            self._compact()
+        positions = []
+        for path, tags in updates:
+            pos = self._lookup(path)
+            if pos is None:
+                continue
+            for key, value in tags.items():
+                if key == "title":
+                    self._titles[pos] = str(value or "").encode("utf-8", "surrogatepass")
+                elif key in self._tags:
+                    column = self._tags[key]
+                    column.codes[pos] = column.code(str(value or ""))
+            positions.append(pos)
+        updated = [self._item(pos) for pos in positions]
+        if updated:
+            self._notify("updated", updated)
+        return updated
+
+    def swap(self, i, j):
+        """Exchange the positions of two entries."""
+        if self._holes:
+            self._compact()
+        columns = [self._dirs.codes, self._names, self._sizes, self._durations, self._titles]
+        columns.extend(tags.codes for tags in self._tags.values())
+        for column in columns:
+            column[i], column[j] = column[j], column[i]
+        self._index[self._dirs[i]].set(self._names[i], i)
+        self._index[self._dirs[j]].set(self._names[j], j)
+        self._notify("moved", [self._item(i), self._item(j)])
+
+    def clear(self):
+        self._reset()
+        self._notify("reset", [])
+
+    def _compact(self):
+        keep = [pos for pos, name in enumerate(self._names) if name is not None]
+        self._dirs.codes = array("I", (self._dirs.codes[pos] for pos in keep))
+        self._names = [self._names[pos] for pos in keep]
+        self._sizes = array("q", (self._sizes[pos] for pos in keep))
+        self._durations = array("d", (self._durations[pos] for pos in keep))
+        self._titles = [self._titles[pos] for pos in keep]
+        for tags in self._tags.values():
+            tags.codes = array("I", (tags.codes[pos] for pos in keep))
+        self._index = {}
+        for pos, name in enumerate(self._names):
+            directory = self._dirs[pos]
+            names = self._index.get(directory)
+            if names is None:
+                names = self._index[directory] = _DirIndex()
+            names.add(name, pos)
+        self._count = len(keep)
+        self._holes = 0
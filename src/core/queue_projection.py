@@ -0,0 +1,222 @@
+import os
+import time
+from bisect import insort
+
+from src.core.metadata import TAG_KEYS
+
+COLUMNS = ("filename", "title", "artist", "album", "format", "size")
+
+def format_size(size):
+    return f"{size / (1024*1024):.2f} MB" if size is not None else "N/A"
+
+class QueueProjection:
+    """Sorted and filtered window onto a QueueModel, as a list of positions in it.
+
+    Sort keys are computed once per column and the sorted permutation is
+    cached and kept up to date as entries are appended, so switching columns
+    or filters never re-sorts. Filtering runs over precomputed, case-folded
+    search strings (tags, filename and format) in time-boxed steps, so a
+    caller can spread a scan of a very large queue over several frames.
+    """
+    INSORT_LIMIT = 2000
+    SCAN_CHUNK = 8192
+
+    def __init__(self, model):
+        self.model = model
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ""
+        self.order = []
+        self._synced = 0
+        self._search = []
+        self._keys = {}
+        self._perms = {}
+        self._matches = None
+        self._candidates = None
+        self._scan_pos = 0
+        self._scan_unordered = False
+        self.sync()
+
+    def row_values(self, pos):
+        """Display values for the entry at a model position, in COLUMNS order."""
+        model = self.model
+        name = model.name(pos)
+        return (
+            name,
+            model.tag("title", pos),
+            model.tag("artist", pos),
+            model.tag("album", pos),
+            os.path.splitext(name)[1][1:].upper(),
+            format_size(model.size(pos))
+        )
+
+    def _search_texts(self, start, end):
+        model = self.model
+        for pos in range(start, end):
+            name = model.name(pos)
+            parts = [name, os.path.splitext(name)[1][1:]]
+            parts.extend(model.tag(key, pos) for key in TAG_KEYS)
+            yield " ".join(part for part in parts if part).casefold()
+
+    def _sort_keys(self, column, start, end):
+        model = self.model
+        positions = range(start, end)
+        if column == "size":
+            return [model.size(pos) or 0 for pos in positions]
+        if column == "filename":
+            return [model.name(pos).casefold() for pos in positions]
+        if column == "format":
+            return [os.path.splitext(model.name(pos))[1].casefold() for pos in positions]
+        if column == "title":
+            return [model.tag("title", pos).casefold() for pos in positions]
+        # Dictionary-encoded column: fold each distinct value once
+        codes, values = model.encoded_column(column)
+        folded = [value.casefold() for value in values]
+        return [folded[codes[pos]] for pos in positions]
+
+    def __len__(self):
+        return len(self.order)
+
+    def index_at(self, row):
+        """Model position of a displayed row."""
+        return self.order[-1 - row] if self.descending else self.order[row]
+
+    def path_at(self, row):
+        return self.model.path(self.index_at(row))
+
+    @property
+    def scanning(self):
+        """True while a filter scan still has candidates left to test."""
+        return self._candidates is not None
+
+    def invalidate(self):
+        """Drop all derived data; call after entries were removed or reordered."""
+        self._synced = 0
+        self._search = []
+        self._keys.clear()
+        self._perms.clear()
+        self.order = []
+        q, self.filter_text = self.filter_text, ""
+        self._matches = self._candidates = None
+        self.sync()
+        if self.sort_column is not None:
+            self._sorted_perm(self.sort_column)
+        self._rebuild_order()
+        self.set_filter(q)
+
+    def sync(self):
+        """Pick up entries appended to the model since the last call."""
+        if len(self.model) < self._synced:
+            self.invalidate()
+            return
+        start, end = self._synced, len(self.model)
+        if start == end:
+            return
+        self._synced = end
+        self._search.extend(self._search_texts(start, end))
+
+        new = range(start, end)
+        for column, keys in self._keys.items():
+            keys.extend(self._sort_keys(column, start, end))
+            perm = self._perms.get(column)
+            if perm is not None:
+                self._merge(perm, new, keys)
+
+        if self._candidates is not None:
+            # Tested (and put back in order) when the running scan gets there
+            self._candidates.extend(new)
+            self._scan_unordered = True
+        elif self._matches is not None:
+            q, search = self.filter_text, self._search
+            self._merge(self._matches, [i for i in new if q in search[i]], self._current_keys())
+        elif self.sort_column is None:
+            self.order.extend(new)
+        # Unfiltered sorted order is the cached permutation itself
+
+    def _current_keys(self):
+        return self._keys[self.sort_column] if self.sort_column is not None else None
+
+    def _merge(self, target, new, keys):
+        if keys is None:
+            target.extend(new)
+        elif len(new) <= self.INSORT_LIMIT:
+            for i in new:
+                insort(target, i, key=keys.__getitem__)
+        else:
+            # Timsort merges the two sorted runs in linear time
+            target.extend(new)
+            target.sort(key=keys.__getitem__)
+
+    def set_sort(self, column, descending=False):
+        self.sort_column = column
+        self.descending = descending
+        if column is not None:
+            self._sorted_perm(column)
+        if self._matches is not None and self._candidates is None:
+            self._matches.sort(key=self._current_keys().__getitem__ if column is not None else None)
+        elif self._candidates is not None:
+            # Restart the scan in the new order
+            q, self.filter_text = self.filter_text, ""
+            self._matches = self._candidates = None
+            self.set_filter(q)
+            return
+        self._rebuild_order()
+
+    def set_filter(self, text):
+        """Start filtering on text; call step() until it returns True."""
+        q = text.strip().casefold()
+        if q == self.filter_text and self._candidates is None:
+            return
+        if not q:
+            self._matches = self._candidates = None
+        elif self._matches is not None and self._candidates is None and self.filter_text in q:
+            # The new query can only match a subset of the previous matches
+            self._candidates = list(self._matches)
+        elif self.sort_column is not None:
+            # Scanning in sorted order keeps the matches sorted as they are found
+            self._candidates = list(self._sorted_perm(self.sort_column))
+        else:
+            self._candidates = list(range(self._synced))
+        self.filter_text = q
+        self._scan_pos = 0
+        self._scan_unordered = False
+        if self._candidates is not None:
+            self._matches = []
+        self._rebuild_order()
+
+    def step(self, budget=0.008):
+        """Advance a pending filter scan for up to budget seconds. Returns True when done."""
+        if self._candidates is None:
+            return True
+        q, search, candidates, found = self.filter_text, self._search, self._candidates, self._matches
+        deadline = time.perf_counter() + budget
+        while self._scan_pos < len(candidates):
+            chunk = candidates[self._scan_pos:self._scan_pos + self.SCAN_CHUNK]
+            self._scan_pos += len(chunk)
+            found.extend(i for i in chunk if q in search[i])
+            if time.perf_counter() >= deadline:
+                break
+        if self._scan_pos >= len(candidates):
+            self._candidates = None
+            if self._scan_unordered:
+                keys = self._current_keys()
+                found.sort(key=keys.__getitem__ if keys is not None else None)
+        return self._candidates is None
+
+    def _sorted_perm(self, column):
+        perm = self._perms.get(column)
+        if perm is None:
+            keys = self._keys.get(column)
+            if keys is None:
+                keys = self._keys[column] = self._sort_keys(column, 0, self._synced)
+            perm = self._perms[column] = sorted(range(len(keys)), key=keys.__getitem__)
+        return perm
+
+    def _rebuild_order(self):
+        # Matches are kept in display order, so the order can alias them
+        if self._matches is not None:
+            self.order = self._matches
+        elif self.sort_column is None:
+            self.order = list(range(self._synced))
+        else:
+            self.order = self._sorted_perm(self.sort_column)
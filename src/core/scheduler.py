@@ -0,0 +1,299 @@
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+from src.core.telemetry import ProcessUsage, telemetry
+
+class ProcessResult(subprocess.CompletedProcess):
+    """CompletedProcess plus the wall time the process itself ran for."""
+    def __init__(self, args, returncode, stdout=None, stderr=None, elapsed=0.0):
+        super().__init__(args, returncode, stdout, stderr)
+        self.elapsed = elapsed
+
+class _MeasuredProcess:
+    """A child process that is reaped through ProcessUsage, for its exact resource use.
+
+    Has the parts of asyncio.subprocess.Process that ProcessScheduler.run
+    uses. Exit is waited for on a thread of its own, so long encodes do
+    not hold threads of the loop's default executor.
+    """
+    def __init__(self, cmd, limit):
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._popen = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.pid = self._popen.pid
+        self.usage = ProcessUsage(self.pid)
+        self.returncode = None
+        self._exited = loop.create_future()
+        self.stdout = asyncio.StreamReader(limit=limit)
+        self.stderr = asyncio.StreamReader(limit=limit)
+        threading.Thread(target=self._reap, name=f"reap-{self.pid}", daemon=True).start()
+
+    async def connect(self):
+        for reader, pipe in ((self.stdout, self._popen.stdout), (self.stderr, self._popen.stderr)):
+            await self._loop.connect_read_pipe(lambda reader=reader: asyncio.StreamReaderProtocol(reader), pipe)
+        return self
+
+    def _reap(self):
+        returncode = self.usage.wait()
+        self._loop.call_soon_threadsafe(self._set_returncode, returncode)
+
+    def _set_returncode(self, returncode):
+        # Popen must not try to reap it again
+        self.returncode = self._popen.returncode = returncode
+        self._exited.set_result(returncode)
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+    def kill(self):
+        if self.returncode is None:
+            os.kill(self.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+class _WeightedLimiter:
+    """Admission by weight against a capacity that can change at any time.
+
+    Waiters are admitted in priority order (lower first), FIFO within a
+    priority. A job heavier than the whole capacity is still admitted once
+    nothing else runs, so a low limit never deadlocks. Must be used on one
+    loop.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_use = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _fits(self, weight):
+        return self.in_use == 0 or self.in_use + weight <= self.capacity
+
+    def _prune(self):
+        # Waiters cancelled while queued are dropped lazily
+        while self._waiters and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+
+    async def acquire(self, weight, priority=0):
+        self._prune()
+        if not self._waiters and self._fits(weight):
+            self.in_use += weight
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), weight, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before the cancellation arrived
+                self.release(weight)
+            else:
+                future.cancel()
+                self._wake()
+            raise
+
+    def release(self, weight):
+        self.in_use -= weight
+        self._wake()
+
+    def resize(self, capacity):
+        self.capacity = capacity
+        self._wake()
+
+    def _wake(self):
+        # Strict order: a heavy job at the head is not overtaken by light ones
+        self._prune()
+        while self._waiters and self._fits(self._waiters[0][2]):
+            _, _, weight, future = heapq.heappop(self._waiters)
+            self.in_use += weight
+            future.set_result(None)
+            self._prune()
+
+class ProcessScheduler:
+    """Runs external processes from a single asyncio event loop.
+
+    The loop lives on one background thread. Queued jobs are coroutines
+    waiting for a slot, not threads, so thousands of them cost almost
+    nothing. Each process takes ``weight`` slots (1 for a plain job) and
+    the total stays within ``max_workers``, which ``set_max_workers`` can
+    change while jobs are running. Output is read incrementally and can be
+    streamed to callbacks line by line. Cancelling a job's future, or
+    hitting its timeout, kills the process.
+
+    ``submit`` and ``run_command`` are the synchronous facade for other
+    threads (such as the Tk main loop); coroutines already running on the
+    loop await ``run`` directly.
+
+    While telemetry is enabled every process is reported as a stage, with
+    its queue wait and resource use, and the pool gauges (see ``stats``)
+    after each start and exit.
+    """
+    STREAM_LIMIT = 1024 * 1024
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            # Use number of CPU cores, but at least 2
+            max_workers = max(2, multiprocessing.cpu_count())
+        self.max_workers = max_workers
+        self.running = 0
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="ProcessScheduler", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # Created on the loop thread, since older Pythons bind it to the running loop
+        self._limiter = _WeightedLimiter(self.max_workers)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def set_max_workers(self, max_workers):
+        """Change the concurrency limit; a lower limit takes effect as running processes finish."""
+        self.max_workers = max(1, max_workers)
+        self._loop.call_soon_threadsafe(self._limiter.resize, self.max_workers)
+
+    @property
+    def pending(self):
+        """Number of submitted jobs that have not finished yet."""
+        with self._lock:
+            return len(self._futures)
+
+    def stats(self):
+        """Pool gauges: processes waiting for a slot and running, slots in use and the limit."""
+        limiter = self._limiter
+        queued = sum(1 for waiter in limiter._waiters if not waiter[3].done())
+        return {
+            "queued": queued,
+            "running": self.running,
+            "in_use": limiter.in_use,
+            "capacity": limiter.capacity,
+            "utilization": min(1.0, limiter.in_use / limiter.capacity) if limiter.capacity else 0.0
+        }
+
+    def submit(self, coro_func, *args, **kwargs):
+        """Schedule a coroutine function on the loop; returns a concurrent.futures.Future."""
+        future = asyncio.run_coroutine_threadsafe(coro_func(*args, **kwargs), self._loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def run_command(self, cmd, timeout=None, on_stdout=None, on_stderr=None, weight=1.0, tail=None, priority=0, stage="process"):
+        """Run a command to completion from a thread other than the loop's."""
+        return self.submit(self.run, cmd, timeout, on_stdout, on_stderr, weight, tail, priority, stage).result()
+
+    async def run(self, cmd, timeout=None, on_stdout=None, on_stderr=None, weight=1.0, tail=None, priority=0, stage="process"):
+        """Run a command once enough slots are free and return a ProcessResult.
+
+        ``on_stdout``/``on_stderr`` are called on the loop thread with each
+        decoded line as it arrives. With ``tail``, only the last that many
+        lines of each stream are kept for the result. Waiting commands start
+        in ``priority`` order, lowest first. Raises subprocess.TimeoutExpired when the
+        process runs longer than ``timeout`` seconds, and OSError when it
+        cannot be started. ``stage`` names the process in telemetry.
+        """
+        measured = telemetry.enabled
+        queued = time.perf_counter() if measured else None
+        await self._limiter.acquire(weight, priority)
+        proc = None
+        try:
+            start = time.perf_counter()
+            if measured and ProcessUsage.supported:
+                proc = await _MeasuredProcess([str(arg) for arg in cmd], self.STREAM_LIMIT).connect()
+            else:
+                proc = await asyncio.create_subprocess_exec(
+                    *[str(arg) for arg in cmd],
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=self.STREAM_LIMIT
+                )
+            self.running += 1
+            if measured:
+                telemetry.emit("pool", self.stats())
+            stdout, stderr = deque(maxlen=tail), deque(maxlen=tail)
+            try:
+                await asyncio.wait_for(asyncio.gather(
+                    self._pump(proc.stdout, stdout, on_stdout),
+                    self._pump(proc.stderr, stderr, on_stderr),
+                    proc.wait()
+                ), timeout)
+            except asyncio.TimeoutError:
+                await self._kill(proc)
+                raise subprocess.TimeoutExpired(cmd, timeout, "".join(stdout), "".join(stderr)) from None
+            except BaseException:
+                # Cancelled: do not leave the process running
+                await self._kill(proc)
+                raise
+            return ProcessResult(cmd, proc.returncode, "".join(stdout), "".join(stderr), time.perf_counter() - start)
+        finally:
+            self._limiter.release(weight)
+            if proc is not None:
+                self.running -= 1
+            if measured:
+                telemetry.record(
+                    stage, time.perf_counter() - start, getattr(proc, "usage", None), queue_wait=start - queued,
+                    returncode=proc.returncode if proc is not None else None
+                )
+                telemetry.emit("pool", self.stats())
+
+    @staticmethod
+    async def _pump(stream, chunks, callback):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            text = line.decode("utf-8", "replace")
+            chunks.append(text)
+            if callback:
+                callback(text)
+
+    @staticmethod
+    async def _kill(proc):
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+
+    def cancel_all(self):
+        """Cancel every queued and running job, killing running processes."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self, wait=True):
+        """Stop the loop. With wait, outstanding jobs finish first; otherwise they are killed."""
+        if not self._thread.is_alive():
+            return
+        if wait:
+            with self._lock:
+                futures = list(self._futures)
+            concurrent.futures.wait(futures)
+        else:
+            self.cancel_all()
+        # Let cancelled jobs run their kill handlers before the loop stops
+        asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _drain(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,260 @@
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from src.core.waveform import DECODE_RATE
+from src.utils.helpers import evict_lru
+
+# Default analysis: ~46 ms windows at 44.1 kHz, half overlapping
+FFT_SIZE = 2048
+HOP = 1024
+# Log-spaced frequency rows from MIN_FREQ to Nyquist
+ROWS = 256
+MIN_FREQ = 20.0
+# Displayed dynamic range, mapped onto 0..255
+FLOOR_DB = -100.0
+# Frames sent through the FFT at a time, bounding the working set
+FFT_BATCH = 512
+# Columns per tile; each level halves the time resolution of the one before
+TILE_WIDTH = 256
+LEVEL_FACTOR = 2
+MAX_LEVELS = 40
+
+MAGIC = b"MFSG"
+VERSION = 1
+# magic, version, sample_rate, FFT size, hop, rows, levels, total samples
+HEADER = struct.Struct("<4sIIIIIIQ")
+# Level lengths are reserved for MAX_LEVELS so the base level can be streamed in
+DATA_OFFSET = HEADER.size + 8 * MAX_LEVELS
+
+# Colour ramp anchors, quiet to loud
+PALETTE = ((0, 0, 0), (40, 10, 90), (140, 20, 120), (220, 60, 50), (250, 170, 30), (255, 255, 210))
+
+def _palette():
+    anchors = np.array(PALETTE, dtype=np.float32)
+    steps = np.linspace(0, len(anchors) - 1, 256)
+    lut = [np.interp(steps, np.arange(len(anchors)), anchors[:, c]) for c in range(3)]
+    return np.stack(lut, axis=1).astype(np.uint8)
+
+LUT = _palette()
+
+def row_starts(sample_rate, fft_size=FFT_SIZE, rows=ROWS):
+    """First FFT bin of each log-spaced row; low rows may share a bin."""
+    nyquist = sample_rate / 2
+    edges = np.geomspace(min(MIN_FREQ, nyquist / 2), nyquist, rows + 1)[:-1]
+    return np.minimum((edges * fft_size / sample_rate).astype(np.int64), fft_size // 2)
+
+class StftBuilder:
+    """Consumes PCM blocks and streams a spectrogram to disk.
+
+    Frames are cut from the incoming blocks with a sliding window view and
+    transformed in batches, and each batch of dB rows is written out
+    immediately, so memory stays bounded whatever the track length. Column
+    k covers samples [k * hop, (k + 1) * hop).
+    """
+    def __init__(self, path, fft_size=FFT_SIZE, hop=HOP, rows=ROWS):
+        self.path = Path(path)
+        self.fft_size = fft_size
+        self.hop = hop
+        self.rows = rows
+        self.sample_rate = None
+        self.total = 0
+        self.columns = 0
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Full scale sine peaks at 0 dB
+        self._reference = self.window.sum() / 2
+        self._starts = None
+        self._carry = np.empty(0, dtype=np.float32)
+        self._file = open(self.path, "wb")
+        self._file.write(b"\0" * DATA_OFFSET)
+
+    def feed(self, sample_rate, samples):
+        if self._starts is None:
+            self.sample_rate = sample_rate
+            self._starts = row_starts(sample_rate, self.fft_size, self.rows)
+        self.total += len(samples)
+        buf = np.concatenate([self._carry, samples]) if len(self._carry) else samples
+        self._carry = self._emit(buf)
+
+    def _emit(self, buf):
+        """Write every frame that starts in buf and fits in it; return the rest."""
+        if len(buf) < self.fft_size:
+            return np.array(buf, dtype=np.float32)
+        count = (len(buf) - self.fft_size) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(buf, self.fft_size)[::self.hop][:count]
+        for start in range(0, count, FFT_BATCH):
+            spectrum = np.abs(np.fft.rfft(frames[start:start + FFT_BATCH] * self.window, axis=1))
+            bands = np.maximum.reduceat(spectrum, self._starts, axis=1)
+            db = 20 * np.log10(np.maximum(bands / self._reference, 1e-10))
+            scaled = np.clip((db - FLOOR_DB) * (255 / -FLOOR_DB), 0, 255)
+            self._file.write(scaled.astype(np.uint8).tobytes())
+        self.columns += count
+        return np.array(buf[count * self.hop:], dtype=np.float32)
+
+    def finish(self):
+        """Flush the last frames, add the coarser levels and write the header."""
+        wanted = -(-self.total // self.hop)
+        missing = wanted - self.columns
+        if missing > 0 and self._starts is not None:
+            # Zero-pad so every hop that holds samples gets its column
+            pad = (missing - 1) * self.hop + self.fft_size - len(self._carry)
+            self._emit(np.concatenate([self._carry, np.zeros(max(pad, 0), dtype=np.float32)]))
+        self._carry = self._carry[:0]
+        self._file.flush()
+        lengths = [self.columns]
+        offset = DATA_OFFSET
+        while lengths[-1] > TILE_WIDTH and len(lengths) < MAX_LEVELS:
+            lengths.append(self._reduce(offset, lengths[-1]))
+            offset += lengths[-2] * self.rows
+        self._file.seek(0)
+        self._file.write(HEADER.pack(
+            MAGIC, VERSION, self.sample_rate or DECODE_RATE, self.fft_size, self.hop, self.rows, len(lengths), self.total
+        ))
+        self._file.write(struct.pack(f"<{len(lengths)}Q", *lengths))
+        self._file.close()
+
+    def _reduce(self, offset, length):
+        """Append the next level, the max of each pair of columns, reading the last in chunks."""
+        source = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset, shape=(length, self.rows))
+        chunk = 65536
+        for start in range(0, length, chunk):
+            block = np.asarray(source[start:start + chunk])
+            if len(block) % LEVEL_FACTOR:
+                block = np.concatenate([block, block[-1:]])
+            self._file.write(block.reshape(-1, LEVEL_FACTOR, self.rows).max(axis=1).tobytes())
+        self._file.flush()
+        del source
+        return -(-length // LEVEL_FACTOR)
+
+    def abort(self):
+        self._file.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+class Spectrogram:
+    """Read-only view of a spectrogram file through a memory map."""
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(DATA_OFFSET)
+        if len(header) < DATA_OFFSET:
+            raise ValueError("truncated spectrogram file")
+        magic, version, self.sample_rate, self.fft_size, self.hop, self.rows, count, self.total = HEADER.unpack_from(header)
+        if magic != MAGIC or version != VERSION or not count or count > MAX_LEVELS:
+            raise ValueError("not a spectrogram file")
+        lengths = struct.unpack_from(f"<{count}Q", header, HEADER.size)
+        if os.path.getsize(self.path) != DATA_OFFSET + sum(lengths) * self.rows:
+            raise ValueError("truncated spectrogram file")
+        self.levels = []
+        offset = DATA_OFFSET
+        for length in lengths:
+            self.levels.append(
+                np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset, shape=(length, self.rows))
+                if length else np.zeros((0, self.rows), dtype=np.uint8)
+            )
+            offset += length * self.rows
+
+    def column_seconds(self, level):
+        return self.hop * LEVEL_FACTOR ** level / self.sample_rate
+
+    def level_for(self, seconds_per_pixel):
+        """The coarsest level whose columns are no wider than a pixel."""
+        level = 0
+        while level + 1 < len(self.levels) and self.column_seconds(level + 1) <= seconds_per_pixel:
+            level += 1
+        return level
+
+    def tile_count(self, level):
+        return -(-len(self.levels[level]) // TILE_WIDTH)
+
+    def render_tile(self, level, index):
+        """RGB image of a tile, low frequencies at the bottom."""
+        columns = np.asarray(self.levels[level][index * TILE_WIDTH:(index + 1) * TILE_WIDTH])
+        return Image.fromarray(LUT[columns.T[::-1]], "RGB")
+
+class SpectrogramStore:
+    """On-disk cache of spectrograms and their rendered tiles, bounded by size.
+
+    Spectrograms are keyed by (content digest, FFT size, hop) and tiles by
+    that plus (level, index), so panning only renders tiles never seen
+    before. The spectrogram itself is built by WaveformStore, in the same
+    decode pass as the peaks.
+    """
+    def __init__(self, root, max_bytes=4 * 1024 ** 3, fft_size=FFT_SIZE, hop=HOP):
+        self.root = Path(root)
+        self.tiles = self.root / "tiles"
+        self.tiles.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fft_size = fft_size
+        self.hop = hop
+        self._saved = 0
+
+    def path_for(self, digest):
+        return self.root / digest[:2] / f"{digest}-{self.fft_size}-{self.hop}.spec"
+
+    def tile_path(self, digest, level, index):
+        return self.tiles / digest[:2] / f"{digest}-{self.fft_size}-{self.hop}-{level}-{index}.png"
+
+    def open(self, digest):
+        """Return the stored spectrogram of a digest, or None."""
+        path = self.path_for(digest)
+        try:
+            spectrogram = Spectrogram(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        spectrogram.digest = digest
+        return spectrogram
+
+    def builder(self, digest):
+        """Start a StftBuilder writing to a temporary file beside the final one."""
+        target = self.path_for(digest)
+        target.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=target.parent)
+        os.close(fd)
+        return StftBuilder(tmp, self.fft_size, self.hop)
+
+    def commit(self, digest, builder):
+        """Finish a builder and move its file into place."""
+        try:
+            builder.finish()
+            os.replace(builder.path, self.path_for(digest))
+        except BaseException:
+            builder.abort()
+            raise
+        self._evict()
+        return self.open(digest)
+
+    def tile(self, spectrogram, level, index):
+        """Return the image of a tile, rendering and storing it on first use."""
+        path = self.tile_path(spectrogram.digest, level, index)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                return image
+        except (OSError, ValueError):
+            pass
+        image = spectrogram.render_tile(level, index)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", suffix=".png", dir=path.parent)
+        os.close(fd)
+        try:
+            image.save(tmp, "PNG")
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return image
+        self._saved += 1
+        if self._saved % 64 == 0:
+            self._evict()
+        return image
+
+    def _evict(self):
+        evict_lru((p for p in self.root.rglob("*") if p.suffix in (".spec", ".png")), self.max_bytes)
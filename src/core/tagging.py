@@ -0,0 +1,230 @@
+import concurrent.futures
+import importlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from src.core.transcode_cache import link_or_copy
+
+# Tag format of each container, decided by extension so no file is probed
+# with the wrong parser first
+TAG_FORMATS = {
+    ".mp3": "id3",
+    ".aac": "id3",
+    ".flac": "flac",
+    ".ogg": "vorbis",
+    ".m4a": "mp4",
+    ".wma": "asf"
+}
+
+# Loaders of the formats other than ID3, which may need a new tag header,
+# as (module, class) so mutagen is only imported when tags are written
+LOADERS = {
+    "flac": ("mutagen.flac", "FLAC"),
+    "vorbis": ("mutagen.oggvorbis", "OggVorbis"),
+    "mp4": ("mutagen.easymp4", "EasyMP4"),
+    "asf": ("mutagen.asf", "ASF")
+}
+
+# Queue tag keys that the easy interfaces name differently
+EASY_KEYS = {"year": "date"}
+ASF_KEYS = {
+    "title": "Title",
+    "artist": "Author",
+    "album": "WM/AlbumTitle",
+    "year": "WM/Year",
+    "genre": "WM/Genre",
+    "tracknumber": "WM/TrackNumber"
+}
+
+# Padding left behind by a full rewrite, so later edits fit in place
+REWRITE_PADDING = 16 * 1024
+
+class _NoRoom(Exception):
+    """The new tags do not fit in the file's existing padding."""
+
+def _keep_padding(info):
+    if info.padding < 0:
+        raise _NoRoom()
+    # Reuse the padding exactly, so nothing after the tags moves
+    return info.padding
+
+def _rewrite_padding(info):
+    return max(info.get_default_padding(), REWRITE_PADDING)
+
+def tag_format(path_str):
+    """The tag format written for a file, or None if it has no writer."""
+    return TAG_FORMATS.get(os.path.splitext(path_str)[1].lower())
+
+def _apply(audio, tags, keys):
+    for key, value in tags.items():
+        name = keys.get(key, key)
+        if value:
+            audio[name] = str(value)
+        elif name in audio:
+            del audio[name]
+
+def _save(fmt, path_str, tags, padding):
+    if fmt == "id3":
+        from mutagen.easyid3 import EasyID3
+        from mutagen.id3 import ID3NoHeaderError
+        try:
+            audio = EasyID3(path_str)
+        except ID3NoHeaderError:
+            audio = EasyID3()
+        _apply(audio, tags, EASY_KEYS)
+        audio.save(path_str, padding=padding)
+        return
+    module, name = LOADERS[fmt]
+    audio = getattr(importlib.import_module(module), name)(path_str)
+    if audio.tags is None:
+        audio.add_tags()
+    _apply(audio, tags, ASF_KEYS if fmt == "asf" else EASY_KEYS)
+    audio.save(padding=padding)
+
+def write_tags(path_str, tags):
+    """Write tags to a file; returns "in_place" or "rewrite".
+
+    Tags with an empty value are removed. When the new tags fit in the
+    file's padding they are written in place; otherwise the file is
+    rewritten into a copy that is renamed over the original, so a crash
+    never leaves it half-written. Raises ValueError for containers without
+    a tag writer, and mutagen or OS errors for unreadable files.
+    """
+    fmt = tag_format(path_str)
+    if fmt is None:
+        raise ValueError(f"no tag writer for {os.path.splitext(path_str)[1] or 'files without extension'}")
+    try:
+        _save(fmt, path_str, tags, _keep_padding)
+        return "in_place"
+    except _NoRoom:
+        pass
+
+    path = Path(path_str)
+    fd, tmp = tempfile.mkstemp(prefix=".mf-", suffix=path.suffix, dir=path.parent)
+    os.close(fd)
+    try:
+        link_or_copy(path, tmp, ("reflink", "copy"))
+        shutil.copymode(path, tmp)
+        _save(fmt, tmp, tags, _rewrite_padding)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return "rewrite"
+
+def _write_chunk(edits):
+    """Process-pool task: write a chunk of (path, tags) edits."""
+    results = []
+    for path_str, tags in edits:
+        try:
+            results.append((path_str, write_tags(path_str, tags), None))
+        except Exception as e:
+            results.append((path_str, None, str(e) or type(e).__name__))
+    return results
+
+class TagJob:
+    """Handle for a running bulk tag edit: progress counters and cancellation."""
+    def __init__(self, total):
+        self.total = total
+        self.in_place = 0
+        self.rewritten = 0
+        self.written = []
+        self.errors = []
+        self.finished = threading.Event()
+        self._cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return len(self.written) + len(self.errors)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+class BulkTagger:
+    """Writes tags to many files at once across a process pool.
+
+    Edits are (path, tags) pairs, sent to the pool in chunks; small edits
+    run on the coordinator thread instead. Progress is read from the
+    returned TagJob, whose ``written`` paths and ``errors`` grow as chunks
+    complete.
+    """
+    def __init__(self, max_workers=None, chunk_size=64):
+        self.max_workers = max_workers or max(2, os.cpu_count() or 2)
+        self.chunk_size = chunk_size
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def start(self, edits, on_done=None):
+        """Start writing edits in the background and return a TagJob."""
+        edits = [(str(path), dict(tags)) for path, tags in edits]
+        job = TagJob(len(edits))
+        thread = threading.Thread(target=self._run, args=(job, edits, on_done), daemon=True)
+        thread.start()
+        return job
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @staticmethod
+    def _collect(job, results):
+        for path_str, mode, error in results:
+            if error is not None:
+                job.errors.append((path_str, error))
+                continue
+            if mode == "in_place":
+                job.in_place += 1
+            else:
+                job.rewritten += 1
+            job.written.append(path_str)
+
+    def _run(self, job, edits, on_done):
+        chunks = [edits[i:i + self.chunk_size] for i in range(0, len(edits), self.chunk_size)]
+        futures = {}
+        try:
+            if len(chunks) == 1:
+                # Too few files to be worth spinning up the pool
+                self._collect(job, _write_chunk(chunks[0]))
+                return
+            pending = iter(chunks)
+            while not job.cancelled:
+                # Keep a bounded number of chunks in flight
+                for chunk in pending:
+                    futures[self._get_executor().submit(_write_chunk, chunk)] = chunk
+                    if len(futures) >= self.max_workers * 2:
+                        break
+                if not futures:
+                    break
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    chunk = futures.pop(future)
+                    try:
+                        self._collect(job, future.result())
+                    except Exception as e:
+                        # A worker died (or the pool was shut down) with the chunk
+                        self._collect(job, [(path_str, None, str(e) or type(e).__name__) for path_str, _ in chunk])
+        finally:
+            for future in futures:
+                future.cancel()
+            job.finished.set()
+            if on_done:
+                on_done(job)
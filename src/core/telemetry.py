@@ -0,0 +1,311 @@
+import contextvars
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# ru_maxrss is in kilobytes, except on macOS
+_RSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# The batch job (input path) the current task or thread works for
+_current_job = contextvars.ContextVar("musicforge_job", default=None)
+
+class ProcessUsage:
+    """CPU time, peak memory and I/O of a child process.
+
+    ``wait`` reaps the process itself with os.wait4, which reports its
+    exact resource use. Just before that, while the exited process is
+    still a zombie, its I/O counters are read from /proc where there is
+    one. Fields that could not be measured stay None; on Windows,
+    without os.wait4, that is all of them.
+    """
+    supported = hasattr(os, "wait4")
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.cpu_user = self.cpu_system = self.max_rss = None
+        self.read_bytes = self.write_bytes = self.disk_read_bytes = self.disk_write_bytes = None
+
+    def wait(self):
+        """Block until the process exits, reap it and return its exit code."""
+        if hasattr(os, "waitid"):
+            # WNOWAIT leaves the zombie in place for _read_io
+            os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+            self._read_io()
+        _, status, rusage = os.wait4(self.pid, 0)
+        self.cpu_user, self.cpu_system = rusage.ru_utime, rusage.ru_stime
+        self.max_rss = rusage.ru_maxrss * _RSS_SCALE
+        return os.waitstatus_to_exitcode(status)
+
+    def _read_io(self):
+        try:
+            with open(f"/proc/{self.pid}/io", "rb") as f:
+                io = dict(line.split(b":") for line in f.read().splitlines())
+            # rchar/wchar count pipe and cached reads too; read_bytes/write_bytes only storage
+            self.read_bytes, self.write_bytes = int(io[b"rchar"]), int(io[b"wchar"])
+            self.disk_read_bytes, self.disk_write_bytes = int(io[b"read_bytes"]), int(io[b"write_bytes"])
+        except (OSError, KeyError, ValueError):
+            # No /proc, or io accounting is restricted
+            pass
+
+    def to_dict(self):
+        cpu = None if self.cpu_user is None else self.cpu_user + self.cpu_system
+        return {
+            "cpu": cpu, "cpu_user": self.cpu_user, "cpu_system": self.cpu_system, "max_rss": self.max_rss,
+            "read_bytes": self.read_bytes, "write_bytes": self.write_bytes,
+            "disk_read_bytes": self.disk_read_bytes, "disk_write_bytes": self.disk_write_bytes
+        }
+
+class Telemetry:
+    """Hands pipeline timings to the sinks subscribed to it.
+
+    Sinks are callables taking (event, data), like QueueModel listeners,
+    and are called on whichever thread did the work. Events:
+
+    - "stage": one step of a job, either an external process ("probe",
+      "loudness", "encode", "remux") or work in this process
+      ("read_tags", "write_tags"). Data: stage, job (input path or
+      None), wall, cpu, cpu_user, cpu_system, max_rss, read_bytes,
+      write_bytes, disk_read_bytes, disk_write_bytes, queue_wait, and
+      returncode for processes. Fields that cannot be measured are None.
+    - "job": a finished batch job with its status, wall time and the
+      totals of its stages (``stages`` maps each stage to its wall time).
+    - "pool": ProcessScheduler gauges after a process started or ended:
+      queued, running, in_use, capacity, utilization.
+
+    With no sinks ``enabled`` is False and instrumented code measures
+    nothing, so telemetry costs one attribute check per step when off.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._sinks = []
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+            self.enabled = True
+
+    def unsubscribe(self, sink):
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+            self.enabled = bool(self._sinks)
+
+    def emit(self, event, data):
+        for sink in list(self._sinks):
+            sink(event, data)
+
+    @staticmethod
+    def bind(job):
+        """Attribute the stages of the current task or thread (and the threads it starts) to job."""
+        _current_job.set(job)
+
+    def open_job(self, job):
+        """Start collecting the stages of a job; close_job reports them."""
+        with self._lock:
+            self._jobs[job] = {"start": time.perf_counter(), "stages": {}, "cpu": 0.0, "queue_wait": 0.0,
+                               "max_rss": None, "read_bytes": 0, "write_bytes": 0}
+
+    def close_job(self, job, **fields):
+        with self._lock:
+            totals = self._jobs.pop(job, None)
+        if totals is None:
+            return
+        start = totals.pop("start")
+        stages = totals.pop("stages")
+        self.emit("job", dict(
+            fields, job=job, wall=time.perf_counter() - start, stages={name: round(wall, 6) for name, wall in stages.items()},
+            **totals
+        ))
+
+    def record(self, stage, wall, usage=None, **fields):
+        """Report a finished stage; ``usage`` is a ProcessUsage or a dict of its fields."""
+        if isinstance(usage, ProcessUsage):
+            usage = usage.to_dict()
+        data = dict(ProcessUsage(None).to_dict(), **(usage or {}))
+        data.update(fields, stage=stage, job=_current_job.get(), wall=wall)
+        data.setdefault("queue_wait", None)
+        if data["job"] is not None:
+            self._add_to_job(data)
+        self.emit("stage", data)
+
+    def _add_to_job(self, data):
+        with self._lock:
+            totals = self._jobs.get(data["job"])
+            if totals is None:
+                return
+            stages = totals["stages"]
+            stages[data["stage"]] = stages.get(data["stage"], 0.0) + data["wall"]
+            for key in ("cpu", "queue_wait", "read_bytes", "write_bytes"):
+                if data[key] is not None:
+                    totals[key] += data[key]
+            if data["max_rss"] is not None:
+                totals["max_rss"] = max(totals["max_rss"] or 0, data["max_rss"])
+
+# Shared by the whole process; nothing is measured until a sink subscribes
+telemetry = Telemetry()
+
+def instrumented(stage):
+    """Decorator reporting each call of a function as a stage of the calling thread."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not telemetry.enabled:
+                return func(*args, **kwargs)
+            start, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                telemetry.record(stage, time.perf_counter() - start, {"cpu": time.thread_time() - cpu})
+        return wrapper
+    return decorate
+
+def run_process(cmd, stage):
+    """subprocess.run(cmd, capture_output=True, text=True), reported as a stage."""
+    if not ProcessUsage.supported:
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        telemetry.record(stage, time.perf_counter() - start, queue_wait=0.0, returncode=result.returncode)
+        return result
+    start = time.perf_counter()
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as proc:
+        usage = ProcessUsage(proc.pid)
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        reader.start()
+        stdout = proc.stdout.read()
+        reader.join()
+        # Reaped here rather than by Popen, which would discard the rusage
+        proc.returncode = usage.wait()
+    telemetry.record(stage, time.perf_counter() - start, usage, queue_wait=0.0, returncode=proc.returncode)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr[0])
+
+class JsonlSink:
+    """Appends every event to a file as one JSON object per line."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def __call__(self, event, data):
+        line = json.dumps(dict(data, event=event, time=round(time.time(), 6)), default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class StageSummary:
+    """Running totals per stage and the latest pool gauges, for display."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.jobs = {}
+            self.pool = {}
+
+    def __call__(self, event, data):
+        with self._lock:
+            if event == "stage":
+                totals = self.stages.setdefault(data["stage"], {
+                    "runs": 0, "wall": 0.0, "cpu": 0.0, "queue_wait": 0.0, "max_rss": 0, "read_bytes": 0, "write_bytes": 0
+                })
+                totals["runs"] += 1
+                for key in ("wall", "cpu", "queue_wait", "read_bytes", "write_bytes"):
+                    if data[key] is not None:
+                        totals[key] += data[key]
+                if data["max_rss"] is not None:
+                    totals["max_rss"] = max(totals["max_rss"], data["max_rss"])
+            elif event == "job":
+                status = data.get("status", "done")
+                self.jobs[status] = self.jobs.get(status, 0) + 1
+            elif event == "pool":
+                self.pool = dict(data)
+
+    def snapshot(self):
+        """Copies of the totals as {"stages", "jobs", "pool"}."""
+        with self._lock:
+            return {
+                "stages": {name: dict(totals) for name, totals in self.stages.items()},
+                "jobs": dict(self.jobs),
+                "pool": dict(self.pool)
+            }
+
+class PrometheusSink(StageSummary):
+    """Keeps a node_exporter textfile of the totals up to date.
+
+    The file is rewritten atomically at most every ``interval`` seconds
+    while events arrive, and once more on close().
+    """
+    PREFIX = "musicforge"
+
+    def __init__(self, path, interval=5.0):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self._written = 0.0
+
+    def __call__(self, event, data):
+        super().__call__(event, data)
+        now = time.monotonic()
+        if now - self._written >= self.interval:
+            self._written = now
+            self.write()
+
+    def format(self):
+        snapshot = self.snapshot()
+        p = self.PREFIX
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            lines.extend(f"{p}_{name}{labels} {value:g}" for labels, value in samples)
+
+        stages = sorted(snapshot["stages"].items())
+        for name, key, kind, help_text in (
+            ("stage_runs_total", "runs", "counter", "Stages run."),
+            ("stage_wall_seconds_total", "wall", "counter", "Wall time spent in each stage."),
+            ("stage_cpu_seconds_total", "cpu", "counter", "CPU time of each stage."),
+            ("stage_queue_wait_seconds_total", "queue_wait", "counter", "Time processes waited for a worker slot."),
+            ("stage_read_bytes_total", "read_bytes", "counter", "Bytes read by each stage."),
+            ("stage_write_bytes_total", "write_bytes", "counter", "Bytes written by each stage."),
+            ("stage_max_rss_bytes", "max_rss", "gauge", "Peak resident memory of a single process of each stage.")
+        ):
+            family(name, kind, help_text, [(f'{{stage="{stage}"}}', totals[key]) for stage, totals in stages])
+        family("jobs_total", "counter", "Finished batch jobs.",
+               [(f'{{status="{status}"}}', count) for status, count in sorted(snapshot["jobs"].items())])
+        for name in ("queued", "running", "utilization"):
+            if name in snapshot["pool"]:
+                family(f"pool_{name}", "gauge", f"Worker pool {name}.", [("", snapshot["pool"][name])])
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.format())
+            os.replace(tmp, self.path)
+        except OSError:
+            # Metrics are best effort; the next write tries again
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def close(self):
+        self.write()
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.utils.helpers import file_digest
+
+MANIFEST_NAME = ".musicforge-manifest.json"
+
+# Options that do not change the encoded bytes: where the file goes, the
+# loudness measurements and probed duration, which are derived from the
+# input, and the other targets encoded alongside
+NON_OUTPUT_OPTIONS = {"output_dir", "loudness", "duration", "targets"}
+
+def canonical_options(options):
+    """Stable JSON form of the options that affect an encode's output."""
+    relevant = {key: value for key, value in options.items() if key not in NON_OUTPUT_OPTIONS}
+    return json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+
+def _reflink(src, dst):
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink not supported on this platform")
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+def link_or_copy(src, dst, methods=("reflink", "hardlink", "copy")):
+    """Atomically place a copy of src at dst with the cheapest method that works.
+
+    Returns the method used. An existing dst is replaced, never written
+    through, so a hardlinked file elsewhere is left untouched.
+    """
+    dst = Path(dst)
+    fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=dst.parent)
+    os.close(fd)
+    os.unlink(tmp)
+    try:
+        for method in methods:
+            try:
+                if method == "reflink":
+                    _reflink(src, tmp)
+                elif method == "hardlink":
+                    os.link(src, tmp)
+                else:
+                    shutil.copyfile(src, tmp)
+            except OSError:
+                continue
+            os.replace(tmp, dst)
+            return method
+        raise OSError(f"could not copy {src} to {dst}")
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+class TranscodeCache:
+    """Content-addressed store of encoded outputs, bounded by total size.
+
+    Keys combine the input's content digest, the canonical options and the
+    FFmpeg version, so any change to one of them is a miss. Objects are
+    copied in by reflink or plain copy, never hardlinked, so later edits
+    to an output do not reach the store; hits may be hardlinked out, and an
+    object whose size or mtime changed since it was stored (edited through
+    such a link) is dropped instead of served. ``digests`` is an optional
+    MetadataCache used to avoid re-hashing unchanged inputs.
+    """
+    SCHEMA_VERSION = 1
+    STORE_METHODS = ("reflink", "copy")
+
+    def __init__(self, root, max_bytes=20 * 1024 ** 3, digests=None):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.digests = digests
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.root / "index.db"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._count, self._bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+
+    def _init_schema(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS objects")
+            self._conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " key TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS objects_last_used ON objects(last_used)")
+
+    def key_for(self, input_path, options, ffmpeg_version):
+        """Cache key of encoding input_path with options under an FFmpeg build."""
+        path_str = str(input_path)
+        digest = self.digests.digest(path_str) if self.digests else file_digest(path_str)
+        h = hashlib.sha1()
+        for part in (digest, canonical_options(options), ffmpeg_version):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _object_path(self, name):
+        return self.objects / name[:2] / name
+
+    def lookup(self, key):
+        """Return the stored object for key, or None (also when the index cannot be read)."""
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT name, size, mtime_ns FROM objects WHERE key=?", (key,)).fetchone()
+                if row is not None:
+                    path = self._object_path(row[0])
+                    try:
+                        st = path.stat()
+                        valid = (st.st_size, st.st_mtime_ns) == (row[1], row[2])
+                    except OSError:
+                        valid = False
+                    if valid:
+                        self.hits += 1
+                        self._conn.execute("UPDATE objects SET last_used=? WHERE key=?", (time.time(), key))
+                        return path
+                    self._remove(key, row[0], row[1])
+            except sqlite3.Error:
+                # A locked or damaged index only costs an encode
+                pass
+            self.misses += 1
+            return None
+
+    def store(self, key, output_path):
+        """Add an encoded output to the store under key; skipped if the index cannot be written."""
+        name = key + Path(output_path).suffix
+        path = self._object_path(name)
+        path.parent.mkdir(exist_ok=True)
+        link_or_copy(output_path, path, self.STORE_METHODS)
+        st = path.stat()
+        with self._lock:
+            try:
+                old = self._conn.execute("SELECT size FROM objects WHERE key=?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+                    (key, name, st.st_size, st.st_mtime_ns, time.time())
+                )
+            except sqlite3.Error:
+                # Unindexed objects are never served, so drop the copy
+                path.unlink(missing_ok=True)
+                return
+            self._bytes += st.st_size - (old[0] if old else 0)
+            self._count += 0 if old else 1
+            if self._bytes > self.max_bytes:
+                try:
+                    self._evict()
+                except sqlite3.Error:
+                    # Retried after the next store
+                    pass
+
+    def _remove(self, key, name, size):
+        self._conn.execute("DELETE FROM objects WHERE key=?", (key,))
+        self._count -= 1
+        self._bytes -= size
+        try:
+            self._object_path(name).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        # Drop the least recently used objects down to 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, name, size FROM objects ORDER BY last_used").fetchall()
+        for key, name, size in rows:
+            if self._bytes <= target:
+                break
+            self._remove(key, name, size)
+
+    def stats(self):
+        """Return hit/miss counters, the number of objects and their total size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": self._count,
+                "bytes": self._bytes
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class OutputManifest:
+    """Record of how each file in an output directory was produced.
+
+    Maps output file names to their cache key, input and size, so a re-run
+    can leave outputs that are already up to date alone.
+    """
+    def __init__(self, output_dir):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def is_current(self, output_path, key):
+        """True if output_path exists and was produced under key."""
+        entry = self.entries.get(Path(output_path).name)
+        if not entry or entry.get("key") != key:
+            return False
+        try:
+            return os.path.getsize(output_path) == entry.get("size")
+        except OSError:
+            return False
+
+    def record(self, output_path, key, input_path):
+        with self._lock:
+            self.entries[Path(output_path).name] = {
+                "key": key,
+                "input": str(input_path),
+                "size": os.path.getsize(output_path)
+            }
+
+    def save(self):
+        """Write the manifest atomically."""
+        with self._lock:
+            data = json.dumps({"version": 1, "files": self.entries}, indent=1, sort_keys=True)
+        fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
@@ -0,0 +1,388 @@
+import concurrent.futures
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.helpers import evict_lru, file_digest, find_ffmpeg
+
+# Rate that FFmpeg decodes to; WAV files read directly keep their own rate
+DECODE_RATE = 44100
+# Samples per bucket of the finest level, and the reduction between levels
+BASE_BUCKET = 256
+LEVEL_FACTOR = 4
+# Levels are added until the coarsest has at most this many buckets
+MIN_LEVEL_BUCKETS = 1024
+# Samples handed to the reducers at a time, a multiple of BASE_BUCKET
+BLOCK_SAMPLES = BASE_BUCKET * 4096
+
+MAGIC = b"MFPK"
+VERSION = 1
+# magic, version, sample_rate, base bucket, level factor, levels, total samples
+HEADER = struct.Struct("<4sIIIIIQ")
+# Columns of each level: min, max and RMS, stored as float16
+COLUMNS = 3
+DTYPE = np.dtype("<f2")
+
+# WAV sample formats that can be memory-mapped as is: (format tag, bits) -> (dtype, scale)
+WAV_FORMATS = {
+    (1, 16): ("<i2", 1 / 32768),
+    (1, 32): ("<i4", 1 / 2147483648),
+    (3, 32): ("<f4", 1.0),
+    (3, 64): ("<f8", 1.0)
+}
+
+def _wav_layout(path_str):
+    """Locate the sample data of a WAV file that can be read without decoding.
+
+    Returns (offset, frames, channels, dtype, scale, sample_rate), or None
+    for other containers and sample formats (8/24-bit, compressed).
+    """
+    try:
+        with open(path_str, "rb") as f:
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                head = f.read(8)
+                if len(head) < 8:
+                    return None
+                chunk_id, size = head[:4], struct.unpack("<I", head[4:])[0]
+                if chunk_id == b"fmt ":
+                    fmt = f.read(size)
+                elif chunk_id == b"data":
+                    break
+                else:
+                    f.seek(size, os.SEEK_CUR)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            offset = f.tell()
+            file_size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return None
+    if fmt is None or len(fmt) < 16:
+        return None
+    tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == 0xFFFE and len(fmt) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE keeps the real tag at the start of the sub-format GUID
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    layout = WAV_FORMATS.get((tag, bits))
+    if layout is None or not channels or block_align != channels * bits // 8:
+        return None
+    # Streaming writers leave the data size unset, so trust the file size
+    frames = (min(size, file_size - offset) if size else file_size - offset) // block_align
+    return offset, frames, channels, layout[0], layout[1], sample_rate
+
+def stream_pcm(path_str, ffmpeg_bin=None, block=BLOCK_SAMPLES):
+    """Decode a file to mono float32 PCM, yielding (sample_rate, samples) blocks.
+
+    PCM WAV files are read through a memory map; anything else is decoded
+    by FFmpeg into a pipe. Memory stays bounded by ``block`` either way.
+    Raises OSError when FFmpeg fails.
+    """
+    layout = _wav_layout(path_str)
+    if layout is not None:
+        offset, frames, channels, dtype, scale, sample_rate = layout
+        if frames == 0:
+            return
+        data = np.memmap(path_str, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+        for start in range(0, frames, block):
+            chunk = data[start:start + block]
+            samples = chunk.mean(axis=1, dtype=np.float32) if channels > 1 else chunk[:, 0].astype(np.float32)
+            if scale != 1.0:
+                samples *= scale
+            yield sample_rate, samples
+        return
+
+    cmd = [
+        ffmpeg_bin or find_ffmpeg(), "-v", "error", "-i", str(path_str), "-vn",
+        "-ac", "1", "-ar", str(DECODE_RATE), "-f", "f32le", "pipe:1"
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr is drained on the side so a chatty FFmpeg cannot fill its pipe
+    errors = []
+    drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    try:
+        while True:
+            data = proc.stdout.read(block * 4)
+            if not data:
+                break
+            yield DECODE_RATE, np.frombuffer(data[:len(data) - len(data) % 4], dtype="<f4")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        drain.join()
+    if proc.returncode != 0:
+        lines = (errors[0] if errors else b"").decode("utf-8", "replace").strip().splitlines()
+        raise OSError(lines[-1] if lines else f"ffmpeg exited with {proc.returncode}")
+
+def reduce_buckets(samples, bucket):
+    """Per-bucket (min, max, RMS) rows of samples; a trailing partial bucket counts."""
+    n = len(samples)
+    full = n - n % bucket
+    rows = []
+    if full:
+        blocks = samples[:full].reshape(-1, bucket)
+        rows.append(np.stack([
+            blocks.min(axis=1),
+            blocks.max(axis=1),
+            np.sqrt(np.einsum("ij,ij->i", blocks, blocks) / bucket)
+        ], axis=1))
+    if full < n:
+        tail = samples[full:]
+        rows.append(np.array([[tail.min(), tail.max(), np.sqrt(np.dot(tail, tail) / len(tail))]], dtype=np.float32))
+    if not rows:
+        return np.empty((0, COLUMNS), dtype=np.float32)
+    return np.concatenate(rows).astype(np.float32, copy=False)
+
+def reduce_level(rows, factor):
+    """Merge every ``factor`` rows of a level into one row of the next."""
+    n = len(rows)
+    starts = np.arange(0, n, factor)
+    counts = np.diff(np.append(starts, n))
+    rows = rows.astype(np.float32)
+    return np.stack([
+        np.minimum.reduceat(rows[:, 0], starts),
+        np.maximum.reduceat(rows[:, 1], starts),
+        np.sqrt(np.add.reduceat(rows[:, 2] ** 2, starts) / counts)
+    ], axis=1)
+
+class PeakBuilder:
+    """Consumes PCM blocks and produces a peak pyramid.
+
+    Blocks are reduced as they arrive, so only the finest level (a few
+    bytes per BASE_BUCKET samples) is held in memory.
+    """
+    def __init__(self, bucket=BASE_BUCKET, factor=LEVEL_FACTOR):
+        self.bucket = bucket
+        self.factor = factor
+        self.sample_rate = None
+        self.total = 0
+        self._rows = []
+        self._carry = np.empty(0, dtype=np.float32)
+
+    def feed(self, sample_rate, samples):
+        self.sample_rate = sample_rate
+        self.total += len(samples)
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+        # Hold back a partial bucket until the next block completes it
+        full = len(samples) - len(samples) % self.bucket
+        self._carry = samples[full:].copy()
+        if full:
+            self._rows.append(reduce_buckets(samples[:full], self.bucket))
+
+    def finish(self):
+        """Return the levels, finest first."""
+        if len(self._carry):
+            self._rows.append(reduce_buckets(self._carry, self.bucket))
+            self._carry = self._carry[:0]
+        level = np.concatenate(self._rows) if self._rows else np.zeros((1, COLUMNS), dtype=np.float32)
+        self._rows = []
+        levels = [level]
+        while len(level) > MIN_LEVEL_BUCKETS:
+            level = reduce_level(level, self.factor)
+            levels.append(level)
+        return levels
+
+def write_pyramid(path, sample_rate, total, levels, bucket=BASE_BUCKET, factor=LEVEL_FACTOR):
+    """Write a pyramid file atomically."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=".mf-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, sample_rate, bucket, factor, len(levels), total))
+            f.write(struct.pack(f"<{len(levels)}Q", *(len(level) for level in levels)))
+            for level in levels:
+                f.write(np.ascontiguousarray(level, dtype=DTYPE).tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+class PeakPyramid:
+    """Read-only view of a pyramid file through a memory map.
+
+    Only the pages of the level and range being drawn are read, so the
+    cost of ``columns`` does not depend on the length of the track.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("truncated peak file")
+            magic, version, self.sample_rate, self.bucket, self.factor, count, self.total = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or not self.sample_rate or not count:
+                raise ValueError("not a peak file")
+            lengths = struct.unpack(f"<{count}Q", f.read(8 * count))
+        data = np.memmap(self.path, dtype=DTYPE, mode="r", offset=HEADER.size + 8 * count)
+        if len(data) != sum(lengths) * COLUMNS:
+            raise ValueError("truncated peak file")
+        self.levels = []
+        start = 0
+        for length in lengths:
+            self.levels.append(data[start:start + length * COLUMNS].reshape(length, COLUMNS))
+            start += length * COLUMNS
+
+    @property
+    def duration(self):
+        return self.total / self.sample_rate
+
+    def level_for(self, samples_per_column):
+        """The coarsest level whose buckets are no wider than one column."""
+        level, width = 0, self.bucket
+        while level + 1 < len(self.levels) and width * self.factor <= samples_per_column:
+            level += 1
+            width *= self.factor
+        return level
+
+    def columns(self, start, end, width):
+        """(min, max, RMS) rows for ``width`` columns spanning start..end seconds.
+
+        The range is clamped to the track; columns past its end are zero.
+        """
+        out = np.zeros((max(0, int(width)), COLUMNS), dtype=np.float32)
+        if width <= 0 or end <= start:
+            return out
+        samples_per_column = (end - start) * self.sample_rate / width
+        level = self.level_for(samples_per_column)
+        rows = self.levels[level]
+        bucket_samples = self.bucket * self.factor ** level
+        # Column edges in (fractional) buckets of the chosen level
+        edges = (start + np.arange(width + 1) * (end - start) / width) * self.sample_rate / bucket_samples
+        first = np.clip(np.floor(edges[:-1]).astype(np.int64), 0, None)
+        last = np.ceil(edges[1:]).astype(np.int64)
+        inside = first < len(rows)
+        if not inside.any():
+            return out
+        lo = int(first[inside][0])
+        hi = int(min(len(rows), last[inside][-1]))
+        chunk = np.asarray(rows[lo:hi], dtype=np.float32)
+        idx = first[inside] - lo
+        # Columns narrower than a bucket repeat an index, for which reduceat yields that one row
+        counts = np.maximum(np.diff(np.append(idx, len(chunk))), 1)
+        out[inside, 0] = np.minimum.reduceat(chunk[:, 0], idx)
+        out[inside, 1] = np.maximum.reduceat(chunk[:, 1], idx)
+        out[inside, 2] = np.sqrt(np.add.reduceat(chunk[:, 2] ** 2, idx) / counts)
+        return out
+
+class WaveformStore:
+    """On-disk cache of peak pyramids, keyed by content digest and bounded by size.
+
+    A track is decoded at most once: concurrent requests for the same
+    content share one build, and later requests (also after a rename or
+    from another session) open the stored file. With a SpectrogramStore
+    in ``spectrograms``, the same decode pass also builds the track's
+    spectrogram. ``digests`` is an optional MetadataCache used to avoid
+    re-hashing unchanged files.
+    """
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, digests=None, ffmpeg_bin=None, spectrograms=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.digests = digests
+        self.ffmpeg_bin = ffmpeg_bin
+        self.spectrograms = spectrograms
+        self._lock = threading.Lock()
+        self._builds = {}
+
+    def digest(self, path_str):
+        return self.digests.digest(path_str) if self.digests else file_digest(path_str)
+
+    def path_for(self, digest):
+        return self.root / digest[:2] / f"{digest}.peaks"
+
+    def get(self, path_str):
+        """Return the stored pyramid of a file, or None if it was never built."""
+        return self._open(self.path_for(self.digest(str(path_str))))
+
+    def _open(self, path):
+        try:
+            pyramid = PeakPyramid(path)
+        except (OSError, ValueError):
+            return None
+        try:
+            # The file's mtime doubles as its last use for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return pyramid
+
+    def _open_all(self, digest):
+        pyramid = self._open(self.path_for(digest))
+        spectrogram = self.spectrograms.open(digest) if self.spectrograms else None
+        complete = pyramid is not None and (spectrogram is not None or not self.spectrograms)
+        return complete, pyramid, spectrogram
+
+    def load(self, path_str):
+        """Return the pyramid of a file, building it if needed.
+
+        Raises OSError when the file cannot be read or decoded.
+        """
+        return self.analyse(path_str)[0]
+
+    def analyse(self, path_str):
+        """Return (pyramid, spectrogram) of a file, building what is missing in one decode.
+
+        The spectrogram is None without a SpectrogramStore. Raises OSError
+        when the file cannot be read or decoded.
+        """
+        path_str = str(path_str)
+        digest = self.digest(path_str)
+        complete, pyramid, spectrogram = self._open_all(digest)
+        if complete:
+            return pyramid, spectrogram
+        with self._lock:
+            future = self._builds.get(digest)
+            owner = future is None
+            if owner:
+                future = self._builds[digest] = concurrent.futures.Future()
+        if not owner:
+            return future.result()
+        try:
+            result = self._build(path_str, digest, pyramid, spectrogram)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._builds[digest]
+
+    def _build(self, path_str, digest, pyramid, spectrogram):
+        # Only the missing halves are built, from a single stream of the audio
+        peaks = PeakBuilder() if pyramid is None else None
+        stft = self.spectrograms.builder(digest) if self.spectrograms and spectrogram is None else None
+        try:
+            for sample_rate, samples in stream_pcm(path_str, self.ffmpeg_bin):
+                if peaks:
+                    peaks.feed(sample_rate, samples)
+                if stft:
+                    stft.feed(sample_rate, samples)
+        except BaseException:
+            if stft:
+                stft.abort()
+            raise
+        if stft:
+            spectrogram = self.spectrograms.commit(digest, stft)
+        if peaks:
+            target = self.path_for(digest)
+            target.parent.mkdir(exist_ok=True)
+            write_pyramid(target, peaks.sample_rate or DECODE_RATE, peaks.total, peaks.finish())
+            self._evict()
+            pyramid = PeakPyramid(target)
+        return pyramid, spectrogram
+
+    def _evict(self):
+        evict_lru(self.root.glob("*/*.peaks"), self.max_bytes)
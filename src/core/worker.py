@@ -1,26 +1,5 @@
 import threading
 import queue
-import concurrent.futures
-import multiprocessing
-
-class ParallelWorker:
-    """A worker that can execute tasks in parallel using a thread pool."""
-    def __init__(self, max_workers=None):
-        if max_workers is None:
-            # Use number of CPU cores, but at least 2
-            max_workers = max(2, multiprocessing.cpu_count())
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-        self.futures = []
-
-    def submit(self, func, *args, **kwargs):
-        """Submit a task to the worker."""
-        future = self.executor.submit(func, *args, **kwargs)
-        self.futures.append(future)
-        return future
-
-    def shutdown(self, wait=True):
-        """Shutdown the executor."""
-        self.executor.shutdown(wait=wait)
 
 class SerialWorker(threading.Thread):
     """A traditional serial worker for tasks that must be done in order."""
@@ -1,27 +1,55 @@
 import tkinter as tk
 from tkinter import ttk
-import pygame
+import numpy as np
 from pathlib import Path
+from collections import OrderedDict
+import queue
 import threading
 import time
+from PIL import Image, ImageTk
 
-class PlayerView(ttk.Frame):
+from src.core.progress import format_eta
+from src.core.spectrogram import TILE_WIDTH
+from src.ui.view import View
+
+# Closest zoom, in seconds across the whole canvas
+MIN_SPAN = 0.05
+ZOOM_STEP = 1.25
+# Decoded spectrogram tiles kept in memory
+TILE_MEMORY = 256
+# Edge of the cover shown next to the track
+ART_SIZE = 160
+
+class PlayerView(View):
     def __init__(self, parent, app, **kwargs):
-        super().__init__(parent, **kwargs)
-        self.app = app
+        super().__init__(parent, app, **kwargs)
         
         self.is_playing = False
         self.current_track = tk.StringVar(value="No track selected")
         self.time_info = tk.StringVar(value="00:00 / 00:00")
         self.progress = tk.DoubleVar(value=0.0)
+
+        # Waveform and spectrogram of the current track and the visible span, in seconds
+        self.waveform = None
+        self.spectrogram = None
+        self.show_spectrogram = tk.BooleanVar(value=False)
+        self.view_start = 0.0
+        self.view_end = 0.0
+        self._waveform_result = None
+        self._drag_x = None
+        # Spectrogram tiles by (level, index), their on-screen images, and renders in flight
+        self._tiles = OrderedDict()
+        self._tile_photos = {}
+        self._tile_pending = set()
+        self._tile_results = queue.Queue()
+        self._art_path = None
+        self._art_photo = None
+        # Engine events, handed from the audio thread to the Tk thread
+        self.position = 0.0
+        self._events = queue.Queue()
+        self._seeking = False
         
-        try:
-            pygame.mixer.init()
-        except Exception:
-            pass
-            
         self._build_ui()
-        self._update_loop()
 
     def _build_ui(self):
         ttk.Label(self, text="Audio Player", font=("Segoe UI", 18, "bold")).pack(anchor="w", pady=(0, 20))
@@ -29,14 +57,25 @@ class PlayerView(ttk.Frame):
         # Track Info
         info_frame = ttk.Frame(self, padding=20)
         info_frame.pack(fill="x")
+        self.art_label = ttk.Label(info_frame)
+        self.art_label.pack()
         
         ttk.Label(info_frame, textvariable=self.current_track, font=("Segoe UI", 14)).pack()
         ttk.Label(info_frame, textvariable=self.time_info).pack(pady=5)
         
-        # Waveform Placeholder
+        ttk.Checkbutton(self, text="Spectrogram", variable=self.show_spectrogram, command=self._redraw).pack(
+            anchor="e", padx=20
+        )
+        # Waveform: wheel zooms around the pointer, drag or Shift+wheel scrolls, double-click resets
         self.canvas = tk.Canvas(self, height=150, bg="#1a1a1a", highlightthickness=0)
-        self.canvas.pack(fill="x", pady=20, padx=20)
-        self._draw_waveform_placeholder()
+        self.canvas.pack(fill="x", pady=(5, 20), padx=20)
+        self.canvas.bind("<Configure>", lambda e: self._redraw())
+        self.canvas.bind("<MouseWheel>", lambda e: self._on_wheel(e, e.delta > 0))
+        self.canvas.bind("<Button-4>", lambda e: self._on_wheel(e, True))
+        self.canvas.bind("<Button-5>", lambda e: self._on_wheel(e, False))
+        self.canvas.bind("<ButtonPress-1>", self._on_drag_start)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<Double-Button-1>", lambda e: self._reset_zoom())
         
         # Controls
         ctrl_frame = ttk.Frame(self)
@@ -51,48 +90,328 @@ class PlayerView(ttk.Frame):
         self.slider = ttk.Scale(self, from_=0, to=100, variable=self.progress, orient="horizontal", command=self._seek)
         self.slider.pack(fill="x", padx=40, pady=10)
 
-    def _draw_waveform_placeholder(self):
-        self.canvas.delete("all")
-        w = self.canvas.winfo_width() or 800
+    def on_show(self):
+        # Playback carries on while the view is hidden, so pick up where the engine is
+        engine = self.app.playback
+        engine.subscribe(self._on_playback_event)
+        if engine.path is not None:
+            self.is_playing = not engine.paused
+            self.play_btn.configure(text="⏸" if self.is_playing else "▶")
+            self._show_track(engine.path)
+            self._show_position(engine.position)
+        elif self.app.file_queue:
+            self._show_track(self.app.file_queue[0].path)
+        self._poll_events()
+
+    def on_hide(self):
+        self.app.playback.unsubscribe(self._on_playback_event)
+        self.cancel(self._poll_events)
+        self._events = queue.Queue()
+
+    def _load_waveform(self, path):
+        """Build or open the track's peak pyramid and spectrogram off the Tk thread."""
+        store = self.app.waveforms
+        self.waveform = None
+        self.spectrogram = None
+        self._tiles.clear()
+        self._tile_photos = {}
+        self._tile_pending.clear()
+        self._redraw()
+        if store is None:
+            return
+        result = {"path": path}
+        self._waveform_result = result
+
+        def build():
+            try:
+                result["pyramid"], result["spectrogram"] = store.analyse(path)
+            except Exception as e:
+                result["error"] = e
+            result["done"] = True
+
+        threading.Thread(target=build, daemon=True).start()
+        self._poll_waveform(result)
+
+    def _poll_waveform(self, result):
+        if result is not self._waveform_result:
+            return
+        if not result.get("done"):
+            self.schedule(100, self._poll_waveform, result)
+            return
+        self.waveform = result.get("pyramid")
+        self.spectrogram = result.get("spectrogram")
+        self._reset_zoom()
+
+    def _show_art(self, path):
+        """Show a track's cover once the art service has it ready."""
+        if self.app.cover_art is None or path == self._art_path:
+            return
+        self._art_path = path
+        self._poll_art(path, self.app.cover_art.request(path, ART_SIZE))
+
+    def _poll_art(self, path, future):
+        if path != self._art_path:
+            return
+        if not future.done():
+            self.schedule(30, self._poll_art, path, future)
+            return
+        try:
+            image = future.result()
+        except Exception:
+            image = None
+        self._art_photo = ImageTk.PhotoImage(image) if image else None
+        self.art_label.configure(image=self._art_photo or "")
+
+    def _reset_zoom(self):
+        self.view_start = 0.0
+        self.view_end = self.waveform.duration if self.waveform else 0.0
+        self._redraw()
+
+    def _set_view(self, start, span):
+        duration = self.waveform.duration
+        span = min(max(span, MIN_SPAN), duration)
+        start = min(max(start, 0.0), duration - span)
+        self.view_start, self.view_end = start, start + span
+        self._redraw()
+
+    def _on_wheel(self, event, up):
+        if not self.waveform or not self.view_end:
+            return
+        span = self.view_end - self.view_start
+        w = self.canvas.winfo_width() or 1
+        if event.state & 0x1:
+            # Shift+wheel scrolls by a tenth of the view
+            self._set_view(self.view_start + (-0.1 if up else 0.1) * span, span)
+            return
+        anchor = self.view_start + span * event.x / w
+        new_span = span / ZOOM_STEP if up else span * ZOOM_STEP
+        self._set_view(anchor - new_span * event.x / w, new_span)
+
+    def _on_drag_start(self, event):
+        self._drag_x = event.x
+
+    def _on_drag(self, event):
+        if not self.waveform or self._drag_x is None or not self.view_end:
+            return
+        span = self.view_end - self.view_start
+        dx = event.x - self._drag_x
+        self._drag_x = event.x
+        self._set_view(self.view_start - dx * span / (self.canvas.winfo_width() or 1), span)
+
+    def _redraw(self):
+        self.canvas.delete("wave", "spec")
+        w = self.canvas.winfo_width()
         h = self.canvas.winfo_height() or 150
+        if not self.waveform or w <= 1 or self.view_end <= self.view_start:
+            return
+        if self.show_spectrogram.get() and self.spectrogram:
+            self._draw_spectrogram(w, h)
+        else:
+            self._draw_waveform(w, h)
+        self._draw_playhead()
+
+    def _draw_waveform(self, w, h):
+        # Reads only the pyramid level and range on screen, whatever the track length
+        columns = self.waveform.columns(self.view_start, self.view_end, w)
         mid = h / 2
-        import random
-        for i in range(0, w, 4):
-            val = random.randint(10, 60)
-            self.canvas.create_line(i, mid-val, i, mid+val, fill="#3498db", width=2)
+        scale = mid * 0.95
+        x = np.arange(w)
+        # One polygon per envelope keeps a redraw to two canvas items
+        self.canvas.create_polygon(
+            self._envelope(x, mid - columns[:, 1] * scale, mid - columns[:, 0] * scale),
+            fill="#1f5f8b", outline="", tags="wave"
+        )
+        self.canvas.create_polygon(
+            self._envelope(x, mid - columns[:, 2] * scale, mid + columns[:, 2] * scale),
+            fill="#3498db", outline="", tags="wave"
+        )
+
+    @staticmethod
+    def _envelope(x, upper, lower):
+        """Outline running right along upper and back along lower."""
+        points = np.concatenate([np.column_stack([x, upper]), np.column_stack([x, lower])[::-1]])
+        return points.ravel().tolist()
+
+    def _draw_spectrogram(self, w, h):
+        spectrogram = self.spectrogram
+        seconds_per_pixel = (self.view_end - self.view_start) / w
+        level = spectrogram.level_for(seconds_per_pixel)
+        column_seconds = spectrogram.column_seconds(level)
+        tile_seconds = TILE_WIDTH * column_seconds
+        first = int(self.view_start // tile_seconds)
+        last = min(int(self.view_end // tile_seconds), spectrogram.tile_count(level) - 1)
+        photos = {}
+        for index in range(first, last + 1):
+            key = (level, index)
+            if key not in self._tiles:
+                # Only tiles never drawn before are rendered, in the background
+                self._request_tile(key)
+                continue
+            self._tiles.move_to_end(key)
+            image = self._tiles[key]
+            if image is None:
+                continue
+            start = index * tile_seconds
+            x0 = round((start - self.view_start) / seconds_per_pixel)
+            x1 = round((start + image.width * column_seconds - self.view_start) / seconds_per_pixel)
+            size = (max(1, x1 - x0), h)
+            photo = self._tile_photos.get(key + size)
+            if photo is None:
+                photo = ImageTk.PhotoImage(image.resize(size, Image.Resampling.BILINEAR))
+            photos[key + size] = photo
+            self.canvas.create_image(x0, 0, image=photo, anchor="nw", tags="spec")
+        # Tk drops images nothing references, so keep exactly the ones on screen
+        self._tile_photos = photos
+
+    def _request_tile(self, key):
+        if key in self._tile_pending:
+            return
+        self._tile_pending.add(key)
+        spectrogram = self.spectrogram
+        store = self.app.waveforms.spectrograms
+
+        def render():
+            try:
+                image = store.tile(spectrogram, *key)
+            except Exception:
+                image = None
+            self._tile_results.put((spectrogram, key, image))
+
+        self.app.ui_worker.submit(render)
+        if len(self._tile_pending) == 1:
+            self.schedule(30, self._poll_tiles)
+
+    def _poll_tiles(self):
+        arrived = False
+        while True:
+            try:
+                spectrogram, key, image = self._tile_results.get_nowait()
+            except queue.Empty:
+                break
+            if spectrogram is not self.spectrogram:
+                continue
+            self._tile_pending.discard(key)
+            self._tiles[key] = image
+            arrived = True
+        while len(self._tiles) > TILE_MEMORY:
+            self._tiles.popitem(last=False)
+        if arrived:
+            self._redraw()
+        if self._tile_pending:
+            self.schedule(30, self._poll_tiles)
+
+    def _show_track(self, path):
+        self.current_track.set(Path(path).name)
+        if not self._waveform_result or self._waveform_result["path"] != path:
+            self._load_waveform(path)
+        self._show_art(path)
+
+    def _duration(self):
+        if self.waveform is not None and self._waveform_result["path"] == self.app.playback.path:
+            return self.waveform.duration
+        path = self.app.playback.path
+        if path is None or path not in self.app.file_queue:
+            return None
+        return self.app.file_queue.duration(self.app.file_queue.index_of(path))
+
+    def _play(self, pos):
+        path = self.app.file_queue.path(pos)
+        try:
+            self.app.playback.play(path)
+        except Exception as e:
+            self.current_track.set(f"Playback unavailable: {e}")
+            return
+        self.is_playing = True
+        self.play_btn.configure(text="⏸")
 
     def _toggle_play(self):
         if not self.app.file_queue:
             return
-            
+        engine = self.app.playback
         if self.is_playing:
-            pygame.mixer.music.pause()
+            engine.pause()
             self.play_btn.configure(text="▶")
             self.is_playing = False
+        elif engine.path is None:
+            # Start the first track if nothing is loaded
+            self._play(0)
         else:
-            if not pygame.mixer.music.get_busy():
-                # Start first track if nothing playing
-                track_path = self.app.file_queue[0]["path"]
-                pygame.mixer.music.load(track_path)
-                pygame.mixer.music.play()
-                self.current_track.set(Path(track_path).name)
-            else:
-                pygame.mixer.music.unpause()
-            
+            engine.resume()
             self.play_btn.configure(text="⏸")
             self.is_playing = True
 
+    def _current_index(self):
+        path = self.app.playback.path
+        return self.app.file_queue.index_of(path) if path is not None and path in self.app.file_queue else None
+
     def _next_track(self):
-        pass # Implement logic to find next in queue
+        pos = self._current_index()
+        pos = 0 if pos is None else pos + 1
+        if pos < len(self.app.file_queue):
+            self._play(pos)
 
     def _prev_track(self):
-        pass
+        pos = self._current_index()
+        if pos is None:
+            return
+        if self.position > 3.0 or pos == 0:
+            # Like most players, go back to the start of the track first
+            self._seek_to(0.0)
+        else:
+            self._play(pos - 1)
 
     def _seek(self, val):
-        pass
+        duration = self._duration()
+        if not duration or self.app.playback.path is None:
+            return
+        # Dragging the slider fires continuously; only the resting point restarts the decoder
+        self._seeking = True
+        self.schedule(40, self._seek_to, float(val) / 100 * duration)
 
-    def _update_loop(self):
-        if self.is_playing:
-            # Update progress and time
-            pass
-        self.after(500, self._update_loop)
+    def _seek_to(self, seconds):
+        self._seeking = False
+        self.app.playback.seek(seconds)
+
+    def _on_playback_event(self, event, data):
+        # Called on the audio thread
+        self._events.put((event, data))
+
+    def _poll_events(self):
+        position = None
+        while True:
+            try:
+                event, data = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "position":
+                # Only the latest position matters
+                position = data
+            elif event == "track_changed":
+                # The app preloads the next queue entry; the view only shows the change
+                self._show_track(data)
+            elif event == "ended":
+                self.is_playing = False
+                self.play_btn.configure(text="▶")
+            elif event == "error":
+                self.current_track.set(data)
+        if position is not None:
+            self._show_position(position)
+        self.schedule(30, self._poll_events)
+
+    def _show_position(self, seconds):
+        self.position = seconds
+        duration = self._duration()
+        self.time_info.set(f"{format_eta(seconds)} / {format_eta(duration)}")
+        if duration and not self._seeking:
+            self.progress.set(min(seconds / duration * 100, 100.0))
+        self._draw_playhead()
+
+    def _draw_playhead(self):
+        self.canvas.delete("playhead")
+        w = self.canvas.winfo_width()
+        span = self.view_end - self.view_start
+        if not self.waveform or span <= 0 or self.app.playback.path != self._waveform_result["path"]:
+            return
+        x = (self.position - self.view_start) / span * w
+        if 0 <= x <= w:
+            self.canvas.create_line(x, 0, x, self.canvas.winfo_height(), fill="#f1c40f", tags="playhead")
@@ -2,23 +2,39 @@ import tkinter as tk
 from tkinter import ttk, filedialog
 import os
 
-class ProcessorView(ttk.Frame):
+from src.ui.view import View
+
+FORMATS = ("mp3", "wav", "flac", "ogg", "m4a")
+
+# Cover art limits offered, as (longest edge in pixels, kilobytes); None keeps the art as is
+ART_LIMITS = {
+    "Original": (None, None),
+    "1400 px / 500 KB": (1400, 500),
+    "1000 px / 300 KB": (1000, 300),
+    "600 px / 150 KB": (600, 150)
+}
+
+class ProcessorView(View):
     def __init__(self, parent, app, **kwargs):
-        super().__init__(parent, **kwargs)
-        self.app = app
+        super().__init__(parent, app, **kwargs)
         
         # Options state (could be moved to app.py)
         self.output_format = tk.StringVar(value="mp3")
+        # Extra formats encoded from the same decode as the main one
+        self.extra_formats = {fmt: tk.BooleanVar(value=False) for fmt in FORMATS}
         self.quality = tk.StringVar(value="high")
         self.sample_rate = tk.StringVar(value="44100")
         self.channels = tk.StringVar(value="2")
         self.normalize = tk.BooleanVar(value=False)
+        self.loudnorm_two_pass = tk.BooleanVar(value=True)
         self.trim_silence = tk.BooleanVar(value=False)
         self.noise_reduction = tk.BooleanVar(value=False)
         self.fade_in = tk.DoubleVar(value=0.0)
         self.fade_out = tk.DoubleVar(value=0.0)
         self.pitch = tk.DoubleVar(value=1.0)
         self.speed = tk.DoubleVar(value=1.0)
+        self.embed_art = tk.BooleanVar(value=True)
+        self.art_limit = tk.StringVar(value="1000 px / 300 KB")
         self.output_dir = tk.StringVar(value=os.path.expanduser("~/Music/MusicForge_Output"))
         
         self._build_ui()
@@ -46,10 +62,22 @@ class ProcessorView(ttk.Frame):
         fmt_frame.pack(fill="x", pady=10)
         
         ttk.Label(fmt_frame, text="Format:").grid(row=0, column=0, sticky="w", padx=5)
-        ttk.Combobox(fmt_frame, textvariable=self.output_format, values=["mp3", "wav", "flac", "ogg", "m4a"]).grid(row=0, column=1, sticky="ew", padx=5)
+        ttk.Combobox(fmt_frame, textvariable=self.output_format, values=list(FORMATS)).grid(row=0, column=1, sticky="ew", padx=5)
         
         ttk.Label(fmt_frame, text="Quality:").grid(row=0, column=2, sticky="w", padx=5)
         ttk.Combobox(fmt_frame, textvariable=self.quality, values=["low", "medium", "high", "lossless"]).grid(row=0, column=3, sticky="ew", padx=5)
+
+        ttk.Label(fmt_frame, text="Also Export:").grid(row=1, column=0, sticky="w", padx=5, pady=(10, 0))
+        extra_frame = ttk.Frame(fmt_frame)
+        extra_frame.grid(row=1, column=1, columnspan=3, sticky="w", pady=(10, 0))
+        for fmt, var in self.extra_formats.items():
+            ttk.Checkbutton(extra_frame, text=fmt, variable=var).pack(side="left", padx=5)
+        
+        ttk.Checkbutton(fmt_frame, text="Embed Cover Art", variable=self.embed_art).grid(row=2, column=0, sticky="w", padx=5, pady=(10, 0))
+        ttk.Label(fmt_frame, text="Max Art Size:").grid(row=2, column=2, sticky="w", padx=5, pady=(10, 0))
+        ttk.Combobox(fmt_frame, textvariable=self.art_limit, values=list(ART_LIMITS), state="readonly").grid(
+            row=2, column=3, sticky="ew", padx=5, pady=(10, 0)
+        )
         
         # --- Audio Parameters ---
         param_frame = ttk.LabelFrame(container, text="Audio Parameters", padding=15)
@@ -68,6 +96,7 @@ class ProcessorView(ttk.Frame):
         ttk.Checkbutton(adv_frame, text="Loudness Normalization", variable=self.normalize).grid(row=0, column=0, sticky="w", padx=5, pady=5)
         ttk.Checkbutton(adv_frame, text="Trim Silence", variable=self.trim_silence).grid(row=0, column=1, sticky="w", padx=5, pady=5)
         ttk.Checkbutton(adv_frame, text="Noise Reduction", variable=self.noise_reduction).grid(row=1, column=0, sticky="w", padx=5, pady=5)
+        ttk.Checkbutton(adv_frame, text="Two-Pass Loudness (accurate)", variable=self.loudnorm_two_pass).grid(row=1, column=1, sticky="w", padx=5, pady=5)
 
         # --- Effects (Fade, Pitch, Speed) ---
         fx_frame = ttk.LabelFrame(container, text="Effects", padding=15)
@@ -122,14 +151,29 @@ class ProcessorView(ttk.Frame):
             "sample_rate": int(self.sample_rate.get()),
             "channels": int(self.channels.get()),
             "normalize": self.normalize.get(),
+            "loudnorm_two_pass": self.loudnorm_two_pass.get(),
             "trim_silence": self.trim_silence.get(),
             "noise_reduction": self.noise_reduction.get(),
             "fade_in": self.fade_in.get(),
             "fade_out": self.fade_out.get(),
             "pitch": self.pitch.get(),
             "speed": self.speed.get(),
+            "embed_art": self.embed_art.get(),
             "output_dir": self.output_dir.get()
         }
+        if options["embed_art"]:
+            options["art_max_size"], options["art_max_kb"] = ART_LIMITS[self.art_limit.get()]
+        
+        main_format = self.output_format.get()
+        extra = [fmt for fmt, var in self.extra_formats.items() if var.get() and fmt != main_format]
+        if extra:
+            options["targets"] = [{"format": fmt, "quality": options["quality"]} for fmt in [main_format] + extra]
+        
+        # Options this FFmpeg cannot honour are refused before any file is touched
+        problems = self.app.processor.check_options(options)
+        if problems:
+            tk.messagebox.showerror("Unsupported Options", "\n".join(problems))
+            return
         
         # Call the app method to start the worker
         self.app.start_batch_processing(options)
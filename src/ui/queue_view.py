@@ -1,37 +1,107 @@
 import tkinter as tk
-from tkinter import ttk, filedialog
-from pathlib import Path
+from tkinter import ttk, filedialog, messagebox
+import queue
+from PIL import ImageTk
 from tkinterdnd2 import DND_FILES
 
-class QueueView(ttk.Frame):
+from src.core.progress import format_progress
+from src.core.queue_projection import QueueProjection, COLUMNS
+from src.ui.tag_editor import TagEditorDialog
+from src.ui.view import View
+from src.utils.scanner import scan_audio_files, expand_paths
+
+HEADINGS = {
+    "filename": "Filename",
+    "title": "Title",
+    "artist": "Artist",
+    "album": "Album",
+    "format": "Format",
+    "size": "Size",
+    "status": "Status"
+}
+
+# Status of the running batch is shown next to the projection's columns
+VIEW_COLUMNS = COLUMNS + ("status",)
+
+JOB_STATUS = {"queued": "Queued", "running": "Running", "ok": "Done", "failed": "Failed"}
+
+# Edge of the cover shown for the focused row
+ART_SIZE = 64
+
+class QueueView(View):
     def __init__(self, parent, app, **kwargs):
-        super().__init__(parent, **kwargs)
-        self.app = app
+        super().__init__(parent, app, **kwargs)
+        self._ingest_jobs = []
+        self._ingest_results = queue.Queue()
+        self.ingest_status = tk.StringVar(value="")
+        self._tag_jobs = []
+        self.tag_status = tk.StringVar(value="")
+        self.search_var = tk.StringVar(value="")
+        self.batch_status = tk.StringVar(value="")
+        self._job_status = {}
+        self._progress = None
+        self._progress_version = 0
+
+        # Virtualized list state: the Treeview only holds the visible rows
+        self.projection = QueueProjection(self.app.file_queue)
+        self._top = 0
+        self._visible_rows = 1
+        self._row_ids = []
+        self._selected = set()
+        self._filtering = False
+        # Strongest queue change seen while hidden: None, "added" or "changed"
+        self._hidden_change = None
+        self._art_path = None
+        self._art_photo = None
         self._build_ui()
+        self.app.file_queue.subscribe(self._on_queue_change)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+        self._poll_progress()
 
     def _build_ui(self):
         # Header
         header = ttk.Frame(self)
         header.pack(fill="x", pady=(0, 10))
         ttk.Label(header, text="File Queue", font=("Segoe UI", 18, "bold")).pack(side="left")
+        # Cover of the focused row
+        self.art_label = ttk.Label(header)
+        self.art_label.pack(side="left", padx=(15, 0))
         
         btn_frame = ttk.Frame(header)
         btn_frame.pack(side="right")
         
         ttk.Button(btn_frame, text="Add Files", command=self._add_files).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Add Folder", command=self._add_folder).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Edit Tags", command=self._edit_tags).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Remove", command=self._remove_selected).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Clear", command=self._clear_queue).pack(side="left", padx=5)
 
+        # Ingestion status (shown while files are being added)
+        self.ingest_frame = ttk.Frame(self)
+        ttk.Label(self.ingest_frame, textvariable=self.ingest_status).pack(side="left")
+        ttk.Button(self.ingest_frame, text="Cancel", command=self._cancel_ingest).pack(side="right")
+
+        # Tag writing status (shown while tags are being saved)
+        self.tag_frame = ttk.Frame(self)
+        ttk.Label(self.tag_frame, textvariable=self.tag_status).pack(side="left")
+        ttk.Button(self.tag_frame, text="Cancel", command=self._cancel_tags).pack(side="right")
+
+        # Search
+        search_frame = ttk.Frame(self)
+        search_frame.pack(fill="x", pady=(0, 10))
+        ttk.Label(search_frame, text="Search:").pack(side="left", padx=(0, 5))
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side="left", fill="x", expand=True)
+        self.count_label = ttk.Label(search_frame, text="")
+        self.count_label.pack(side="right", padx=(10, 0))
+        ttk.Label(search_frame, textvariable=self.batch_status).pack(side="right", padx=(10, 0))
+        self.search_var.trace_add("write", self._on_search)
+
         # Treeview
-        columns = ("filename", "title", "artist", "album", "format", "size")
-        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        self.tree = ttk.Treeview(self, columns=VIEW_COLUMNS, show="headings")
         
-        self.tree.heading("filename", text="Filename")
-        self.tree.heading("title", text="Title")
-        self.tree.heading("artist", text="Artist")
-        self.tree.heading("album", text="Album")
-        self.tree.heading("format", text="Format")
-        self.tree.heading("size", text="Size")
+        for col in COLUMNS:
+            self.tree.heading(col, text=HEADINGS[col], command=lambda c=col: self._on_sort(c))
+        self.tree.heading("status", text=HEADINGS["status"])
         
         self.tree.column("filename", width=200)
         self.tree.column("title", width=150)
@@ -39,13 +109,19 @@ class QueueView(ttk.Frame):
         self.tree.column("album", width=150)
         self.tree.column("format", width=80)
         self.tree.column("size", width=100)
+        self.tree.column("status", width=80)
         
         self.tree.pack(fill="both", expand=True)
         
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(self.tree, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
+        # Scrollbar (drives the window into the projection, not the Treeview)
+        self.scrollbar = ttk.Scrollbar(self.tree, orient="vertical", command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_rows(3))
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
         
         # Drag and Drop
         self.tree.drop_target_register(DND_FILES)
@@ -55,24 +131,179 @@ class QueueView(ttk.Frame):
         self._refresh_tree()
 
     def _refresh_tree(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for file_item in self.app.file_queue:
-            self._insert_row(file_item)
-
-    def _insert_row(self, file_item):
-        p = Path(file_item["path"])
-        size_mb = f"{p.stat().st_size / (1024*1024):.2f} MB" if p.exists() else "N/A"
-        tags = file_item["tags"]
-        
-        self.tree.insert("", "end", values=(
-            p.name,
-            tags.get("title", ""),
-            tags.get("artist", ""),
-            tags.get("album", ""),
-            p.suffix.upper()[1:],
-            size_mb
-        ))
+        self._selected.clear()
+        self.projection.sync()
+        self._render()
+
+    def on_show(self):
+        # Queue changes made elsewhere are applied once, on return
+        change, self._hidden_change = self._hidden_change, None
+        if change is not None:
+            self._on_queue_change("added" if change == "added" else "reset", None)
+
+    def _on_queue_change(self, event, items):
+        if not self.visible:
+            if self._hidden_change != "changed":
+                self._hidden_change = "added" if event == "added" else "changed"
+            return
+        if event == "added":
+            self.projection.sync()
+        elif event == "updated":
+            # Positions are unchanged, but sort and search keys may not be
+            self.projection.invalidate()
+        else:
+            # Positions shifted; rebuild the derived sort/filter data
+            self._selected.clear()
+            self.projection.invalidate()
+        self._render()
+        self._run_filter()
+
+    def _on_destroy(self, event):
+        self._cancel_ingest()
+        self._cancel_tags()
+        self.app.file_queue.unsubscribe(self._on_queue_change)
+
+    def _render(self):
+        """Show the rows of the projection that fall inside the visible window."""
+        total = len(self.projection)
+        self._top = max(0, min(self._top, total - self._visible_rows))
+        count = min(self._visible_rows, total - self._top)
+
+        # Reuse a fixed pool of Treeview rows instead of inserting/deleting
+        while len(self._row_ids) < count:
+            self._row_ids.append(self.tree.insert("", "end"))
+        if len(self._row_ids) > count:
+            self.tree.delete(*self._row_ids[count:])
+            del self._row_ids[count:]
+
+        selection = []
+        for offset, iid in enumerate(self._row_ids):
+            index = self.projection.index_at(self._top + offset)
+            status = self._job_status.get(self.app.file_queue.path(index), "")
+            self.tree.item(iid, values=self.projection.row_values(index) + (status,))
+            if index in self._selected:
+                selection.append(iid)
+        self.tree.selection_set(selection)
+
+        if total:
+            self.scrollbar.set(self._top / total, (self._top + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        shown = f"{total} of {len(self.app.file_queue)}" if self.projection.filter_text else f"{total}"
+        self.count_label.configure(text=f"{shown} files")
+
+    def _poll_progress(self):
+        """Pull the per-file changes of the current batch; only visible rows are redrawn."""
+        progress = self.app.batch.progress
+        if progress is not None:
+            if progress is not self._progress:
+                self._progress, self._progress_version = progress, 0
+                self._job_status.clear()
+            self._progress_version, changed = progress.changed_since(self._progress_version)
+            for path, status, percent in changed:
+                if status == "running" and percent is not None:
+                    self._job_status[path] = f"{percent:.0f}%"
+                else:
+                    self._job_status[path] = JOB_STATUS[status]
+            if changed:
+                self._render()
+            if changed or not progress.finished:
+                self.batch_status.set(format_progress(progress.summary()))
+        self.schedule(250, self._poll_progress)
+
+    def _on_resize(self, event):
+        style = ttk.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        heading_height = row_height + 6
+        rows = max(1, (event.height - heading_height) // row_height)
+        if rows != self._visible_rows:
+            self._visible_rows = rows
+            self._render()
+
+    def _on_scroll(self, *args):
+        total = len(self.projection)
+        if args[0] == "moveto":
+            self._top = int(float(args[1]) * total)
+            self._render()
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self._scroll_rows(amount * self._visible_rows if args[2] == "pages" else amount)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self._scroll_rows(step * 3)
+        return "break"
+
+    def _scroll_rows(self, amount):
+        self._top += amount
+        self._render()
+        return "break"
+
+    def _on_select(self, event):
+        # Mirror the visible selection into the model-level selection
+        selected = set(self.tree.selection())
+        for offset, iid in enumerate(self._row_ids):
+            index = self.projection.index_at(self._top + offset)
+            if iid in selected:
+                self._selected.add(index)
+            else:
+                self._selected.discard(index)
+            if iid == self.tree.focus():
+                self._show_art(self.app.file_queue.path(index))
+
+    def _show_art(self, path):
+        """Show a file's cover once the art service has it ready."""
+        if self.app.cover_art is None or path == self._art_path:
+            return
+        self._art_path = path
+        self._poll_art(path, self.app.cover_art.request(path, ART_SIZE))
+
+    def _poll_art(self, path, future):
+        if path != self._art_path:
+            return
+        if not future.done():
+            self.schedule(30, self._poll_art, path, future)
+            return
+        try:
+            image = future.result()
+        except Exception:
+            image = None
+        self._art_photo = ImageTk.PhotoImage(image) if image else None
+        self.art_label.configure(image=self._art_photo or "")
+
+    def _on_sort(self, column):
+        descending = self.projection.sort_column == column and not self.projection.descending
+        for col in COLUMNS:
+            arrow = ("  ▼" if descending else "  ▲") if col == column else ""
+            self.tree.heading(col, text=HEADINGS[col] + arrow)
+        self.projection.set_sort(column, descending)
+        self._render()
+        self._run_filter()
+
+    def _on_search(self, *args):
+        # Debounce typing, then filter in time-boxed steps
+        self.schedule(80, self._apply_search)
+
+    def _apply_search(self):
+        self.projection.set_filter(self.search_var.get())
+        self._top = 0
+        self._render()
+        self._run_filter()
+
+    def _run_filter(self):
+        if self._filtering or not self.projection.scanning:
+            return
+        self._filtering = True
+        self._filter_step()
+
+    def _filter_step(self):
+        done = self.projection.step(budget=0.008)
+        self._render()
+        if done:
+            self._filtering = False
+        else:
+            self.schedule(1, self._filter_step)
 
     def _add_files(self):
         files = filedialog.askopenfilenames(
@@ -85,23 +316,96 @@ class QueueView(ttk.Frame):
     def _add_folder(self):
         folder = filedialog.askdirectory(title="Select Folder")
         if folder:
-            audio_ext = {'.mp3','.wav','.flac','.ogg','.m4a','.aac','.wma'}
-            files = [str(p) for p in Path(folder).rglob('*') if p.suffix.lower() in audio_ext]
-            self._process_new_paths(files)
+            # Streamed: ingestion starts on the first batch while the walk continues
+            self._process_new_paths(scan_audio_files(folder))
 
     def _on_drop(self, event):
         paths = self.app.root.splitlist(event.data.replace("{", "").replace("}", ""))
-        self._process_new_paths(paths)
+        self._process_new_paths(expand_paths(paths))
 
     def _process_new_paths(self, paths):
-        existing_paths = {item["path"] for item in self.app.file_queue}
-        for path in paths:
-            if path not in existing_paths:
-                tags = self.app.metadata.read_tags(path)
-                file_item = {"path": path, "tags": tags}
-                self.app.file_queue.append(file_item)
-                self._insert_row(file_item)
+        """Hand paths to the ingestion pipeline; rows stream in as tags are parsed."""
+        job = self.app.ingest.start(
+            paths,
+            on_batch=self._ingest_results.put,
+            on_done=lambda job: self._ingest_results.put(None),
+            skip=self.app.file_queue
+        )
+        self._ingest_jobs.append(job)
+        if len(self._ingest_jobs) == 1:
+            self.ingest_frame.pack(fill="x", pady=(0, 10), before=self.tree)
+            self._poll_ingest()
+
+    def _poll_ingest(self):
+        # Drain results on the Tk thread; the pipeline runs in the background,
+        # and so does this while the view is hidden, so the queue stays complete
+        try:
+            while True:
+                batch = self._ingest_results.get_nowait()
+                if batch is not None:
+                    # Duplicates are dropped by the model; the view updates
+                    # through its change notification
+                    self.app.file_queue.extend(batch)
+        except queue.Empty:
+            pass
+
+        self._ingest_jobs = [job for job in self._ingest_jobs if not job.finished.is_set()]
+        if self._ingest_jobs:
+            added = sum(job.added for job in self._ingest_jobs)
+            self.ingest_status.set(f"Adding files… {added} added ({len(self.app.file_queue)} in queue)")
+            self.schedule(100, self._poll_ingest, background=True)
+        elif not self._ingest_results.empty():
+            self.schedule(0, self._poll_ingest, background=True)
+        else:
+            self.ingest_frame.pack_forget()
+
+    def _cancel_ingest(self):
+        for job in self._ingest_jobs:
+            job.cancel()
+
+    def _edit_tags(self):
+        if not self._selected:
+            messagebox.showinfo("No Selection", "Please select one or more files to edit.", parent=self.app.root)
+            return
+        items = [self.app.file_queue[index] for index in sorted(self._selected)]
+        TagEditorDialog(self.app.root, items, lambda tags: self._write_tags([item.path for item in items], tags))
+
+    def _write_tags(self, paths, tags):
+        """Save tags to the files in the background; the queue is updated as they finish."""
+        job = self.app.tagger.start((path, tags) for path in paths)
+        self._tag_jobs.append((job, tags))
+        if len(self._tag_jobs) == 1:
+            self.tag_frame.pack(fill="x", pady=(0, 10), before=self.tree)
+            self._poll_tags()
+
+    def _poll_tags(self):
+        running = []
+        for job, tags in self._tag_jobs:
+            if not job.finished.is_set():
+                running.append((job, tags))
+                continue
+            self.app.file_queue.update_tags((path, tags) for path in job.written)
+            if job.errors:
+                details = "\n".join(f"{path}: {error}" for path, error in job.errors[:10])
+                more = f"\n… and {len(job.errors) - 10} more" if len(job.errors) > 10 else ""
+                messagebox.showwarning("Tags Not Saved", f"{len(job.errors)} file(s) could not be tagged:\n{details}{more}")
+        self._tag_jobs = running
+        if running:
+            done = sum(job.done for job, _ in running)
+            total = sum(job.total for job, _ in running)
+            self.tag_status.set(f"Saving tags… {done}/{total}")
+            self.schedule(100, self._poll_tags, background=True)
+        else:
+            self.tag_frame.pack_forget()
+
+    def _cancel_tags(self):
+        for job, _ in self._tag_jobs:
+            job.cancel()
+
+    def _remove_selected(self):
+        paths = [self.app.file_queue.path(index) for index in self._selected]
+        self.app.file_queue.remove(paths)
 
     def _clear_queue(self):
+        self._cancel_ingest()
         self.app.file_queue.clear()
-        self._refresh_tree()
@@ -2,10 +2,12 @@ import tkinter as tk
 from tkinter import ttk
 import ttkbootstrap as tb
 
-class SettingsView(ttk.Frame):
+from src.core.telemetry import telemetry
+from src.ui.view import View
+
+class SettingsView(View):
     def __init__(self, parent, app, **kwargs):
-        super().__init__(parent, **kwargs)
-        self.app = app
+        super().__init__(parent, app, **kwargs)
         self._build_ui()
 
     def _build_ui(self):
@@ -26,9 +28,26 @@ class SettingsView(ttk.Frame):
         sys_frame = ttk.LabelFrame(self, text="System", padding=15)
         sys_frame.pack(fill="x", pady=10)
         
-        self.max_workers = tk.IntVar(value=4)
+        concurrency = self.app.concurrency
+        self.max_workers = tk.IntVar(value=concurrency.cap)
+        self.adaptive = tk.BooleanVar(value=concurrency.adaptive)
+        self.worker_status = tk.StringVar()
         ttk.Label(sys_frame, text="Max Parallel Workers:").grid(row=0, column=0, sticky="w", padx=5)
-        ttk.Spinbox(sys_frame, from_=1, to=16, textvariable=self.max_workers, width=5).grid(row=0, column=1, sticky="w", padx=5)
+        ttk.Spinbox(sys_frame, from_=1, to=max(16, concurrency.sampler.cpu_count * 2), textvariable=self.max_workers, width=5).grid(row=0, column=1, sticky="w", padx=5)
+        ttk.Checkbutton(sys_frame, text="Adapt to System Load", variable=self.adaptive).grid(row=0, column=2, sticky="w", padx=15)
+        ttk.Label(sys_frame, textvariable=self.worker_status).grid(row=1, column=0, columnspan=3, sticky="w", padx=5, pady=(5, 0))
+        self.max_workers.trace_add("write", self._on_workers_change)
+        self.adaptive.trace_add("write", self._on_workers_change)
+        self._poll_workers()
+
+        # Telemetry
+        tele_frame = ttk.LabelFrame(self, text="Pipeline Telemetry", padding=15)
+        tele_frame.pack(fill="x", pady=10)
+
+        self.collect_stages = tk.BooleanVar(value=False)
+        self.stage_report = tk.StringVar(value="Off")
+        ttk.Checkbutton(tele_frame, text="Collect Stage Timings", variable=self.collect_stages, command=self._on_collect_change).pack(anchor="w")
+        ttk.Label(tele_frame, textvariable=self.stage_report, font=("Consolas", 9), justify="left").pack(anchor="w", pady=(5, 0))
         
         # About
         about_frame = ttk.LabelFrame(self, text="About", padding=15)
@@ -38,6 +57,56 @@ class SettingsView(ttk.Frame):
         ttk.Label(about_frame, text="Version 1.2.0 (Manus Upgrade Edition)").pack(anchor="w")
         ttk.Label(about_frame, text="© 2026 iD01t Productions & Manus AI").pack(anchor="w")
 
+    def _on_workers_change(self, *args):
+        try:
+            cap = self.max_workers.get()
+        except tk.TclError:
+            # Spinbox is being edited
+            return
+        if cap >= 1:
+            self.app.concurrency.configure(cap, self.adaptive.get())
+            self._poll_workers()
+
+    def on_show(self):
+        self._poll_workers()
+        self._poll_stages()
+
+    def _poll_workers(self):
+        scheduler = self.app.process_scheduler
+        self.worker_status.set(f"Running up to {scheduler.max_workers} jobs at once ({scheduler.pending} pending)")
+        self.schedule(2000, self._poll_workers)
+
+    def _on_collect_change(self):
+        summary = self.app.stage_summary
+        if self.collect_stages.get():
+            summary.reset()
+            telemetry.subscribe(summary)
+            self._poll_stages()
+        else:
+            telemetry.unsubscribe(summary)
+            self.cancel(self._poll_stages)
+            self.stage_report.set("Off")
+
+    def _poll_stages(self):
+        if not self.collect_stages.get():
+            return
+        snapshot = self.app.stage_summary.snapshot()
+        stats = self.app.process_scheduler.stats()
+        lines = [
+            f"Pool: {stats['running']} running, {stats['queued']} queued, {stats['utilization']:.0%} of {stats['capacity']:g} slots in use",
+            f"{'Stage':<12}{'Runs':>6}{'Avg wall':>10}{'Avg CPU':>10}{'Avg wait':>10}{'Read MB':>10}{'Peak MB':>9}"
+        ]
+        for name, totals in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["wall"]):
+            runs = totals["runs"]
+            lines.append(
+                f"{name:<12}{runs:>6}{totals['wall'] / runs:>9.2f}s{totals['cpu'] / runs:>9.2f}s"
+                f"{totals['queue_wait'] / runs:>9.2f}s{totals['read_bytes'] / 1024 ** 2:>10.1f}{totals['max_rss'] / 1024 ** 2:>9.1f}"
+            )
+        if snapshot["jobs"]:
+            lines.append("Jobs: " + ", ".join(f"{count} {status}" for status, count in sorted(snapshot["jobs"].items())))
+        self.stage_report.set("\n".join(lines))
+        self.schedule(1000, self._poll_stages)
+
     def _on_theme_change(self, event):
         theme = self.theme_var.get()
         self.app.style.theme_use(theme)
@@ -35,16 +35,13 @@ class Sidebar(ttk.Frame):
         btn = ttk.Button(
             parent, 
             text=text, 
-            command=lambda: self._select_view(view_id),
+            command=lambda: self.select(view_id),
             style="Sidebar.TButton"
         )
         btn.pack(fill="x", pady=2, padx=5)
         self.buttons[view_id] = btn
-        
-        if not self.current_selection:
-            self._select_view(view_id)
 
-    def _select_view(self, view_id):
+    def select(self, view_id):
         if self.current_selection == view_id:
             return
             
@@ -0,0 +1,62 @@
+import tkinter as tk
+from tkinter import ttk
+
+from src.core.metadata import TAG_KEYS
+
+LABELS = {
+    "title": "Title:",
+    "artist": "Artist:",
+    "album": "Album:",
+    "year": "Year:",
+    "genre": "Genre:",
+    "tracknumber": "Track:"
+}
+
+MULTIPLE = "[Multiple Values]"
+
+class TagEditorDialog(tk.Toplevel):
+    """Edits the tags shared by a selection of queue items.
+
+    Only checked fields are applied; ``callback(tags)`` receives them.
+    """
+    def __init__(self, parent, items, callback):
+        super().__init__(parent)
+        self.transient(parent)
+        self.grab_set()
+        self.title(f"Edit Tags for {len(items)} Item(s)")
+        self.resizable(False, False)
+        self.callback = callback
+
+        frame = ttk.Frame(self, padding=15)
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(2, weight=1)
+
+        self.apply = {}
+        self.values = {}
+        for row, key in enumerate(TAG_KEYS):
+            first = items[0].tags.get(key, "")
+            common = first if all(item.tags.get(key, "") == first for item in items) else MULTIPLE
+            self.apply[key] = tk.BooleanVar()
+            self.values[key] = tk.StringVar(value=common)
+            ttk.Checkbutton(frame, variable=self.apply[key]).grid(row=row, column=0, sticky="w", padx=(0, 5))
+            ttk.Label(frame, text=LABELS[key]).grid(row=row, column=1, sticky="w", pady=5)
+            entry = ttk.Entry(frame, textvariable=self.values[key], width=40)
+            entry.grid(row=row, column=2, sticky="ew", pady=5)
+            # Typing into a field marks it for saving
+            entry.bind("<Key>", lambda event, key=key: self.apply[key].set(True))
+
+        ttk.Label(frame, text="Check boxes to apply changes.", font=("Segoe UI", 8)).grid(
+            row=len(TAG_KEYS), column=1, columnspan=2, sticky="w", pady=(10, 0)
+        )
+
+        btn_frame = ttk.Frame(self, padding=(0, 0, 15, 15))
+        btn_frame.pack(fill="x")
+        ttk.Button(btn_frame, text="Save", command=self.save, style="Accent.TButton").pack(side="right")
+        ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side="right", padx=10)
+
+    def save(self):
+        tags = {key: self.values[key].get() for key in TAG_KEYS if self.apply[key].get()}
+        tags = {key: value for key, value in tags.items() if value != MULTIPLE}
+        self.destroy()
+        if tags:
+            self.callback(tags)
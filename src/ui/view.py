@@ -0,0 +1,65 @@
+from tkinter import ttk
+
+class View(ttk.Frame):
+    """Base of the pages shown in the content area.
+
+    The app builds each view the first time it is selected and keeps it,
+    only packing and unpacking it on later switches; ``on_show`` and
+    ``on_hide`` are called on each switch. Timers started with
+    ``schedule`` are suspended while the view is hidden and resumed when
+    it is shown again, unless started with ``background=True``, and all
+    of them are cancelled when the view is destroyed.
+    """
+    def __init__(self, parent, app, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.app = app
+        self.visible = False
+        # callback -> [after id or None while suspended, delay, args, background]
+        self._timers = {}
+        self.bind("<Destroy>", self._on_view_destroy, add="+")
+
+    def schedule(self, delay, callback, *args, background=False):
+        """Call callback(*args) after delay ms, replacing a pending call of the same callback."""
+        self.cancel(callback)
+        timer = [None, delay, args, background]
+        self._timers[callback] = timer
+        if self.visible or background:
+            timer[0] = self.after(delay, self._fire, callback)
+
+    def cancel(self, callback):
+        timer = self._timers.pop(callback, None)
+        if timer is not None and timer[0] is not None:
+            self.after_cancel(timer[0])
+
+    def _fire(self, callback):
+        timer = self._timers.pop(callback)
+        callback(*timer[2])
+
+    def show(self):
+        self.visible = True
+        for callback, timer in self._timers.items():
+            if timer[0] is None:
+                timer[0] = self.after(timer[1], self._fire, callback)
+        self.on_show()
+
+    def hide(self):
+        self.visible = False
+        for timer in self._timers.values():
+            if timer[0] is not None and not timer[3]:
+                self.after_cancel(timer[0])
+                timer[0] = None
+        self.on_hide()
+
+    def on_show(self):
+        pass
+
+    def on_hide(self):
+        pass
+
+    def _on_view_destroy(self, event):
+        if event.widget is not self:
+            return
+        for timer in self._timers.values():
+            if timer[0] is not None:
+                self.after_cancel(timer[0])
+        self._timers.clear()
@@ -1,33 +1,107 @@
+import hashlib
 import os
 import sys
 import subprocess
 import shutil
 from pathlib import Path
 
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aac', '.wma'}
+
 def get_base_dir() -> Path:
     """Get the base directory of the application."""
     return Path(getattr(sys, "_MEIPASS", Path(__file__).parent.parent.parent)).resolve()
 
-def find_ffmpeg() -> str:
-    """Discover the FFmpeg binary path."""
+def get_cache_dir() -> Path:
+    """Get the per-user cache directory, creating it if needed."""
+    env = os.environ.get("MUSICFORGE_CACHE_DIR")
+    if env:
+        base = Path(env)
+    elif sys.platform.startswith("win"):
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / "MusicForge" / "Cache"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches" / "MusicForge"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "musicforge"
+    base.mkdir(parents=True, exist_ok=True)
+    return base
+
+def file_digest(path, chunk_size=1024 * 1024) -> str:
+    """Return the SHA-1 hex digest of a file's content."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def evict_lru(paths, max_bytes):
+    """Delete the least recently used files down to 90% of max_bytes.
+
+    A file's mtime is its last use; readers touch the files they open.
+    """
+    files = []
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return
+    target = int(max_bytes * 0.9)
+    for _, size, path in sorted(files):
+        if total <= target:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except OSError:
+            pass
+
+# Located tools by (name, env override, sibling dirs), so candidates are walked once
+_found_tools = {}
+
+def _find_tool(name, env_var, siblings=()):
+    """Locate an executable: the env override, bundled copies, then PATH."""
+    key = (name, os.environ.get(env_var), tuple(str(directory) for directory in siblings))
+    found = _found_tools.get(key)
+    if found is None:
+        found = _locate_tool(name, env_var, siblings)
+        # The bare name means not found: look again next time, it may be installed by then
+        if found != name:
+            _found_tools[key] = found
+    return found
+
+def _locate_tool(name, env_var, siblings):
     base_dir = get_base_dir()
     assets_dir = base_dir / "assets_music_forge"
-    env = os.environ.get("FFMPEG_PATH")
+    env = os.environ.get(env_var)
     
     if env and Path(env).is_file():
         return str(Path(env).resolve())
         
-    exe_names = ["ffmpeg.exe", "ffmpeg"]
+    exe_names = [f"{name}.exe", name]
     candidates = []
-    for name in exe_names:
-        candidates += [base_dir / name, base_dir / "bin" / name, assets_dir / name]
+    for exe in exe_names:
+        candidates += [base_dir / exe, base_dir / "bin" / exe, assets_dir / exe]
+        candidates += [Path(directory) / exe for directory in siblings]
         
     for c in candidates:
         if c.is_file():
             return str(c.resolve())
             
-    which = shutil.which("ffmpeg")
-    return which if which else "ffmpeg"
+    which = shutil.which(name)
+    return which if which else name
+
+def find_ffmpeg() -> str:
+    """Discover the FFmpeg binary path."""
+    return _find_tool("ffmpeg", "FFMPEG_PATH")
+
+def find_ffprobe() -> str:
+    """Discover the ffprobe binary path, preferring the one next to FFmpeg."""
+    ffmpeg = Path(find_ffmpeg())
+    siblings = [ffmpeg.parent] if ffmpeg.is_file() else []
+    return _find_tool("ffprobe", "FFPROBE_PATH", siblings)
 
 def enable_windows_dpi_awareness():
     """Enable HiDPI awareness on Windows."""
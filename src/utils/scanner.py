@@ -0,0 +1,94 @@
+import fnmatch
+import os
+
+from src.utils.helpers import AUDIO_EXTENSIONS
+
+def scan_audio_files(root, extensions=AUDIO_EXTENSIONS, exclude=(), max_depth=None,
+                     follow_symlinks=True, batch_size=500):
+    """Walk a directory tree with os.scandir, yielding lists of matching file paths.
+
+    Extensions are matched case-insensitively. ``exclude`` holds fnmatch
+    patterns tested against entry names and root-relative paths; matching
+    directories are not descended into. ``max_depth=0`` only scans ``root``
+    itself. Symlinked directories are followed unless they lead back to a
+    directory already visited. Batches start small and grow up to
+    ``batch_size`` so consumers can start on the first files immediately.
+    """
+    extensions = {ext.lower() for ext in extensions}
+    patterns = [p.lower() for p in exclude]
+    root = os.fspath(root)
+
+    def excluded(name, rel_path):
+        name, rel_path = name.lower(), rel_path.lower()
+        return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel_path, p) for p in patterns)
+
+    try:
+        root_stat = os.stat(root)
+    except OSError:
+        return
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    stack = [(root, "", 0)]
+    batch = []
+    limit = min(32, batch_size)
+
+    while stack:
+        dir_path, rel_dir, depth = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            # Unreadable directory (permissions, vanished, stale mount)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if patterns and excluded(entry.name, rel_path):
+                continue
+            try:
+                # DirEntry caches the type from the directory listing, so
+                # this does not cost a stat() for regular entries
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if max_depth is None or depth < max_depth:
+                        subdirs.append((entry, rel_path))
+                    continue
+                if not entry.is_file(follow_symlinks=follow_symlinks):
+                    continue
+            except OSError:
+                continue
+            if os.path.splitext(entry.name)[1].lower() in extensions:
+                batch.append(entry.path)
+                if len(batch) >= limit:
+                    yield batch
+                    batch = []
+                    limit = min(limit * 2, batch_size)
+
+        # Push in reverse so directories are walked in listing order
+        for entry, rel_path in reversed(subdirs):
+            try:
+                st = entry.stat(follow_symlinks=True)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in visited:
+                # Symlink loop or a second link to an already scanned tree
+                continue
+            visited.add(key)
+            stack.append((entry.path, rel_path, depth + 1))
+
+    if batch:
+        yield batch
+
+def expand_paths(paths, **scan_options):
+    """Yield batches for a mix of files and directories; directories are scanned."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if files:
+                yield files
+                files = []
+            yield from scan_audio_files(path, **scan_options)
+        else:
+            files.append(os.fspath(path))
+    if files:
+        yield files
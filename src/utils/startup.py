@@ -0,0 +1,94 @@
+"""Startup timing: phases of bringing the window up, and the imports behind them.
+
+Run ``python -m src.utils.startup`` for a report of the imports done
+before the window is shown (``src.app`` and the view it opens on), or
+``python main.py --startup-report`` to also time the phases of a real
+start. Kept free of heavy imports itself so it can be loaded first.
+"""
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Loaded on first use, never while the window is being brought up (Pillow is
+# not among them: ttkbootstrap imports it for its own images)
+DEFERRED_MODULES = ("numpy", "mutagen", "pygame")
+# Seconds the startup imports may take; the window has to be up well under a second
+IMPORT_BUDGET = 0.5
+
+# Everything imported before the window is shown: the app and its first view
+# (__import__, unlike importlib.import_module, is logged by -X importtime)
+STARTUP_IMPORTS = "import src.app as app; __import__(app.VIEWS[app.FIRST_VIEW][0])"
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def import_times(code=STARTUP_IMPORTS, python=None):
+    """Run import statements in a fresh interpreter under ``-X importtime``.
+
+    Returns a dict with the total seconds and the imports as
+    (name, self seconds, cumulative seconds, depth) tuples, in the order
+    they completed. Raises RuntimeError when an import fails.
+    """
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=Path(__file__).resolve().parents[2]
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"running {code!r} failed")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((name, int(own) / 1e6, int(cumulative) / 1e6, len(indent) // 2))
+    # Top-level imports of the code include everything they pulled in; the
+    # others (site, encodings) are the interpreter's own startup
+    total = sum(cumulative for name, _, cumulative, depth in imports if depth == 0 and name.split(".")[0] == "src")
+    return {"total": total, "imports": imports}
+
+def loaded_deferred(times):
+    """The DEFERRED_MODULES that an import_times result pulled in."""
+    names = {name.split(".")[0] for name, _, _, _ in times["imports"]}
+    return [module for module in DEFERRED_MODULES if module in names]
+
+class StartupTimer:
+    """Records how long each phase of startup took."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []
+        self._last = self.start
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.start
+
+def format_report(timer=None, times=None, top=12):
+    lines = []
+    if timer is not None:
+        lines.append(f"Startup: {timer.total * 1000:.0f} ms")
+        lines += [f"  {phase:<20} {seconds * 1000:7.1f} ms" for phase, seconds in timer.phases]
+    if times is not None:
+        lines.append(f"Imports: {times['total'] * 1000:.0f} ms (budget {IMPORT_BUDGET * 1000:.0f} ms)")
+        # Direct imports of the app and view modules, where deferring one pays off
+        slowest = sorted((entry for entry in times["imports"] if entry[3] == 1), key=lambda entry: -entry[2])
+        lines += [f"  {name:<40} {cumulative * 1000:7.1f} ms" for name, _, cumulative, _ in slowest[:top]]
+        deferred = loaded_deferred(times)
+        if deferred:
+            lines.append(f"  loaded eagerly: {', '.join(deferred)}")
+    return "\n".join(lines)
+
+def main():
+    times = import_times()
+    print(format_report(times=times))
+    # Non-zero when startup regressed, for use in CI
+    return 1 if times["total"] > IMPORT_BUDGET or loaded_deferred(times) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
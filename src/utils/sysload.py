@@ -0,0 +1,65 @@
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+class SystemLoad:
+    """Samples CPU load, free memory and I/O wait.
+
+    Uses psutil when it is installed, else /proc on Linux and
+    os.getloadavg() elsewhere. Every value of a sample may be None when the
+    platform does not expose it.
+    """
+    def __init__(self):
+        self.cpu_count = os.cpu_count() or 1
+        self._last_cpu = None
+
+    def sample(self):
+        """Return {"load", "free_memory", "iowait"}.
+
+        ``load`` is the 1-minute load average per CPU, ``free_memory`` the
+        available fraction of RAM and ``iowait`` the fraction of CPU time
+        spent waiting on I/O since the previous sample.
+        """
+        return {
+            "load": self._load(),
+            "free_memory": self._free_memory(),
+            "iowait": self._iowait()
+        }
+
+    def _load(self):
+        try:
+            load = psutil.getloadavg()[0] if psutil else os.getloadavg()[0]
+        except (AttributeError, OSError):
+            # os.getloadavg() does not exist on Windows
+            return None
+        return load / self.cpu_count
+
+    def _free_memory(self):
+        if psutil:
+            memory = psutil.virtual_memory()
+            return memory.available / memory.total
+        try:
+            with open("/proc/meminfo", "r", encoding="ascii") as f:
+                fields = dict(line.split(":", 1) for line in f)
+            return int(fields["MemAvailable"].split()[0]) / int(fields["MemTotal"].split()[0])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _iowait(self):
+        if psutil:
+            times = psutil.cpu_times()
+            cpu = (getattr(times, "iowait", None), sum(times))
+        else:
+            try:
+                with open("/proc/stat", "r", encoding="ascii") as f:
+                    fields = [int(v) for v in f.readline().split()[1:]]
+                cpu = (fields[4], sum(fields))
+            except (OSError, IndexError, ValueError):
+                return None
+        last, self._last_cpu = self._last_cpu, cpu
+        if cpu[0] is None or last is None or cpu[1] <= last[1]:
+            return None
+        return (cpu[0] - last[0]) / (cpu[1] - last[1])
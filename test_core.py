@@ -5,9 +5,32 @@ from pathlib import Path
 # Add src to path
 sys.path.append(str(Path(__file__).parent))
 
-from src.core.processor import AudioProcessor
+from src.core.processor import AudioProcessor, parse_loudnorm_stats
+from src.core.loudness import LoudnessAnalyzer, LoudnessCache
+from src.core.scheduler import ProcessScheduler
+from src.core.concurrency import AdaptiveConcurrency
+from src.core.probe import ProbeError, parse_probe_output
+from src.core.progress import BatchProgress, ProgressParser
+from src.core.transcode_cache import OutputManifest, TranscodeCache
 from src.core.metadata import MetadataManager
+from src.core.metadata_cache import MetadataCache
+from src.core.ingest import IngestPipeline
+from src.core.queue_model import QueueModel, QueueItem
+from src.core.queue_projection import QueueProjection
+from src.core.tagging import BulkTagger, write_tags
+from src.core.cover_art import CoverArtService
+from src.core.artwork import ArtworkPreparer, prepare_art
+from src.core.capabilities import CapabilityCache, parse_encoders, parse_filters
+from src.core.batch import BatchProcessor
+from src.core.telemetry import JsonlSink, PrometheusSink, StageSummary, telemetry
+from src.core.playback import OUTPUT_RATE, PlaybackEngine, QueueAdvancer, RingBuffer
+from src.core.waveform import BASE_BUCKET, PeakBuilder, WaveformStore
+from src.core.spectrogram import TILE_WIDTH, SpectrogramStore, StftBuilder, row_starts
 from src.utils.helpers import find_ffmpeg
+from src.utils.startup import import_times, loaded_deferred
+from src.utils.scanner import scan_audio_files
+from src.cli import collect_inputs, load_options
+from src.bench import bench_queue, compare, metric
 
 def test_discovery():
     print("Testing Discovery...")
@@ -37,14 +60,836 @@ def test_processor():
     }
     cmd = ap.build_command("input.wav", "output.mp3", options)
     print(f"Generated command: {' '.join(cmd)}")
+    # Several targets share one decode and filter chain
+    multi = ap.build_command("input.wav", [("out.flac", {"format": "flac"}), ("out.mp3", {"format": "mp3", "quality": "low"})], options)
+    graph = multi[multi.index("-filter_complex") + 1]
+    assert graph.count("loudnorm") == 1 and graph.endswith("asplit=2[out0][out1]")
+    assert multi.count("-map") == 2 and multi[-3:] == ["-b:a", "128k", "out.mp3"] and "out.flac" in multi
+    assert ap.command_weight(multi) == ap.command_weight(cmd) + 0.25
     return "loudnorm" in ' '.join(cmd) and "afade" in ' '.join(cmd)
 
+def test_loudness(tmp_path=None):
+    print("Testing Two-Pass Loudness...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    stderr = (
+        "[Parsed_loudnorm_0 @ 0x1] \n{\n\t\"input_i\" : \"-23.51\",\n\t\"input_tp\" : \"-4.02\",\n"
+        "\t\"input_lra\" : \"6.30\",\n\t\"input_thresh\" : \"-33.84\",\n\t\"output_i\" : \"-14.02\",\n"
+        "\t\"normalization_type\" : \"dynamic\",\n\t\"target_offset\" : \"0.02\"\n}\n"
+    )
+    measured = parse_loudnorm_stats(stderr)
+    assert measured["input_i"] == -23.51 and measured["target_offset"] == 0.02
+    assert parse_loudnorm_stats(stderr.replace("-23.51", "-inf")) is None
+
+    ap = AudioProcessor()
+    cmd = " ".join(ap.build_command("in.wav", "out.mp3", {"normalize": True, "loudness": measured}))
+    assert "measured_I=-23.51" in cmd and "linear=true" in cmd
+
+    class CountingProcessor(AudioProcessor):
+        calls = 0
+        def measure_loudness(self, input_file, options):
+            self.calls += 1
+            return measured
+
+    track = base / "track.wav"
+    track.write_bytes(b"pcm")
+    processor = CountingProcessor()
+    cache = LoudnessCache(base / "loudness.db")
+    analyzer = LoudnessAnalyzer(processor, cache=cache)
+    analyzer.measure(track, {"format": "mp3"})
+    # Another output format reuses the measurement; another filter chain does not
+    assert analyzer.measure(track, {"format": "flac", "quality": "low"}) == measured
+    assert processor.calls == 1
+    analyzer.measure(track, {"noise_reduction": True})
+    assert processor.calls == 2
+    cache.close()
+    return True
+
+def test_scheduler():
+    print("Testing Process Scheduler...")
+    import subprocess
+    scheduler = ProcessScheduler(max_workers=2)
+    lines = []
+    result = scheduler.run_command([sys.executable, "-c", "print('a'); print('b')"], on_stdout=lines.append)
+    assert result.returncode == 0 and lines == ["a\n", "b\n"]
+    try:
+        scheduler.run_command([sys.executable, "-c", "import time; time.sleep(10)"], timeout=0.2)
+        assert False, "expected a timeout"
+    except subprocess.TimeoutExpired:
+        pass
+    futures = [scheduler.submit(scheduler.run, [sys.executable, "-c", "import time; time.sleep(10)"]) for _ in range(4)]
+    scheduler.shutdown(wait=False)
+    assert all(f.cancelled() for f in futures)
+    return True
+
+def test_adaptive_concurrency():
+    print("Testing Adaptive Concurrency...")
+    import time
+    scheduler = ProcessScheduler(max_workers=8)
+    concurrency = AdaptiveConcurrency(scheduler, cap=4)
+    assert scheduler.max_workers == 4
+    busy = {"load": 1.5, "free_memory": 0.5, "iowait": 0.0}
+    idle = {"load": 0.2, "free_memory": 0.5, "iowait": 0.0}
+    assert concurrency.next_limit(4, busy) == 3
+    assert concurrency.next_limit(3, {"load": 0.2, "free_memory": 0.05, "iowait": 0.0}) == 2
+    assert concurrency.next_limit(3, {"load": 0.2, "free_memory": 0.5, "iowait": 0.5}) == 2
+    assert concurrency.next_limit(4, idle) == 4
+    assert concurrency.next_limit(1, busy) == 1
+    # A heavy job (weight 2) takes two of the limit's slots
+    scheduler.set_max_workers(2)
+    sleep = [sys.executable, "-c", "import time; time.sleep(0.3)"]
+    start = time.perf_counter()
+    futures = [scheduler.submit(scheduler.run, sleep, weight=2.0) for _ in range(2)]
+    [f.result() for f in futures]
+    assert time.perf_counter() - start >= 0.55
+    scheduler.shutdown()
+    return True
+
+def test_progress():
+    print("Testing Progress Parsing...")
+    parser = ProgressParser()
+    snapshots = [parser.feed(line) for line in (
+        "out_time_us=5000000\n", "total_size=1048576\n", "speed=2.5x\n", "progress=continue\n",
+        "out_time_us=N/A\n", "speed=N/A\n", "progress=end\n"
+    )]
+    first, last = snapshots[3], snapshots[6]
+    assert first == {"out_time": 5.0, "total_size": 1048576, "speed": 2.5, "end": False}
+    assert last["out_time"] is None and last["speed"] is None and last["end"]
+
+    progress = BatchProgress([("/m/a.mp3", 10.0), ("/m/b.mp3", None)])
+    progress.update_job("/m/a.mp3", first)
+    version, changed = progress.changed_since(0)
+    assert changed == [("/m/a.mp3", "running", 50.0)]
+    assert progress.changed_since(version)[1] == []
+    summary = progress.summary()
+    assert summary["percent"] == 25.0 and summary["running"] == 1 and summary["eta"] is not None
+    progress.finish_job("/m/a.mp3", True)
+    progress.finish_job("/m/b.mp3", False)
+    summary = progress.summary()
+    assert summary["succeeded"] == 1 and summary["failed"] == 1 and summary["eta"] == 0.0
+
+    # Only a bounded tail of the output is kept
+    scheduler = ProcessScheduler(max_workers=1)
+    result = scheduler.run_command([sys.executable, "-c", "for i in range(1000): print(i)"], tail=3)
+    assert result.stdout == "997\n998\n999\n"
+    scheduler.shutdown()
+    return True
+
+def test_transcode_cache(tmp_path=None):
+    print("Testing Transcode Cache...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    source = base / "song.wav"
+    source.write_bytes(b"pcm data")
+    cache = TranscodeCache(base / "cache", max_bytes=30)
+    options = {"format": "mp3", "quality": "high", "output_dir": str(base / "a")}
+    key = cache.key_for(source, options, "ffmpeg 7.0")
+    # Output location does not matter; format and FFmpeg build do
+    assert cache.key_for(source, dict(options, output_dir=str(base / "b")), "ffmpeg 7.0") == key
+    assert cache.key_for(source, dict(options, quality="low"), "ffmpeg 7.0") != key
+    assert cache.key_for(source, options, "ffmpeg 6.1") != key
+    assert cache.lookup(key) is None
+
+    encoded = base / "song.mp3"
+    encoded.write_bytes(b"x" * 20)
+    cache.store(key, encoded)
+    assert cache.lookup(key).read_bytes() == b"x" * 20
+    manifest = OutputManifest(base)
+    manifest.record(encoded, key, source)
+    manifest.save()
+    assert OutputManifest(base).is_current(encoded, key)
+    # Over the size budget the least recently used object goes
+    other = base / "other.mp3"
+    other.write_bytes(b"y" * 20)
+    cache.store("f" * 40, other)
+    assert cache.lookup(key) is None and cache.stats()["bytes"] <= 30
+
+    # A locked index is a miss, and a store that cannot be indexed is dropped
+    import sqlite3
+
+    class LockedConnection:
+        def execute(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+        def close(self):
+            pass
+
+    cache._conn, conn = LockedConnection(), cache._conn
+    assert cache.lookup("f" * 40) is None
+    cache.store("e" * 40, other)
+    assert not list((base / "cache" / "objects").rglob("e" * 40 + "*"))
+    cache._conn = conn
+    cache.close()
+
+    # Any other error fails only that file, which is still reported
+    fake = base / "ffmpeg"
+    fake.write_text(f"#!{sys.executable}\nimport sys\nif not sys.argv[-1].startswith('-'): open(sys.argv[-1], 'wb').write(b'out')\n")
+    fake.chmod(0o755)
+    processor = AudioProcessor()
+    processor.ffmpeg_bin = str(fake)
+
+    class BrokenCache:
+        def key_for(self, *args):
+            return "k" * 40
+
+        def lookup(self, key):
+            raise RuntimeError("index unavailable")
+
+    scheduler = ProcessScheduler(max_workers=1)
+    results = []
+    batch = BatchProcessor(processor, scheduler, transcode_cache=BrokenCache())
+    try:
+        futures = batch.submit([QueueItem(str(source))], dict(options, output_dir=str(base / "c")), on_result=results.append)
+        job = futures[0].result()
+    finally:
+        scheduler.shutdown()
+    assert job["status"] == "failed" and "index unavailable" in job["error"] and results == [job]
+    assert batch.progress.summary()["failed"] == 1
+    return True
+
+def test_probe(tmp_path=None):
+    print("Testing Pre-flight Probe...")
+    import asyncio
+    import tempfile
+    from src.core.scheduler import _WeightedLimiter
+    report = (
+        '{"streams": [{"codec_name": "flac", "sample_rate": "96000", "channels": 2,'
+        ' "bits_per_raw_sample": "24", "bits_per_sample": 0}], "format": {"duration": "245.5"}}'
+    )
+    info = parse_probe_output(report)
+    assert info == {"duration": 245.5, "codec": "flac", "sample_rate": 96000, "channels": 2, "bit_depth": 24, "bit_rate": None}
+    assert parse_probe_output('{"streams": [{"codec_name": "mp3", "bits_per_raw_sample": "N/A"}]}')["bit_depth"] is None
+    try:
+        parse_probe_output('{"streams": [], "format": {}}')
+        assert False, "expected a ProbeError"
+    except ProbeError:
+        pass
+
+    processor = AudioProcessor()
+    cmd = processor.build_command("in.wav", "out.mp3", {"fade_out": 5, "duration": 200.0, "speed": 2.0})
+    assert "afade=t=out:st=95.000:d=5" in cmd[cmd.index("-af") + 1]
+    assert "-af" not in processor.build_command("in.wav", "out.mp3", {"fade_out": 5})
+    # Matching codec, rate and channels with no filters: no re-encode needed
+    mp3 = {"codec": "mp3", "sample_rate": 44100, "channels": 2, "bit_depth": None, "bit_rate": 192000}
+    assert processor.can_stream_copy({"format": "mp3", "quality": "high"}, mp3)
+    assert not processor.can_stream_copy({"format": "mp3", "quality": "low"}, mp3)
+    assert not processor.can_stream_copy({"format": "mp3", "quality": "high", "normalize": True}, mp3)
+    assert not processor.can_stream_copy({"format": "flac"}, info)
+    assert processor.can_stream_copy({"format": "flac", "sample_rate": 96000}, info)
+
+    base = Path(tmp_path or tempfile.mkdtemp())
+    song = base / "song.flac"
+    song.write_bytes(b"flac")
+    cache = MetadataCache(base / "probe.db")
+    key = cache.stat_key(str(song))
+    cache.put_probe(str(song), key, info)
+    assert cache.get_probe(str(song)) == info
+    assert cache.get_probe(str(song), (key[0] + 1, key[1])) is None
+    cache.close()
+
+    async def admission_order():
+        limiter = _WeightedLimiter(1)
+        await limiter.acquire(1)
+        order = []
+
+        async def job(name, priority):
+            await limiter.acquire(1, priority)
+            order.append(name)
+            limiter.release(1)
+
+        tasks = [asyncio.ensure_future(job(name, -duration)) for name, duration in (("short", 30), ("long", 600), ("mid", 200))]
+        await asyncio.sleep(0)
+        limiter.release(1)
+        await asyncio.gather(*tasks)
+        return order
+
+    # Longest first
+    assert asyncio.run(admission_order()) == ["long", "mid", "short"]
+    return True
+
+def test_tagging(tmp_path=None):
+    print("Testing Bulk Tagging...")
+    import tempfile
+    from mutagen.easyid3 import EasyID3
+    base = Path(tmp_path or tempfile.mkdtemp())
+    song = base / "song.mp3"
+    song.write_bytes(b"\xff\xfb\x90\x00" + b"\0" * 4096)
+    # No tag header yet: written through a renamed copy, with padding
+    assert write_tags(str(song), {"title": "One", "year": "1999"}) == "rewrite"
+    # Later edits reuse the padding in place; empty values remove a tag
+    assert write_tags(str(song), {"title": "Two", "year": ""}) == "in_place"
+    assert dict(EasyID3(str(song))) == {"title": ["Two"]}
+    assert [p.name for p in base.iterdir()] == ["song.mp3"]
+
+    tagger = BulkTagger(chunk_size=8)
+    job = tagger.start([(song, {"album": "Bulk"}), (base / "missing.mp3", {"album": "Bulk"}), (base / "a.wav", {"album": "Bulk"})])
+    job.wait()
+    tagger.shutdown()
+    assert job.written == [str(song)] and len(job.errors) == 2 and job.in_place == 1
+
+    model = QueueModel()
+    model.extend([QueueItem(str(song), {"title": "One", "album": ""})])
+    model.update_tags((path, {"album": "Bulk"}) for path in job.written)
+    assert model[0].tags["album"] == "Bulk" and model[0].tags["title"] == "One"
+    return True
+
+def test_waveform(tmp_path=None):
+    print("Testing Waveform Peaks...")
+    import tempfile
+    import wave
+    import numpy as np
+    base = Path(tmp_path or tempfile.mkdtemp())
+    # 10 minutes of a stereo square wave whose amplitude rises over the track
+    rate, seconds = 8000, 600
+    t = np.arange(rate * seconds)
+    mono = np.where(t % 80 < 40, 1.0, -1.0) * (t / len(t))
+    song = base / "long.wav"
+    with wave.open(str(song), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((np.repeat(mono, 2) * 32767).astype("<i2").tobytes())
+
+    store = WaveformStore(base / "waveforms")
+    pyramid = store.load(str(song))
+    assert pyramid.sample_rate == rate and abs(pyramid.duration - seconds) < 1e-6
+    assert len(pyramid.levels[0]) == len(t) // BASE_BUCKET and len(pyramid.levels[-1]) <= 1024
+    # A whole-track view reads a coarse level; the envelope follows the ramp
+    assert pyramid.level_for(len(t) / 800) > 0
+    cols = pyramid.columns(0, seconds, 800)
+    assert cols.shape == (800, 3)
+    assert abs(cols[-1, 1] - 1.0) < 0.01 and abs(cols[-1, 0] + 1.0) < 0.01 and cols[0, 1] < 0.01
+    assert np.all(np.abs(cols[:, 2] - cols[:, 1]) < 0.02)
+    # Zoomed in past one bucket per column, columns repeat the finest buckets
+    zoom = pyramid.columns(300, 300.01, 400)
+    assert pyramid.level_for(80 / 400) == 0 and abs(zoom[:, 1].max() - 0.5) < 0.01
+    # Past the end of the track columns stay empty
+    assert not pyramid.columns(seconds - 1, seconds + 1, 10)[6:].any()
+
+    # Content-addressed: a renamed copy is served without decoding again
+    copy = base / "renamed.wav"
+    copy.write_bytes(song.read_bytes())
+    assert store.get(str(copy)) is not None
+
+    # Blocks that split buckets reduce to the same rows as one block
+    builder = PeakBuilder()
+    for chunk in np.array_split(mono.astype(np.float32), 7):
+        builder.feed(rate, chunk)
+    whole = PeakBuilder()
+    whole.feed(rate, mono.astype(np.float32))
+    assert np.allclose(builder.finish()[0], whole.finish()[0])
+    return True
+
+def test_spectrogram(tmp_path=None):
+    print("Testing Spectrogram Tiles...")
+    import tempfile
+    import wave
+    import numpy as np
+    base = Path(tmp_path or tempfile.mkdtemp())
+    rate, seconds = 16000, 120
+    t = np.arange(rate * seconds)
+    tone = 0.5 * np.sin(2 * np.pi * 1000 * t / rate)
+    song = base / "tone.wav"
+    with wave.open(str(song), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((tone * 32767).astype("<i2").tobytes())
+
+    # A pyramid built earlier without a spectrogram store is kept; only the spectrogram is added
+    WaveformStore(base / "waveforms").load(str(song))
+    spectrograms = SpectrogramStore(base / "spectrograms")
+    store = WaveformStore(base / "waveforms", spectrograms=spectrograms)
+    pyramid, spec = store.analyse(str(song))
+    assert pyramid is not None and store.analyse(str(song))[1].path == spec.path
+    assert len(spec.levels[0]) == -(-len(t) // spec.hop) and len(spec.levels[-1]) <= TILE_WIDTH
+    assert all(len(b) == -(-len(a) // 2) for a, b in zip(spec.levels, spec.levels[1:]))
+    # The loudest row holds 1 kHz, about -6 dB, at every level
+    starts = row_starts(rate)
+    for level in spec.levels:
+        row = int(np.asarray(level[len(level) // 2]).argmax())
+        assert starts[row] * rate / spec.fft_size <= 1000 < starts[row + 1] * rate / spec.fft_size
+    assert spec.level_for(spec.column_seconds(2) * 1.5) == 2
+
+    # Tiles are rendered once, then read back from disk
+    image = spectrograms.tile(spec, 0, 1)
+    assert image.size == (TILE_WIDTH, spec.rows) and spectrograms.tile_path(spec.digest, 0, 1).exists()
+    assert spectrograms.tile(spec, 0, 1).tobytes() == image.tobytes()
+    assert spectrograms.tile(spec, 0, spec.tile_count(0) - 1).width < TILE_WIDTH
+
+    # Blocks of any size give the same columns as one block
+    a = StftBuilder(base / "a.spec")
+    for chunk in np.array_split(tone[:rate * 5].astype(np.float32), 9):
+        a.feed(rate, chunk)
+    a.finish()
+    b = StftBuilder(base / "b.spec")
+    b.feed(rate, tone[:rate * 5].astype(np.float32))
+    b.finish()
+    assert (base / "a.spec").read_bytes() == (base / "b.spec").read_bytes()
+    return True
+
+def test_cover_art(tmp_path=None):
+    print("Testing Cover Art Service...")
+    import io
+    import tempfile
+    from mutagen.id3 import ID3, APIC
+    from PIL import Image
+    base = Path(tmp_path or tempfile.mkdtemp())
+    png = io.BytesIO()
+    Image.new("RGB", (1200, 800), (200, 30, 30)).save(png, "PNG")
+    # Ten 128 kbps MPEG frames, enough for mutagen to sync
+    frames = (b"\xff\xfb\x90\x00" + b"\0" * 413) * 10
+    tracks = []
+    for i in range(3):
+        track = base / f"{i}.mp3"
+        track.write_bytes(frames)
+        tags = ID3()
+        tags.add(APIC(encoding=3, mime="image/png", type=3, desc="Front", data=png.getvalue()))
+        tags.save(str(track))
+        tracks.append(str(track))
+    bare = base / "bare.mp3"
+    bare.write_bytes(frames)
+
+    metadata = MetadataManager(cache=MetadataCache(base / "meta.db"))
+    service = CoverArtService(base / "covers", metadata)
+    image = service.request(tracks[0], 64).result()
+    assert image.size == (64, 43) and image.getpixel((10, 10))[0] > 150
+    # The album's tracks share one stored thumbnail and one decoded image
+    assert service.thumbnail(tracks[1], 64) is image and service.thumbnail(str(bare)) is None
+    assert len(list((base / "covers").glob("*/*.jpg"))) == 1
+
+    # A later session reads the thumbnail from disk without parsing the audio again
+    extracted = []
+    metadata.get_cover_art = lambda path_str: extracted.append(path_str)
+    later = CoverArtService(base / "covers", metadata)
+    assert later.thumbnail(tracks[2]).size == (256, 171) and not extracted
+    service.shutdown()
+    later.shutdown()
+    metadata.cache.close()
+    return True
+
+def test_artwork(tmp_path=None):
+    print("Testing Artwork Embedding...")
+    import io
+    import tempfile
+    import numpy as np
+    from mutagen.id3 import ID3, APIC
+    from PIL import Image
+    base = Path(tmp_path or tempfile.mkdtemp())
+    # Noise does not compress: a multi-megabyte PNG
+    noise = np.random.default_rng(0).integers(0, 256, (1500, 1500, 3), dtype=np.uint8)
+    png = io.BytesIO()
+    Image.fromarray(noise).save(png, "PNG")
+    big = png.getvalue()
+    data, ext = prepare_art(big, max_size=1000, max_bytes=300 * 1024)
+    assert ext == ".jpg" and len(data) <= 300 * 1024 and len(big) > 5 * 1024 ** 2
+    assert max(Image.open(io.BytesIO(data)).size) <= 1000
+    small = io.BytesIO()
+    Image.new("RGB", (500, 500), (0, 90, 0)).save(small, "JPEG")
+    assert prepare_art(small.getvalue(), 1000, 300 * 1024) == (small.getvalue(), ".jpg")
+
+    # One extraction per distinct picture, shared by the album's tracks
+    frames = (b"\xff\xfb\x90\x00" + b"\0" * 413) * 10
+    tracks = []
+    for i in range(3):
+        track = base / f"{i}.mp3"
+        track.write_bytes(frames)
+        tags = ID3()
+        tags.add(APIC(encoding=3, mime="image/png", type=3, desc="", data=big))
+        tags.save(str(track))
+        tracks.append(str(track))
+    metadata = MetadataManager()
+    preparer = ArtworkPreparer(metadata, 1000, 300 * 1024)
+    arts = [preparer.prepare(track) for track in tracks]
+    assert arts[0] is arts[1] is arts[2] and not arts[0].original and arts[0].path.suffix == ".jpg"
+    assert preparer.stats()["images"] == 1 and preparer.stats()["bytes_out"] <= 300 * 1024
+    preparer.cleanup()
+    assert not arts[0].path.exists()
+
+    # The picture goes to every output that can hold one, at no extra weight
+    ap = AudioProcessor()
+    options = {"format": "mp3", "sample_rate": 44100, "channels": 2}
+    cmd = ap.build_command("in.flac", "out.mp3", options, art="cover.jpg")
+    assert cmd[cmd.index("-i", 6) + 1] == "cover.jpg" and "attached_pic" in cmd
+    assert cmd[cmd.index("-map") + 1] == "0:a" and ap.command_weight(cmd) == 1.0
+    multi = ap.build_command("in.flac", [("a.wav", {"format": "wav"}), ("a.flac", {"format": "flac"})], options, art="cover.jpg")
+    assert multi.count("1:v") == 1 and multi.index("1:v") > multi.index("a.wav")
+    assert "cover.jpg" not in ap.build_command("in.flac", "out.wav", dict(options, format="wav"), art="cover.jpg")
+    assert "attached_pic" in ap.remux_command("in.mp3", "out.mp3", options, art="cover.jpg")
+    return True
+
+def test_playback(tmp_path=None):
+    print("Testing Playback Engine...")
+    import tempfile
+    import time
+    import wave
+    import numpy as np
+    base = Path(tmp_path or tempfile.mkdtemp())
+    ring = RingBuffer(4)
+    assert ring.write(np.arange(6, dtype=np.int16).reshape(3, 2)) and len(ring) == 3
+    out = np.zeros((2, 2), dtype=np.int16)
+    assert ring.read_into(out) == 2 and out[1].tolist() == [2, 3]
+    assert ring.write(np.arange(6, 12, dtype=np.int16).reshape(3, 2)) and len(ring) == 4
+    out = np.zeros((5, 2), dtype=np.int16)
+    assert ring.read_into(out) == 4 and out[:4, 0].tolist() == [4, 6, 8, 10]
+    ring.finish()
+    assert ring.exhausted
+
+    def write_wav(name, frames, first):
+        # Never zero, so silence between tracks would show
+        data = (np.arange(frames, dtype=np.int16) % 1000 + first)[:, None] * np.array([1, -1], dtype=np.int16)
+        with wave.open(str(base / name), "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(OUTPUT_RATE)
+            w.writeframes(data.tobytes())
+        return data
+
+    a = write_wav("a.wav", 3000, 1)
+    b = write_wav("b.wav", 2000, 2000)
+    events = []
+    engine = PlaybackEngine(output=None)
+    engine.subscribe(lambda event, data: events.append((event, data)))
+    engine.play(base / "a.wav")
+    engine.queue_next(base / "b.wav")
+    time.sleep(0.2)
+    # The next track follows the last frame of the first within the same chunk
+    played = np.concatenate([engine.read(512) for _ in range(12)])
+    assert np.array_equal(played[:5000], np.concatenate([a, b])) and not played[5000:].any()
+    changes = [event for event in events if event[0] != "position"]
+    assert changes == [("track_changed", str(base / "a.wav")), ("track_changed", str(base / "b.wav")), ("ended", str(base / "b.wav"))]
+    assert ("position", 2560 / OUTPUT_RATE) in events
+
+    # Seeking lands on the exact frame
+    engine.play(base / "a.wav")
+    engine.seek(1234 / OUTPUT_RATE)
+    assert events[-1] == ("position", 1234 / OUTPUT_RATE)
+    time.sleep(0.1)
+    assert np.array_equal(engine.read(4), a[1234:1238]) and engine.position == 1238 / OUTPUT_RATE
+    engine.pause()
+    assert not engine.read(4).any()
+    engine.stop()
+
+    # The queue is followed with no view listening; preloads run where the queue lives
+    c = write_wav("c.wav", 1000, 3000)
+    model = QueueModel()
+    model.extend([QueueItem(str(base / name)) for name in ("a.wav", "b.wav")])
+    pending = []
+    advancer = QueueAdvancer(engine, model, lambda func, *args: pending.append((func, args)))
+
+    def run_pending():
+        while pending:
+            func, args = pending.pop(0)
+            func(*args)
+
+    engine.play(base / "b.wav")
+    run_pending()
+    # Nothing after the last entry until one is added
+    model.append(QueueItem(str(base / "c.wav")))
+    time.sleep(0.2)
+    played = np.concatenate([engine.read(512) for _ in range(8)])
+    assert np.array_equal(played[:3000], np.concatenate([b, c])) and engine.path is None
+    engine.play(base / "a.wav")
+    run_pending()
+    time.sleep(0.2)
+    np.concatenate([engine.read(512) for _ in range(6)])
+    assert engine.path == str(base / "b.wav")
+    run_pending()
+    time.sleep(0.2)
+    np.concatenate([engine.read(512) for _ in range(4)])
+    assert engine.path == str(base / "c.wav")
+    advancer.close()
+    engine.stop()
+    return True
+
+def test_startup():
+    print("Testing Startup Imports...")
+    # The window must not wait on numpy, mutagen or pygame; the time budget
+    # is checked by python -m src.utils.startup and the benchmarks
+    times = import_times()
+    assert not loaded_deferred(times), loaded_deferred(times)
+    # Covers the first view as well as the app
+    names = {name for name, _, _, _ in times["imports"]}
+    assert {"src.app", "src.ui.queue_view"} <= names and times["total"] > 0
+    return True
+
+def test_capabilities(tmp_path=None):
+    print("Testing FFmpeg Capabilities...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    encoders = (
+        "Encoders:\n A..... = Audio\n ------\n V....D libx264              H.264\n"
+        " A....D aac                  AAC (Advanced Audio Coding)\n A....D libshine             MP3\n"
+        " A....D flac                 FLAC\n"
+    )
+    filters = "Filters:\n  T.. = Timeline support\n TSC afftdn            A->A       Denoise\n ... aresample         A->A       Resample\n"
+    assert parse_encoders(encoders) == {"aac", "libshine", "flac"}
+    assert parse_filters(filters) == {"afftdn", "aresample"}
+
+    # A stand-in FFmpeg that logs each call
+    calls = base / "calls.txt"
+    fake = base / "ffmpeg"
+    fake.write_text(
+        f"#!{sys.executable}\nimport sys\nopen({str(calls)!r}, 'a').write(sys.argv[-1] + '\\n')\n"
+        f"print({{'-version': 'ffmpeg version 9.9', '-encoders': {encoders!r}, '-filters': {filters!r}}}[sys.argv[-1]])\n"
+    )
+    fake.chmod(0o755)
+    cache_file = base / "ffmpeg.json"
+    ap = AudioProcessor(capabilities=CapabilityCache(cache_file))
+    ap.ffmpeg_bin = str(fake)
+    assert ap.ffmpeg_version() == "ffmpeg version 9.9" and len(calls.read_text().split()) == 3
+
+    # The best encoder present is used, and a missing one fails upfront
+    cmd = ap.build_command("in.wav", "out.mp3", {"format": "mp3"})
+    assert cmd[cmd.index("-c:a") + 1] == "libshine"
+    cmd = ap.build_command("in.wav", "out.m4a", {"format": "m4a"})
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+    assert ap.check_options({"format": "flac", "noise_reduction": True}) == []
+    problems = ap.check_options({"format": "ogg", "normalize": True})
+    assert len(problems) == 2 and "ogg" in problems[0] and "loudnorm" in problems[1]
+
+    # Later processes read the cache until the binary changes
+    again = AudioProcessor(capabilities=CapabilityCache(cache_file))
+    again.ffmpeg_bin = str(fake)
+    assert again.capabilities().encoders == {"aac", "libshine", "flac"} and len(calls.read_text().split()) == 3
+    os.utime(fake, ns=(0, 0))
+    assert CapabilityCache(cache_file).get(str(fake)).version and len(calls.read_text().split()) == 6
+    missing = AudioProcessor(capabilities=CapabilityCache(cache_file))
+    missing.ffmpeg_bin = str(base / "no-ffmpeg")
+    assert missing.check_options({"format": "mp3"})[0].startswith("FFmpeg cannot be run")
+    # FFmpeg installed while running is found on the next check
+    if find_ffmpeg() == "ffmpeg":
+        from src.utils import helpers
+        assert not any(key[0] == "ffmpeg" for key in helpers._found_tools)
+    os.environ["FFMPEG_PATH"] = str(fake)
+    try:
+        assert missing.check_options({"format": "mp3"}) == [] and missing.ffmpeg_bin == str(fake.resolve())
+    finally:
+        del os.environ["FFMPEG_PATH"]
+    return True
+
+def test_bench(tmp_path=None):
+    print("Testing Benchmarks...")
+    results = bench_queue(2000)
+    assert {"queue.2k.insert_s", "queue.2k.refresh_ms", "queue.2k.filter_ms"} <= set(results)
+    assert all(result["value"] >= 0 and result["better"] == "lower" for result in results.values())
+
+    # Only changes past the threshold, in the wrong direction, are regressions
+    baseline = {"a": metric(100, "files/s", "higher"), "b": metric(10, "ms", "lower"), "c": metric(5, "ms", "lower")}
+    current = {"a": metric(85, "files/s", "higher"), "b": metric(10.5, "ms", "lower"), "c": metric(2, "ms", "lower"),
+               "new": metric(1, "ms", "lower")}
+    assert [name for name, _, _, _ in compare(current, baseline, 0.10)] == ["a"]
+    assert compare(current, baseline, 0.20) == []
+    assert compare({"failed": metric(1, "files", "lower")}, {"failed": metric(0, "files", "lower")}, 0.5)
+    return True
+
+def test_telemetry(tmp_path=None):
+    print("Testing Telemetry...")
+    import json
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    # A stand-in FFmpeg that burns some CPU and writes its output file
+    fake = base / "ffmpeg"
+    fake.write_text(
+        f"#!{sys.executable}\nimport sys, time\nt = time.process_time()\nwhile time.process_time() - t < 0.3: pass\n"
+        "if not sys.argv[-1].startswith('-'): open(sys.argv[-1], 'wb').write(bytes(4096))\n"
+    )
+    fake.chmod(0o755)
+    inputs = []
+    for name in ("a.wav", "b.wav"):
+        (base / name).write_bytes(bytes(1024))
+        inputs.append(QueueItem(str(base / name)))
+    processor = AudioProcessor()
+    processor.ffmpeg_bin = str(fake)
+    scheduler = ProcessScheduler(max_workers=1)
+
+    events = []
+    summary = StageSummary()
+    jsonl = JsonlSink(base / "events.jsonl")
+    prometheus = PrometheusSink(base / "metrics.prom", interval=3600)
+    sinks = [lambda event, data: events.append((event, data)), summary, jsonl, prometheus]
+    for sink in sinks:
+        telemetry.subscribe(sink)
+    try:
+        batch = BatchProcessor(processor, scheduler)
+        jobs = [f.result() for f in batch.submit(inputs, {"format": "mp3", "output_dir": str(base / "out")})]
+        assert all(job["status"] == "ok" for job in jobs)
+        MetadataManager.parse(str(base / "a.wav"))
+    finally:
+        for sink in sinks:
+            telemetry.unsubscribe(sink)
+        jsonl.close()
+        prometheus.close()
+        scheduler.shutdown()
+    assert not telemetry.enabled
+
+    stages = [data for event, data in events if event == "stage"]
+    encodes = [data for data in stages if data["stage"] == "encode"]
+    assert len(encodes) == 2 and {data["job"] for data in encodes} == {item.path for item in inputs}
+    if sys.platform.startswith("linux"):
+        # Sampled from /proc while the process ran
+        assert all(data["cpu"] and data["cpu"] >= 0.1 and data["max_rss"] for data in encodes)
+    # One slot: the second encode waited for the first
+    assert max(data["queue_wait"] for data in encodes) >= 0.2
+    finished = [data for event, data in events if event == "job"]
+    assert len(finished) == 2 and all(data["status"] == "ok" and "encode" in data["stages"] for data in finished)
+    assert any(data["stage"] == "read_tags" and data["job"] is None for data in stages)
+    pool = [data for event, data in events if event == "pool"]
+    assert max(data["running"] for data in pool) == 1 and pool[-1]["running"] == 0
+    assert max(data["queued"] for data in pool) >= 1
+
+    snapshot = summary.snapshot()
+    assert snapshot["stages"]["encode"]["runs"] == 2 and snapshot["jobs"] == {"ok": 2}
+    lines = (base / "events.jsonl").read_text().splitlines()
+    assert len(lines) == len(events) and json.loads(lines[0])["event"] in ("stage", "pool")
+    metrics = (base / "metrics.prom").read_text()
+    assert 'musicforge_stage_runs_total{stage="encode"} 2' in metrics and 'musicforge_jobs_total{status="ok"} 2' in metrics
+    return True
+
+def test_cli_inputs(tmp_path=None):
+    print("Testing CLI input collection...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    (base / "album").mkdir()
+    (base / "album" / "01.FLAC").write_bytes(b"")
+    (base / "album" / "cover.jpg").write_bytes(b"")
+    (base / "single.mp3").write_bytes(b"")
+    paths = collect_inputs([str(base / "album"), str(base / "*.mp3"), str(base / "single.mp3")])
+    options = load_options(output_dir=str(base / "out"))
+    print(f"Collected: {paths}")
+    assert sorted(Path(p).name for p in paths) == ["01.FLAC", "single.mp3"]
+    assert options["format"] == "mp3" and options["output_dir"] == str(base / "out")
+    return True
+
+def test_metadata_cache(tmp_path=None):
+    print("Testing Metadata Cache...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    track = base / "track.mp3"
+    track.write_bytes(b"not really audio")
+    cache = MetadataCache(base / "metadata.db", max_entries=10)
+    mm = MetadataManager(cache=cache)
+    info = mm.read_info(str(track))
+    assert mm.read_info(str(track)) == info
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    # A changed file must be re-parsed
+    track.write_bytes(b"changed content")
+    os.utime(track, ns=(0, 12345))
+    assert cache.get(str(track)) is None
+    # The cap evicts the least recently used entries
+    for i in range(20):
+        cache.put(f"/virtual/{i}.mp3", (i, i), info)
+    assert cache.stats()["entries"] <= 10
+    cache.close()
+    return True
+
+def test_ingest(tmp_path=None):
+    print("Testing Ingestion Pipeline...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    paths = []
+    for i in range(3):
+        (base / f"{i}.mp3").write_bytes(b"")
+        paths.append(str(base / f"{i}.mp3"))
+    pipeline = IngestPipeline(MetadataManager())
+    items = []
+    job = pipeline.start([paths, [str(base / "missing.mp3")]], items.extend, skip={paths[0]})
+    assert job.wait(timeout=10)
+    pipeline.shutdown()
+    print(f"Ingested: {[item.path for item in items]}")
+    assert sorted(item.path for item in items) == paths[1:]
+    assert job.added == 2 and job.skipped == 1
+    return True
+
+def test_scanner(tmp_path=None):
+    print("Testing Directory Scanner...")
+    import tempfile
+    base = Path(tmp_path or tempfile.mkdtemp())
+    (base / "a" / "b").mkdir(parents=True)
+    (base / "skip").mkdir()
+    for rel in ("top.MP3", "a/one.flac", "a/b/two.wav", "a/b/notes.txt", "skip/three.mp3"):
+        (base / rel).write_bytes(b"")
+    try:
+        (base / "a" / "b" / "loop").symlink_to(base, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pass
+    names = lambda batches: sorted(Path(p).name for batch in batches for p in batch)
+    assert names(scan_audio_files(base)) == ["one.flac", "three.mp3", "top.MP3", "two.wav"]
+    assert names(scan_audio_files(base, exclude=["skip"], max_depth=1)) == ["one.flac", "top.MP3"]
+    return True
+
+def test_queue_model():
+    print("Testing Queue Model...")
+    model = QueueModel()
+    events = []
+    model.subscribe(lambda event, items: events.append((event, len(items))))
+    added = model.extend([QueueItem("/m/a.mp3", {"artist": "Amy"}, 1), QueueItem("/m/b.mp3"), QueueItem("/m/a.mp3")])
+    assert len(added) == 2 and len(model) == 2
+    assert "/m/a.mp3" in model and "/m/c.mp3" not in model
+    assert model[0].tags["artist"] == "Amy" and model[0].size == 1
+    model.swap(0, 1)
+    assert model.index_of("/m/a.mp3") == 1
+    model.remove(["/m/b.mp3", "/m/missing.mp3"])
+    assert [item.path for item in model] == ["/m/a.mp3"] and model.index_of("/m/a.mp3") == 0
+    assert events == [("added", 2), ("moved", 2), ("removed", 1)]
+    return True
+
+def test_queue_projection():
+    print("Testing Queue Projection...")
+    model = QueueModel()
+    model.extend([
+        QueueItem("/m/b.mp3", {"title": "Beta", "artist": "Zed"}, 3),
+        QueueItem("/m/a.flac", {"title": "alpha", "artist": "Amy"}, 1),
+        QueueItem("/m/c.wav", {"title": "Gamma", "artist": "Amy"}, 2),
+    ])
+    proj = QueueProjection(model)
+    proj.set_sort("title")
+    assert [proj.path_at(i) for i in range(len(proj))] == ["/m/a.flac", "/m/b.mp3", "/m/c.wav"]
+    proj.set_filter("AMY")
+    while not proj.step():
+        pass
+    assert [proj.path_at(i) for i in range(len(proj))] == ["/m/a.flac", "/m/c.wav"]
+    model.append(QueueItem("/m/d.mp3", {"title": "Delta", "artist": "amy"}, 4))
+    proj.sync()
+    proj.set_sort("size", descending=True)
+    assert [proj.path_at(i) for i in range(len(proj))] == ["/m/d.mp3", "/m/c.wav", "/m/a.flac"]
+    proj.set_filter("flac")
+    while not proj.step():
+        pass
+    assert len(proj) == 1
+    model.remove(["/m/a.flac"])
+    proj.invalidate()
+    assert len(proj) == 0
+    return True
+
 if __name__ == "__main__":
     s1 = test_discovery()
     s2 = test_metadata()
     s3 = test_processor()
+    s3b = test_loudness()
+    s3c = test_scheduler()
+    s3d = test_adaptive_concurrency()
+    s3e = test_progress()
+    s3f = test_transcode_cache()
+    s3g = test_probe()
+    s3h = test_tagging()
+    s3i = test_waveform()
+    s3j = test_spectrogram()
+    s3k = test_cover_art()
+    s3l = test_artwork()
+    s3m = test_playback()
+    s3n = test_startup()
+    s3o = test_capabilities()
+    s3p = test_bench()
+    s3q = test_telemetry()
+    s4 = test_cli_inputs()
+    s5 = test_metadata_cache()
+    s6 = test_ingest()
+    s7 = test_scanner()
+    s8 = test_queue_model()
+    s9 = test_queue_projection()
     
-    if all([s1, s2, s3]):
+    if all([s1, s2, s3, s3b, s3c, s3d, s3e, s3f, s3g, s3h, s3i, s3j, s3k, s3l, s3m, s3n, s3o, s3p, s3q, s4, s5, s6, s7, s8, s9]):
         print("\nCore tests PASSED!")
     else:
         print("\nCore tests FAILED!")